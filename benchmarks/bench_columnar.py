@@ -0,0 +1,63 @@
+"""
+Compare bend() and a compiled mapping with bend_columns() on many flat
+records with arithmetic.
+
+Run with `python benchmarks/bench_columnar.py` (requires NumPy).
+"""
+from __future__ import print_function
+
+import random
+import timeit
+
+from jsonbender import K, S, bend
+from jsonbender.columnar import bend_columns
+from jsonbender.compiler import compile
+
+
+RECORDS = 100000
+
+MAPPING = {
+    'id': S('id'),
+    'gross': S('price') * S('qty'),
+    'net': S('price') * S('qty') * (K(1) - S('discount')) + S('shipping'),
+    'unit': S('price') / S('qty'),
+    'margin': (S('price') - S('cost')) / S('price'),
+    'bulk': S('qty') == K(10),
+    'refund': -S('price'),
+    'score': S('stats', 'views') * K(3) + S('stats', 'clicks') * K(7),
+}
+
+
+def records():
+    rng = random.Random(42)
+    return [{'id': i,
+             'price': rng.uniform(1, 100),
+             'cost': rng.uniform(1, 50),
+             'qty': rng.randint(1, 10),
+             'discount': rng.random() / 2,
+             'shipping': rng.choice([0.0, 4.99, 9.99]),
+             'stats': {'views': rng.randint(0, 1000),
+                       'clicks': rng.randint(0, 100)}}
+            for i in range(RECORDS)]
+
+
+def main():
+    sources = records()
+    compiled = compile(MAPPING)
+    assert bend_columns(MAPPING, sources[:100]) == [
+        bend(MAPPING, s) for s in sources[:100]]
+
+    runs = [
+        ('bend()', lambda: [bend(MAPPING, s) for s in sources]),
+        ('compiled', lambda: [compiled(s) for s in sources]),
+        ('bend_columns()', lambda: bend_columns(MAPPING, sources)),
+        ("bend_columns(output='columns')",
+         lambda: bend_columns(MAPPING, sources, output='columns')),
+    ]
+    for name, func in runs:
+        best = min(timeit.repeat(func, number=1, repeat=5))
+        print('{:<32}{:>8.0f} records/s'.format(name, RECORDS / best))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Compare bend() with a compiled mapping.
+
+Run with `python benchmarks/bench_compile.py`.
+"""
+from __future__ import print_function
+
+import timeit
+
+from jsonbender import Forall, Format, If, K, OptionalS, S, Switch, bend
+from jsonbender.compiler import compile
+
+
+SOURCE = {
+    'customer': {'first_name': 'Inigo', 'last_name': 'Montoya', 'age': 24},
+    'address': {'city': 'Sicily', 'country': 'Florin'},
+    'service': 'mastodon',
+    'handle': 'inigo',
+    'server': 'mastodon.social',
+    'items': [{'sku': i, 'price': i * 1.5, 'qty': i % 3}
+              for i in range(20)],
+}
+
+CASES = {
+    'flat': {
+        'first': S('customer', 'first_name'),
+        'last': S('customer', 'last_name'),
+        'age': S('customer', 'age'),
+        'city': S('address', 'city'),
+        'country': S('address', 'country'),
+        'zip': OptionalS('address', 'zip'),
+    },
+    'operators': {
+        'name': (S('customer', 'first_name') + K(' ') +
+                 S('customer', 'last_name')),
+        'adult': If(S('customer', 'age') == K(18), K('yes'), K('no')),
+        'handle': Switch(S('service'),
+                         {'twitter': S('handle'),
+                          'mastodon': S('handle') + K('@') + S('server')}),
+        'where': Format('{}, {}', S('address', 'city'),
+                        S('address', 'country')),
+    },
+    'nested_lists': {
+        'customer': {'name': {'first': S('customer', 'first_name')}},
+        'lines': S('items') >> Forall.bend({
+            'sku': S('sku'),
+            'total': S('price') * S('qty'),
+        }),
+    },
+}
+
+
+def main(number=2000):
+    for name, mapping in sorted(CASES.items()):
+        compiled = compile(mapping)
+        assert compiled(SOURCE) == bend(mapping, SOURCE)
+        interpreted = min(timeit.repeat(lambda: bend(mapping, SOURCE),
+                                        number=number, repeat=5))
+        fast = min(timeit.repeat(lambda: compiled(SOURCE),
+                                 number=number, repeat=5))
+        print('{:<14} bend: {:7.2f}us  compiled: {:7.2f}us  ({:.1f}x)'.format(
+            name,
+            interpreted / number * 1e6,
+            fast / number * 1e6,
+            interpreted / fast))
+
+
+if __name__ == '__main__':
+    main()
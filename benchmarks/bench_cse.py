@@ -0,0 +1,49 @@
+"""
+Measure compile(cse=True) on a mapping that reads the same paths many
+times.
+
+Run with `python benchmarks/bench_cse.py`.
+"""
+from __future__ import print_function
+
+import timeit
+
+from jsonbender import Format, If, K, OptionalS, S, bend
+from jsonbender.compiler import compile
+from jsonbender.string_ops import ProtectedFormat
+
+
+NAME = S('payload', 'user', 'profile', 'name')
+EMAIL = S('payload', 'user', 'profile', 'email')
+CITY = OptionalS('payload', 'user', 'address', 'city')
+
+MAPPING = {
+    'name': NAME,
+    'email': EMAIL,
+    'display': Format('{} <{}>', NAME, EMAIL),
+    'label': ProtectedFormat('{} from {}', NAME, CITY),
+    'is_admin': If(EMAIL == K('admin@example.com'), K(True), K(False)),
+    'city': CITY,
+    'greeting': If(CITY == K(None), Format('Hi {}', NAME),
+                   Format('Hi {} from {}', NAME, CITY)),
+    'contact': {'name': NAME, 'email': EMAIL, 'city': CITY},
+}
+
+SOURCE = {'payload': {'user': {'profile': {'name': 'Inigo',
+                                           'email': 'inigo@example.com'},
+                               'address': {'city': 'Florin'}}}}
+
+
+def main(number=20000):
+    plain = compile(MAPPING)
+    cse = compile(MAPPING, cse=True)
+    assert plain(SOURCE) == cse(SOURCE) == bend(MAPPING, SOURCE)
+    for name, func in [('bend', lambda: bend(MAPPING, SOURCE)),
+                       ('compiled', lambda: plain(SOURCE)),
+                       ('compiled cse', lambda: cse(SOURCE))]:
+        best = min(timeit.repeat(func, number=number, repeat=5))
+        print('{:<14} {:7.2f}us'.format(name, best / number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
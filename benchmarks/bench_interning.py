@@ -0,0 +1,78 @@
+"""
+Measure the memory held by thousands of near-duplicate mappings (one per
+tenant, each built anew as if loaded from its own file), as they are and
+interned with an `InternTable`, as measured by tracemalloc.
+
+Run with `python benchmarks/bench_interning.py`.
+"""
+from __future__ import print_function
+
+import tracemalloc
+
+from jsonbender import (Alternation, Context, F, Forall, Format, If, K,
+                        OptionalS, S, Switch)
+from jsonbender.interning import InternTable, memory_usage
+
+
+def line_mapping(tenant):
+    return {
+        'sku': S('sku'),
+        'qty': OptionalS('qty', default=1),
+        'total': S('qty') * S('price'),
+        'label': Format('{} x{}', S('sku'), S('qty')),
+        'currency': Context() >> OptionalS('currency', default='EUR'),
+        'warehouse': K('wh-{}'.format(tenant % 7)),
+    }
+
+
+def tenant_mapping(tenant):
+    mapping = {
+        'id': S('id'),
+        'tenant': K('tenant-{}'.format(tenant)),
+        'customer': {
+            'name': Format('{} {last}', S('customer', 'first'),
+                           last=S('customer', 'last')),
+            'email': OptionalS('customer', 'email', default=None),
+            'nick': Alternation(S('customer', 'nick'),
+                                S('customer', 'first')),
+        },
+        'status': Switch(S('status'), {'new': K('N'), 'paid': K('P')},
+                         default=K(None)),
+        'rush': If(S('priority') >> F(bool), K(True), K(False)),
+        'lines': S('lines') >> Forall.bend(line_mapping(tenant)),
+        'note': K(None),
+    }
+    for i in range(20):
+        key = ''.join(['field', str(i)])
+        mapping[key] = OptionalS('fields', i, default=None)
+    return mapping
+
+
+def held(build):
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        return result, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+def main(tenants=4000):
+    table = InternTable()
+    copies, copies_size = held(
+        lambda: [tenant_mapping(t) for t in range(tenants)])
+    interned, interned_size = held(
+        lambda: [table.intern(tenant_mapping(t)) for t in range(tenants)])
+    print('{} tenants'.format(tenants))
+    for name, size in (('copies', copies_size), ('interned', interned_size)):
+        print('{:<10}{:>8.1f}MB held {:>8.0f} bytes per mapping'.format(
+            name, size / 1e6, float(size) / tenants))
+    usage = memory_usage({t: m for t, m in enumerate(interned[:100])})
+    print('own memory of an interned mapping: {} of {} bytes'.format(
+        usage[0].own, usage[0].total))
+    del copies
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Measure how long a fresh process takes to get its mappings: importing a
+module that builds one mapping per tenant, as workers do at startup, versus
+loading them from a `MappingCache`, with and without interning them. All
+run with the module's `.pyc` file already written, and the mappings are
+checked to bend alike.
+
+Run with `python benchmarks/bench_mapping_cache.py [TENANTS]`.
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+
+TENANT = '''
+    'tenant{i}': {{
+        'id': S('id'),
+        'tenant': K('tenant{i}'),
+        'customer': {{
+            'name': Format('{{}} {{last}}', S('customer', 'first'),
+                           last=S('customer', 'last')),
+            'email': OptionalS('customer', 'email', default=None),
+            'nick': Alternation(S('customer', 'nick'),
+                                S('customer', 'first')),
+        }},
+        'status': Switch(S('status'), {{'new': K('N'), 'paid': K('P')}},
+                         default=K(None)),
+        'rush': If(S('priority') >> F(bool), K(True), K(False)),
+        'lines': S('lines') >> Forall.bend({{
+            'sku': S('sku'),
+            'total': S('qty') * S('price'),
+            'label': Format('{{}} x{{}}', S('sku'), S('qty')),
+            'warehouse': K('wh-{w}'),
+        }}),
+        'extra': [OptionalS('fields', n, default=None) for n in range(20)],
+    }},'''
+
+MODULE = '''
+from jsonbender import (Alternation, F, Forall, Format, If, K, OptionalS, S,
+                        Switch)
+
+TENANTS = {{{tenants}
+}}
+'''
+
+LOAD = '''
+import hashlib, sys, time
+sys.path.insert(0, {directory!r})
+start = time.time()
+from jsonbender.serialization import MappingCache
+if {cached}:
+    mappings = MappingCache({cache!r}, intern={intern}).load(
+        'tenant_mappings:TENANTS')
+else:
+    from jsonbender.batch import load_mapping
+    mappings = load_mapping('tenant_mappings:TENANTS')
+elapsed = time.time() - start
+from jsonbender import bend
+source = {{'id': 1, 'customer': {{'first': 'a', 'last': 'b'}}, 'status': 'new',
+          'priority': 1, 'lines': [{{'sku': 'x', 'qty': 2, 'price': 3}}]}}
+results = [bend(mappings[t], source) for t in sorted(mappings)]
+print(elapsed, hashlib.sha256(repr(results).encode()).hexdigest())
+'''
+
+
+def run(directory, cache, cached, intern=False):
+    output = subprocess.check_output([sys.executable, '-c', LOAD.format(
+        directory=directory, cache=cache, cached=cached, intern=intern)])
+    elapsed, result = output.split()
+    return float(elapsed), result
+
+
+def main(tenants=4000):
+    directory = tempfile.mkdtemp()
+    cache = os.path.join(directory, 'cache')
+    try:
+        with open(os.path.join(directory, 'tenant_mappings.py'), 'w') as f:
+            f.write(MODULE.format(tenants=''.join(
+                TENANT.format(i=i, w=i % 7) for i in range(tenants))))
+        print('{} tenants'.format(tenants))
+        imported = None
+        for name, cached, intern in (('import', False, False),
+                                     ('cache', True, False),
+                                     ('interned', True, True)):
+            # write the .pyc file and the cache
+            run(directory, cache, cached, intern)
+            runs = [run(directory, cache, cached, intern) for _ in range(3)]
+            imported = imported or runs[0][1]
+            assert runs[0][1] == imported
+            print('{:<10}{:>8.1f}ms'.format(name,
+                                            min(t for t, _ in runs) * 1e3))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
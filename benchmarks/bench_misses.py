@@ -0,0 +1,58 @@
+"""
+Time OptionalS and Alternation on sparse payloads, where most optional
+fields are missing.
+
+Run with `python benchmarks/bench_misses.py`.
+"""
+from __future__ import print_function
+
+import random
+import timeit
+
+from jsonbender import Alternation, K, OptionalS, S, bend
+from jsonbender.compiler import compile
+
+
+MAPPING = {
+    'email': OptionalS('contact', 'email'),
+    'phone': OptionalS('contact', 'phone', default=''),
+    'nick': OptionalS('profile', 'nick'),
+    'reach': Alternation(S('contact', 'email'), S('contact', 'phone'),
+                         S('profile', 'nick'), K(None)),
+    'first_tag': Alternation(S('tags', 0), K('untagged')),
+}
+
+
+def sources(miss_rate, count=1000):
+    rng = random.Random(7)
+
+    def maybe(d, key, value):
+        if rng.random() >= miss_rate:
+            d[key] = value
+
+    result = []
+    for i in range(count):
+        source = {'id': i, 'contact': {}, 'tags': []}
+        maybe(source['contact'], 'email', 'user{}@example.com'.format(i))
+        maybe(source['contact'], 'phone', str(i))
+        maybe(source, 'profile', {'nick': 'user{}'.format(i)})
+        if rng.random() >= miss_rate:
+            source['tags'].append('tag')
+        result.append(source)
+    return result
+
+
+def main():
+    compiled = compile(MAPPING)
+    for miss_rate in (0.0, 0.6, 1.0):
+        data = sources(miss_rate)
+        for name, func in (('bend()', lambda s: bend(MAPPING, s)),
+                           ('compiled', compiled)):
+            best = min(timeit.repeat(lambda: [func(s) for s in data],
+                                     number=10, repeat=5))
+            print('{:.0%} missing, {:<10}{:>8.2f}us per record'.format(
+                miss_rate, name, best / 10 / len(data) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
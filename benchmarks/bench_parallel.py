@@ -0,0 +1,49 @@
+"""
+Measure how bend_parallel() scales with the number of workers.
+
+Run with `python benchmarks/bench_parallel.py [MAX_WORKERS]`.
+"""
+from __future__ import print_function
+
+import multiprocessing
+import sys
+import time
+
+from jsonbender import Forall, Format, K, S
+from jsonbender.batch import bend_many, bend_parallel
+
+
+MAPPING = {
+    'name': Format('{} {}', S('first'), S('last')),
+    'total': S('items') >> Forall.bend({'v': S('price') * S('qty')}),
+    'flag': S('n') == K(0),
+}
+
+
+def sources(n):
+    for i in range(n):
+        yield {'first': 'first', 'last': str(i), 'n': i % 2,
+               'items': [{'price': j, 'qty': i % 7} for j in range(10)]}
+
+
+def main(max_workers, records=200000):
+    start = time.time()
+    for _ in bend_many(MAPPING, sources(records)):
+        pass
+    base = records / (time.time() - start)
+    print('bend_many        {:>10.0f} records/s'.format(base))
+
+    workers = 1
+    while workers <= max_workers:
+        start = time.time()
+        for _ in bend_parallel(MAPPING, sources(records), workers=workers):
+            pass
+        rate = records / (time.time() - start)
+        print('{:>2} workers       {:>10.0f} records/s  ({:.1f}x)'.format(
+            workers, rate, rate / base))
+        workers *= 2
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1
+         else multiprocessing.cpu_count())
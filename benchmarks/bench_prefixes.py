@@ -0,0 +1,36 @@
+"""
+Measure compile(share_prefixes=True) on a mapping with many sibling paths.
+
+Run with `python benchmarks/bench_prefixes.py`.
+"""
+from __future__ import print_function
+
+import timeit
+
+from jsonbender import OptionalS, S, bend
+from jsonbender.compiler import compile
+
+
+FIELDS = 80
+
+MAPPING = {'field_{}'.format(i): S('payload', 'order', 'field_{}'.format(i))
+           for i in range(FIELDS)}
+MAPPING['missing'] = OptionalS('payload', 'order', 'missing')
+
+SOURCE = {'payload': {'order': {'field_{}'.format(i): i
+                                for i in range(FIELDS)}}}
+
+
+def main(number=5000):
+    plain = compile(MAPPING)
+    shared = compile(MAPPING, share_prefixes=True)
+    assert plain(SOURCE) == shared(SOURCE) == bend(MAPPING, SOURCE)
+    for name, func in [('bend', lambda: bend(MAPPING, SOURCE)),
+                       ('compiled', lambda: plain(SOURCE)),
+                       ('shared prefixes', lambda: shared(SOURCE))]:
+        best = min(timeit.repeat(func, number=number, repeat=5))
+        print('{:<16} {:7.2f}us'.format(name, best / number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
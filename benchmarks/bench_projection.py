@@ -0,0 +1,71 @@
+"""
+Compare parsing a large document with `json.loads()` and with
+`load_projected()` before bending it with a mapping that reads a few of its
+paths: time, and peak memory as measured by tracemalloc.
+
+Run with `python benchmarks/bench_projection.py`.
+"""
+from __future__ import print_function
+
+import json
+import random
+import timeit
+import tracemalloc
+
+from jsonbender import F, Forall, OptionalS, S, bend
+from jsonbender.projection import load_projected, source_paths
+
+
+MAPPING = {
+    'id': S('order', 'id'),
+    'customer': S('order', 'customer', 'name'),
+    'email': OptionalS('order', 'customer', 'email'),
+    'skus': S('order', 'lines') >> Forall.bend({'sku': S('sku'),
+                                                'qty': S('qty')}),
+    'total': S('order', 'totals') >> F(sum),
+}
+
+
+def document(lines=20000):
+    rng = random.Random(7)
+    return json.dumps({
+        'order': {
+            'id': 1,
+            'customer': {'name': 'Ada', 'email': 'ada@example.com',
+                         'history': [rng.random() for _ in range(lines)]},
+            'lines': [{'sku': 'sku{}'.format(i), 'qty': rng.randint(1, 9),
+                       'description': 'x' * 40,
+                       'attributes': {str(j): rng.random()
+                                      for j in range(5)}}
+                      for i in range(lines)],
+            'totals': [1.0, 2.0],
+        },
+        'audit': [{'at': i, 'by': 'someone'} for i in range(lines)],
+    })
+
+
+def peak(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    text = document()
+    paths = source_paths(MAPPING)
+    print('document: {:.1f} MB, paths: {}'.format(len(text) / 1e6,
+                                                  sorted(paths, key=str)))
+    for name, load in (('json.loads', json.loads),
+                       ('load_projected', lambda t: load_projected(t, paths))):
+        def run():
+            return bend(MAPPING, load(text))
+        best = min(timeit.repeat(run, number=1, repeat=5))
+        print('{:<16}{:>8.1f}ms {:>8.1f}MB peak'.format(
+            name, best * 1e3, peak(run) / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Compare giving each worker thread its own deep copy of a mapping with
+sharing one mapping between all of them: memory held by the mappings, as
+measured by tracemalloc, and the time it takes to make them.
+
+Built-in benders keep no state while they evaluate, so sharing gives the
+same results, which is checked before reporting.
+
+Run with `python benchmarks/bench_shared_mapping.py`.
+"""
+from __future__ import print_function
+
+import copy
+import threading
+import timeit
+import tracemalloc
+
+from jsonbender import Context, F, Forall, Format, OptionalS, S, bend
+
+
+def line_mapping(i):
+    return {
+        'sku': S('sku'),
+        'qty': S('qty'),
+        'total': S('qty') * S('price'),
+        'label': Format('{} x{}', S('sku'), S('qty')),
+        'note': OptionalS('notes', i, default=None),
+        'currency': Context() >> S('currency'),
+    }
+
+
+def mapping(fields=300):
+    return {
+        'field{}'.format(i): {
+            'value': OptionalS('order', 'fields', i, default=None),
+            'upper': OptionalS('order', 'name', default='') >> F(str.upper),
+            'lines': S('order', 'lines') >> Forall.bend(line_mapping(i)),
+        }
+        for i in range(fields)
+    }
+
+
+SOURCE = {'order': {'name': 'ada', 'fields': list(range(100)),
+                    'lines': [{'sku': 'a', 'qty': 2, 'price': 1.5}]}}
+
+
+def held(func):
+    """
+    Return what `func` returns and the memory it left allocated.
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = func()
+        return result, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+def bend_in_threads(mappings):
+    results = [None] * len(mappings)
+
+    def run(i):
+        results[i] = bend(mappings[i], SOURCE, {'currency': 'EUR{}'.format(i)})
+    threads = [threading.Thread(target=run, args=(i,))
+               for i in range(len(mappings))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def main(threads=16):
+    shared = mapping()
+    expected = bend_in_threads([copy.deepcopy(shared)
+                                for _ in range(threads)])
+    assert bend_in_threads([shared] * threads) == expected
+
+    print('{} threads, mapping with {} keys'.format(threads, len(shared)))
+    for name, make in (
+            ('copies', lambda: [copy.deepcopy(shared)
+                                for _ in range(threads)]),
+            ('shared', lambda: [shared] * threads)):
+        best = min(timeit.repeat(make, number=1, repeat=3))
+        _, size = held(make)
+        print('{:<10}{:>8.1f}ms {:>8.1f}MB held'.format(
+            name, best * 1e3, size / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+Time a lookup of S and of the selector `specialize()` replaces it with, for
+paths of depth 3 to 8.
+
+Run with `python benchmarks/bench_specialize.py`.
+"""
+from __future__ import print_function
+
+import timeit
+
+from jsonbender import S
+from jsonbender.specialize import specialize
+
+
+def source(path):
+    value = 42
+    for key in reversed(path):
+        value = {key: value, 'other': 'x'} if isinstance(key, str) else [value]
+    return value
+
+
+def main():
+    for depth in range(3, 9):
+        # mix dict keys and list indices, like real payloads do
+        path = tuple(0 if i % 3 == 2 else 'k{}'.format(i)
+                     for i in range(depth))
+        record = source(path)
+        generic = S(*path)
+        specialized = specialize(generic, samples=[record])
+        timings = []
+        for bender in (generic, specialized):
+            best = min(timeit.repeat(
+                'evaluate(record, context)',
+                globals={'evaluate': bender.evaluate, 'record': record,
+                         'context': {}},
+                number=200000, repeat=7))
+            timings.append(best / 200000 * 1e9)
+        print('depth {}: S {:>6.0f}ns  specialized {:>6.0f}ns  ({:.2f}x)'
+              .format(depth, timings[0], timings[1],
+                      timings[0] / timings[1]))
+
+
+if __name__ == '__main__':
+    main()
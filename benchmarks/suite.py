@@ -0,0 +1,387 @@
+"""
+Benchmark suite for the core benders.
+
+Every case bends a fixed, seeded synthetic dataset with a mapping and with
+a hand-written function doing the same job, and reports the time per
+record of `bend()` and of the compiled mapping relative to the
+hand-written code. Those ratios show the interpreter overhead of the
+benders and, unlike absolute timings, can be compared across machines.
+
+    python benchmarks/suite.py              # run and compare to baseline
+    python benchmarks/suite.py --save       # store a new baseline
+    python benchmarks/suite.py -k format    # only cases matching 'format'
+
+When comparing, a case whose ratio grew more than the threshold (see
+--threshold) over the stored baseline is flagged as a regression and the
+exit status is 1.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from jsonbender import (Alternation, Forall, Format, K, OptionalS, S,  # noqa
+                        Switch, bend)
+from jsonbender.compiler import compile  # noqa
+from jsonbender.string_ops import ProtectedFormat  # noqa
+
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+SEED = 1234
+RECORDS = 200
+
+
+class Case(object):
+    def __init__(self, name, mapping, sources, handwritten):
+        self.name = name
+        self.mapping = mapping
+        self.sources = sources
+        self.handwritten = handwritten
+
+
+def _word(rng):
+    return ''.join(rng.choice('abcdefghij') for _ in range(rng.randint(3, 8)))
+
+
+def deep_s(rng):
+    path = ('a', 'b', 'c', 'd', 'e', 'f', 'g', 'h')
+    sources = []
+    for _ in range(RECORDS):
+        value = rng.random()
+        for key in reversed(path):
+            value = {key: value, 'other': _word(rng)}
+        sources.append(value)
+    keys = ['v{}'.format(i) for i in range(10)]
+    mapping = {k: S(*path) for k in keys}
+
+    def handwritten(s):
+        return {k: s['a']['b']['c']['d']['e']['f']['g']['h'] for k in keys}
+    return mapping, sources, handwritten
+
+
+def optional_s_misses(rng):
+    sources = [{'user': {'name': _word(rng)} if rng.random() < 0.4 else {}}
+               for _ in range(RECORDS)]
+    fields = ['f{}'.format(i) for i in range(10)]
+    mapping = {f: OptionalS('user', 'name', default='?') for f in fields}
+
+    def handwritten(s):
+        return {f: s['user'].get('name', '?') for f in fields}
+    return mapping, sources, handwritten
+
+
+def alternation_fallbacks(rng):
+    keys = ['primary', 'secondary', 'tertiary']
+    sources = [{rng.choice(keys): _word(rng)} for _ in range(RECORDS)]
+    fields = ['f{}'.format(i) for i in range(10)]
+    mapping = {f: Alternation(*[S(k) for k in keys]) for f in fields}
+
+    def first(s):
+        for k in keys:
+            if k in s:
+                return s[k]
+        raise KeyError(keys[-1])
+
+    def handwritten(s):
+        return {f: first(s) for f in fields}
+    return mapping, sources, handwritten
+
+
+def sparse_payload(rng):
+    # about 60% of the optional fields are missing
+    def maybe(value):
+        return value if rng.random() < 0.4 else None
+
+    sources = []
+    for _ in range(RECORDS):
+        source = {'id': rng.randint(0, 1000)}
+        for key in ('email', 'phone', 'fax'):
+            value = maybe(_word(rng))
+            if value is not None:
+                source.setdefault('contact', {})[key] = value
+        nick = maybe(_word(rng))
+        if nick is not None:
+            source['profile'] = {'nick': nick}
+        sources.append(source)
+    mapping = {
+        'id': S('id'),
+        'contact': Alternation(S('contact', 'email'), S('contact', 'phone'),
+                               S('contact', 'fax'), K(None)),
+        'email': OptionalS('contact', 'email'),
+        'phone': OptionalS('contact', 'phone'),
+        'nick': OptionalS('profile', 'nick', default=''),
+    }
+
+    def handwritten(s):
+        contact = s.get('contact', {})
+        return {
+            'id': s['id'],
+            'contact': contact.get('email', contact.get(
+                'phone', contact.get('fax'))),
+            'email': contact.get('email'),
+            'phone': contact.get('phone'),
+            'nick': s.get('profile', {}).get('nick', ''),
+        }
+    return mapping, sources, handwritten
+
+
+def format_(rng):
+    sources = [{'first': _word(rng), 'last': _word(rng), 'age': rng.randint(1, 99)}
+               for _ in range(RECORDS)]
+    fields = ['f{}'.format(i) for i in range(10)]
+    mapping = {f: Format('{} {last} ({})', S('first'), S('age'),
+                         last=S('last'))
+               for f in fields}
+
+    def handwritten(s):
+        return {f: '{} {last} ({})'.format(s['first'], s['age'],
+                                           last=s['last'])
+                for f in fields}
+    return mapping, sources, handwritten
+
+
+def protected_format(rng):
+    sources = [{'first': _word(rng),
+                'last': _word(rng) if rng.random() < 0.5 else None}
+               for _ in range(RECORDS)]
+    fields = ['f{}'.format(i) for i in range(10)]
+    mapping = {f: ProtectedFormat('{} {}', S('first'), S('last'))
+               for f in fields}
+
+    def fmt(s):
+        first, last = s['first'], s['last']
+        if first is None or last is None:
+            return None
+        return '{} {}'.format(first, last)
+
+    def handwritten(s):
+        return {f: fmt(s) for f in fields}
+    return mapping, sources, handwritten
+
+
+def forall_bend(rng):
+    items = [{'sku': _word(rng), 'price': rng.random(), 'qty': rng.randint(1, 9)}
+             for _ in range(10000)]
+    sources = [{'items': items}]
+    mapping = {'lines': S('items') >> Forall.bend({
+        'sku': S('sku'),
+        'total': S('price') * S('qty'),
+    })}
+
+    def handwritten(s):
+        return {'lines': [{'sku': i['sku'], 'total': i['price'] * i['qty']}
+                          for i in s['items']]}
+    return mapping, sources, handwritten
+
+
+def switch_dispatch(rng):
+    services = ['twitter', 'mastodon', 'email', 'phone']
+    sources = [{'service': rng.choice(services + ['other']),
+                'handle': _word(rng), 'server': _word(rng)}
+               for _ in range(RECORDS)]
+    fields = ['f{}'.format(i) for i in range(10)]
+    mapping = {f: Switch(S('service'),
+                         {'twitter': S('handle'),
+                          'mastodon': S('handle') + K('@') + S('server'),
+                          'email': S('handle') + K('@mail'),
+                          'phone': K('n/a')},
+                         default=K(None))
+               for f in fields}
+
+    def contact(s):
+        service = s['service']
+        if service == 'twitter':
+            contact = s['handle']
+        elif service == 'mastodon':
+            contact = s['handle'] + '@' + s['server']
+        elif service == 'email':
+            contact = s['handle'] + '@mail'
+        elif service == 'phone':
+            contact = 'n/a'
+        else:
+            contact = None
+        return contact
+
+    def handwritten(s):
+        return {f: contact(s) for f in fields}
+    return mapping, sources, handwritten
+
+
+def wide_flat(rng):
+    keys = ['field_{}'.format(i) for i in range(500)]
+    sources = [{k: rng.randint(0, 1000) for k in keys}
+               for _ in range(RECORDS // 10)]
+    outs = [('out_' + k, k) for k in keys]
+    mapping = {out: S(k) for out, k in outs}
+
+    def handwritten(s):
+        return {out: s[k] for out, k in outs}
+    return mapping, sources, handwritten
+
+
+def deeply_nested(rng):
+    depth = 30
+    sources = [{'v': rng.random()} for _ in range(RECORDS)]
+    mapping = S('v')
+    for _ in range(depth):
+        mapping = {'level': mapping}
+
+    def handwritten(s):
+        out = s['v']
+        for _ in range(depth):
+            out = {'level': out}
+        return out
+    return mapping, sources, handwritten
+
+
+CASES = [
+    ('deep_s', deep_s),
+    ('optional_s_misses', optional_s_misses),
+    ('alternation_fallbacks', alternation_fallbacks),
+    ('sparse_payload', sparse_payload),
+    ('format', format_),
+    ('protected_format', protected_format),
+    ('forall_bend_10k', forall_bend),
+    ('switch_dispatch', switch_dispatch),
+    ('wide_flat_500', wide_flat),
+    ('deeply_nested', deeply_nested),
+]
+
+
+def build_cases(pattern=None):
+    cases = []
+    for name, factory in CASES:
+        if pattern and pattern not in name:
+            continue
+        rng = random.Random('{}-{}'.format(SEED, name))
+        cases.append(Case(name, *factory(rng)))
+    return cases
+
+
+def _calibrate(func, sources):
+    def run():
+        for source in sources:
+            func(source)
+    number = 1
+    while True:
+        elapsed = min(timeit.repeat(run, number=number, repeat=3))
+        if elapsed > 0.05:
+            break
+        number *= 2
+    return run, number
+
+
+def _time(funcs, sources, repeat):
+    """
+    Return the best time per record of each of `funcs`, timed in turns so
+    that load on the machine weighs on all of them alike.
+    """
+    timers = [_calibrate(func, sources) for func in funcs]
+    best = [float('inf')] * len(timers)
+    for _ in range(repeat):
+        for i, (run, number) in enumerate(timers):
+            best[i] = min(best[i], timeit.timeit(run, number=number) / number)
+    return [elapsed / len(sources) for elapsed in best]
+
+
+def measure(case, repeat=5):
+    """
+    Return a dict with the time per record of the hand-written function, of
+    bend() and of the compiled mapping, and the ratios of the latter two
+    to the first.
+    """
+    compiled = compile(case.mapping)
+    for source in case.sources[:10]:
+        expected = case.handwritten(source)
+        assert bend(case.mapping, source) == expected, case.name
+        assert compiled(source) == expected, case.name
+
+    handwritten, bent, fast = _time(
+        [case.handwritten, lambda s: bend(case.mapping, s), compiled],
+        case.sources, repeat)
+    return {
+        'handwritten_us': handwritten * 1e6,
+        'bend_us': bent * 1e6,
+        'compiled_us': fast * 1e6,
+        'bend_ratio': bent / handwritten,
+        'compiled_ratio': fast / handwritten,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Return a list of (case, metric, old, new) for every ratio that grew
+    more than `threshold` (a fraction) over the baseline.
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        old = baseline.get(name)
+        if not old:
+            continue
+        for metric in ('bend_ratio', 'compiled_ratio'):
+            if metric in old and result[metric] > old[metric] * (1 + threshold):
+                regressions.append((name, metric, old[metric], result[metric]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-k', dest='pattern',
+                        help='only run cases whose name contains PATTERN')
+    parser.add_argument('--save', action='store_true',
+                        help='store the results as the new baseline')
+    parser.add_argument('--baseline', default=BASELINE,
+                        help='baseline file (default: %(default)s)')
+    parser.add_argument('--threshold', type=float, default=0.5,
+                        help='relative growth of a ratio over the baseline '
+                             'reported as a regression (default: '
+                             '%(default)s)')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    results = {}
+    print('{:<24}{:>14}{:>12}{:>10}{:>14}{:>10}'.format(
+        'case', 'handwritten', 'bend', 'ratio', 'compiled', 'ratio'))
+    for case in build_cases(args.pattern):
+        r = results[case.name] = measure(case, args.repeat)
+        print('{:<24}{:>12.2f}us{:>10.2f}us{:>9.1f}x{:>12.2f}us{:>9.1f}x'
+              .format(case.name, r['handwritten_us'], r['bend_us'],
+                      r['bend_ratio'], r['compiled_us'],
+                      r['compiled_ratio']))
+
+    if args.save:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update((name, {k: round(v, 3) for k, v in r.items()
+                                if k.endswith('_ratio')})
+                        for name, r in results.items())
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print('Saved baseline to {}'.format(args.baseline))
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print('No baseline to compare to, run with --save to create one.')
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    for name, metric, old, new in regressions:
+        print('REGRESSION {} {}: {:.2f}x -> {:.2f}x'.format(name, metric,
+                                                           old, new))
+    if not regressions:
+        print('No regressions over {:.0%}.'.format(args.threshold))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,12 @@
 from jsonbender.core import Bender, Context, bend, BendingException
-from jsonbender.list_ops import FlatForall, Forall, Filter, Reduce
+from jsonbender.list_ops import FlatForall, Forall, Filter, Reduce, fuse
 from jsonbender.string_ops import Format
 from jsonbender.selectors import F, K, S, OptionalS
 from jsonbender.control_flow import Alternation, If, Switch
+from jsonbender.compiler import compile
+from jsonbender.optimizer import optimize
+from jsonbender.batch import bend_many
+from jsonbender.streaming import bend_to_stream
 
 
 __version__ = '0.9.2'
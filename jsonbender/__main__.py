@@ -0,0 +1,6 @@
+import sys
+
+from jsonbender.cli import main
+
+
+sys.exit(main())
@@ -1,8 +1,34 @@
+import os
 import sys
 
 PY2 = sys.version_info[0] == 2
 
 if not PY2:
+    from time import monotonic  # noqa
+    replace = os.replace
     iteritems = lambda d: iter(d.items())
+    imap = map
+    ifilter = filter
+
+    def move_to_end(ordered_dict, key):
+        ordered_dict.move_to_end(key)
 else:
+    from time import time as monotonic  # noqa
+    # only atomic on POSIX
+    replace = os.rename
     iteritems = lambda d: d.iteritems()
+    from itertools import imap, ifilter  # noqa
+
+    def move_to_end(ordered_dict, key):
+        ordered_dict[key] = ordered_dict.pop(key)
+
+
+def with_metaclass(meta, *bases):
+    """
+    Create a base class with a metaclass, in a way that works on both
+    Python 2 and 3 (borrowed from six).
+    """
+    class metaclass(meta):
+        def __new__(cls, name, this_bases, d):
+            return meta(name, bases, d)
+    return type.__new__(metaclass, str('temporary_class'), (), {})
@@ -0,0 +1,460 @@
+"""
+Bend mappings that call coroutine functions, with asyncio.
+
+`abend()` and `abend_many()` bend like `bend()`, but the functions of `F`
+benders that are coroutine functions, and those of `AF` benders, are
+awaited. Awaits that don't depend on each other run concurrently: the keys
+of a mapping, the operands of an operator, the arguments of a `Format`, the
+elements of a list in `Forall`, `Forall.bend()` etc. and, with
+`abend_many()`, the sources of a batch.
+
+Everything that doesn't await is evaluated just like `bend()` would. The
+results and exceptions are the same as those of `bend()` with equivalent
+synchronous functions, but every independent bender is evaluated even
+when an earlier one fails, and in a different order.
+
+Awaiting functions is supported inside the built-in benders only;
+user-defined benders can't await the benders inside them.
+
+This module requires Python 3.5 or later.
+"""
+import asyncio
+from functools import partial
+from inspect import iscoroutinefunction
+from itertools import chain
+
+from jsonbender.core import (Add, And, Bender, Compose, Concat, Div, Eq,
+                             Invert, Mul, Neg, Or, Sub, _bend, _key_error,
+                             bend, iter_benders)
+from jsonbender.control_flow import Alternation, If, Switch
+from jsonbender.list_ops import (Filter, FlatForall, Forall, ForallBend,
+                                 Reduce)
+from jsonbender.selectors import F, ProtectedF
+from jsonbender.string_ops import Format, ProtectedFormat
+
+
+class AF(F):
+    """
+    Like F, but for any function returning an awaitable, which is awaited.
+    Coroutine functions can be passed to F as well; AF is needed for other
+    callables, like objects with an `async def __call__()`.
+    It can only be bent with `abend()` or `abend_many()`.
+
+    Example:
+    ```
+    async def geocode(address):
+        ...
+    await abend({'location': S('address') >> AF(geocode)}, source)
+    ```
+    """
+    def evaluate(self, value, context):
+        raise TypeError('AF benders can only be bent with abend() or '
+                        'abend_many()')
+
+
+async def abend(mapping, source, context=None, limit=None):
+    """
+    Bend `source` like `bend()`, awaiting the functions of `F` and `AF`
+    benders that return awaitables.
+
+    mapping: the map of benders
+    source: a dict to be bent
+    context: optional. the bending context.
+    limit: optional. the maximum number of functions awaited at the same
+           time, to avoid overloading the services they call.
+
+    Example:
+    ```
+    async def rate(currency):
+        ...
+    mapping = {'total': S('amount') * (S('currency') >> F(rate))}
+    await abend(mapping, {'amount': 10, 'currency': 'EUR'})
+    ```
+    """
+    context = {} if context is None else context
+    run = _plan(mapping)
+    if run is None:
+        return bend(mapping, source, context)
+    return await run(source, context, _limiter(limit))
+
+
+async def abend_many(mapping, sources, context=None, limit=None):
+    """
+    Bend each source with the same mapping, concurrently, returning the
+    list of results.
+
+    mapping: the map of benders, as passed to `abend()`.
+    sources: an iterable of sources.
+    context: optional. the context passed to every bend.
+    limit: optional. the maximum number of functions awaited at the same
+           time across all the sources.
+
+    If bending any source fails, the exception of the first one that failed
+    is raised once all of them are done.
+    """
+    context = {} if context is None else context
+    sources = list(sources)
+    run = _plan(mapping)
+    if run is None:
+        return [bend(mapping, s, context) for s in sources]
+    limiter = _limiter(limit)
+    results = await asyncio.gather(
+        *[run(s, context, limiter) for s in sources], return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+
+class _Unlimited(object):
+    async def __aenter__(self):
+        pass
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+def _limiter(limit):
+    if limit is None:
+        return _Unlimited()
+    if limit < 1:
+        raise ValueError('limit must be at least 1, not {!r}'.format(limit))
+    return asyncio.Semaphore(limit)
+
+
+class _Raised(object):
+    """
+    The exception raised by one of many benders evaluated together.
+    """
+
+    __slots__ = ('exception',)
+
+    def __init__(self, exception):
+        self.exception = exception
+
+
+def _unwrap(result):
+    if type(result) is _Raised:
+        raise result.exception
+    return result
+
+
+async def _settle(plans, value, context, limiter):
+    """
+    Evaluate each `(sync, run)` plan, running the async ones concurrently,
+    and return their results in order, with the exceptions they raised
+    wrapped in _Raised.
+    """
+    pending = [run(value, context, limiter)
+               for _, run in plans if run is not None]
+    if len(pending) == 1:
+        try:
+            done = iter([await pending[0]])
+        except Exception as e:
+            done = iter([e])
+    else:
+        done = iter(await asyncio.gather(*pending, return_exceptions=True))
+
+    results = []
+    for sync, run in plans:
+        if run is None:
+            try:
+                results.append(sync(value, context))
+            except Exception as e:
+                results.append(_Raised(e))
+        else:
+            result = next(done)
+            if isinstance(result, Exception):
+                result = _Raised(result)
+            elif isinstance(result, BaseException):
+                raise result
+            results.append(result)
+    return results
+
+
+async def _call(func, value, args, kwargs, limiter):
+    async with limiter:
+        return await func(value, *args, **kwargs)
+
+
+# -- plans --
+#
+# A plan is a coroutine function `run(value, context, limiter)` evaluating
+# a mapping or a bender, or None for those that don't await anything,
+# which are evaluated synchronously.
+
+def _plan(mapping):
+    if isinstance(mapping, list):
+        return _plan_list(mapping)
+    elif isinstance(mapping, dict):
+        return _plan_dict(mapping)
+    elif isinstance(mapping, Bender):
+        planner = _PLANNERS.get(type(mapping), _plan_other)
+        return planner(mapping)
+    else:
+        return None
+
+
+def _sync_plan(mapping):
+    """
+    Return the `(sync, run)` plan of `mapping`.
+    """
+    if isinstance(mapping, Bender):
+        return mapping.evaluate, _plan(mapping)
+    return partial(_bend, mapping), _plan(mapping)
+
+
+def _is_sync(plans):
+    return all(run is None for _, run in plans)
+
+
+async def _evaluate(plan, value, context, limiter):
+    sync, run = plan
+    if run is None:
+        return sync(value, context)
+    return await run(value, context, limiter)
+
+
+def _plan_list(mapping):
+    plans = [_sync_plan(v) for v in mapping]
+    if _is_sync(plans):
+        return None
+
+    async def run(value, context, limiter):
+        results = await _settle(plans, value, context, limiter)
+        return [_unwrap(r) for r in results]
+    return run
+
+
+def _plan_dict(mapping):
+    keys = list(mapping)
+    plans = [_sync_plan(mapping[k]) for k in keys]
+    if _is_sync(plans):
+        return None
+
+    async def run(value, context, limiter):
+        results = await _settle(plans, value, context, limiter)
+        res = {}
+        for k, result in zip(keys, results):
+            if type(result) is _Raised:
+                raise _key_error(k, result.exception)
+            res[k] = result
+        return res
+    return run
+
+
+def _plan_other(bender):
+    if any(_plan(child) is not None for child in bender.children()):
+        raise TypeError(
+            "{} benders can't await the benders inside them; only the "
+            'built-in benders can'.format(type(bender).__name__))
+    return None
+
+
+def _plan_f(bender):
+    func, args, kwargs = bender._func, bender._args, bender._kwargs
+    if type(bender) is not AF and not iscoroutinefunction(func):
+        return None
+    protected = isinstance(bender, ProtectedF)
+
+    async def run(value, context, limiter):
+        if protected and value == bender._protect_against:
+            return value
+        return await _call(func, value, args, kwargs, limiter)
+    return run
+
+
+def _plan_compose(bender):
+    first = _sync_plan(bender._first)
+    second = _sync_plan(bender._second)
+    if _is_sync([first, second]):
+        return None
+
+    async def run(value, context, limiter):
+        value = await _evaluate(first, value, context, limiter)
+        return await _evaluate(second, value, context, limiter)
+    return run
+
+
+def _plan_unary(bender):
+    inner = _sync_plan(bender.bender)
+    if inner[1] is None:
+        return None
+
+    async def run(value, context, limiter):
+        return bender.op(await _evaluate(inner, value, context, limiter))
+    return run
+
+
+def _plan_binary(bender):
+    plans = [_sync_plan(bender._bender1), _sync_plan(bender._bender2)]
+    if _is_sync(plans):
+        return None
+
+    async def run(value, context, limiter):
+        r1, r2 = await _settle(plans, value, context, limiter)
+        return bender.op(_unwrap(r1), _unwrap(r2))
+    return run
+
+
+def _plan_concat(bender):
+    plans = [_sync_plan(b) for b in bender.benders]
+    if _is_sync(plans):
+        return None
+
+    async def run(value, context, limiter):
+        results = await _settle(plans, value, context, limiter)
+        # add in the same order as Concat, which stops at the first error
+        result = _unwrap(results[0])
+        for r in results[1:]:
+            result = result + _unwrap(r)
+        return result
+    return run
+
+
+def _plan_format(bender):
+    names = list(bender._named_benders)
+    plans = ([_sync_plan(b) for b in bender._positional_benders] +
+             [_sync_plan(bender._named_benders[k]) for k in names])
+    if _is_sync(plans):
+        return None
+    count = len(bender._positional_benders)
+    protected = type(bender) is ProtectedFormat
+
+    async def run(value, context, limiter):
+        results = [_unwrap(r) for r in
+                   await _settle(plans, value, context, limiter)]
+        args, kwargs = results[:count], dict(zip(names, results[count:]))
+        if protected and any(r is None for r in results):
+            return None
+        return bender._format_str.format(*args, **kwargs)
+    return run
+
+
+def _plan_if(bender):
+    condition = _sync_plan(bender.condition)
+    when_true = _sync_plan(bender.when_true)
+    when_false = _sync_plan(bender.when_false)
+    if _is_sync([condition, when_true, when_false]):
+        return None
+
+    async def run(value, context, limiter):
+        if await _evaluate(condition, value, context, limiter):
+            return await _evaluate(when_true, value, context, limiter)
+        return await _evaluate(when_false, value, context, limiter)
+    return run
+
+
+def _plan_switch(bender):
+    key_plan = _sync_plan(bender.key_bender)
+    # the plans of the cases, by the identity of their benders
+    plans = {id(b): _sync_plan(b)
+             for b in chain(iter_benders(bender.cases),
+                            iter_benders(bender.default))}
+    if _is_sync([key_plan] + list(plans.values())):
+        return None
+
+    async def run(value, context, limiter):
+        key = await _evaluate(key_plan, value, context, limiter)
+        try:
+            case = bender.cases[key]
+        except LookupError:
+            if bender.default:
+                case = bender.default
+            else:
+                raise
+        return await _evaluate(plans[id(case)], value, context, limiter)
+    return run
+
+
+def _plan_alternation(bender):
+    plans = [_sync_plan(b) for b in bender.benders]
+    if _is_sync(plans):
+        return None
+
+    async def run(value, context, limiter):
+        for plan in plans[:-1]:
+            try:
+                return await _evaluate(plan, value, context, limiter)
+            except LookupError:
+                pass
+        return await _evaluate(plans[-1], value, context, limiter)
+    return run
+
+
+def _plan_list_op(bender):
+    if bender._bender is not None:
+        # the deprecated inner bender
+        return _plan_other(bender)
+    func = bender._func
+    if not iscoroutinefunction(func):
+        return None
+    kind = type(bender)
+
+    async def run(value, context, limiter):
+        values = list(value)
+        if kind is Reduce:
+            if not values:
+                raise ValueError('reduce() of empty iterable with no '
+                                 'initial value')
+            result = values[0]
+            for v in values[1:]:
+                result = await _call(func, result, (v,), {}, limiter)
+            return result
+
+        results = [_unwrap(r) for r in await _settle(
+            [(None, partial(_call_with, func, v)) for v in values],
+            None, context, limiter)]
+        if kind is Forall:
+            return results
+        elif kind is Filter:
+            return [v for v, keep in zip(values, results) if keep]
+        return list(chain.from_iterable(results))
+    return run
+
+
+async def _call_with(func, v, value, context, limiter):
+    return await _call(func, v, (), {}, limiter)
+
+
+def _plan_forall_bend(bender):
+    inner = _plan(bender._mapping)
+    if inner is None:
+        return None
+    elif bender._executor is not None:
+        raise TypeError("Forall.bend() can't await the benders inside it "
+                        'when it bends on an executor')
+
+    async def run(value, context, limiter):
+        context = bender._context or context
+        plans = [(None, partial(_bend_item, inner, v)) for v in value]
+        return [_unwrap(r) for r in
+                await _settle(plans, None, context, limiter)]
+    return run
+
+
+async def _bend_item(run, item, value, context, limiter):
+    return await run(item, context, limiter)
+
+
+_PLANNERS = {
+    F: _plan_f,
+    ProtectedF: _plan_f,
+    AF: _plan_f,
+    Compose: _plan_compose,
+    Neg: _plan_unary,
+    Invert: _plan_unary,
+    Concat: _plan_concat,
+    Format: _plan_format,
+    ProtectedFormat: _plan_format,
+    If: _plan_if,
+    Switch: _plan_switch,
+    Alternation: _plan_alternation,
+    Forall: _plan_list_op,
+    Filter: _plan_list_op,
+    FlatForall: _plan_list_op,
+    Reduce: _plan_list_op,
+    ForallBend: _plan_forall_bend,
+}
+_PLANNERS.update((cls, _plan_binary)
+                 for cls in (Add, Sub, Mul, Div, Eq, And, Or))
@@ -0,0 +1,339 @@
+"""
+Bending many sources with the same mapping.
+"""
+from collections import deque
+from functools import partial
+from importlib import import_module
+from itertools import islice
+import json
+import marshal
+import sys
+
+from jsonbender.cache import LRUCache
+from jsonbender.compiler import compile_function
+from jsonbender.control_flow import Alternation, If, Switch
+from jsonbender.core import (MISSING, Add, And, Compose, Concat, Div, Eq,
+                             GetItem, Invert, Mul, Neg, Or, Sub, iter_benders)
+from jsonbender.list_ops import (Filter, FlatForall, Forall, ForallBend,
+                                 Reduce)
+from jsonbender.selectors import CachedF, F, K, OptionalS, ProtectedF, S
+from jsonbender.string_ops import Format, ProtectedFormat
+
+
+def _split_reference(reference):
+    """
+    Return the module name and the attribute path of a reference of the
+    form 'package.module:NAME' (or 'package.module.NAME').
+    """
+    if ':' in reference:
+        module_name, _, attr = reference.partition(':')
+    else:
+        module_name, _, attr = reference.rpartition('.')
+    if not module_name or not attr:
+        raise ValueError('Invalid mapping reference {!r}, expected '
+                         "'package.module:NAME'".format(reference))
+    return module_name, attr
+
+
+def load_mapping(reference):
+    """
+    Import a mapping given a reference of the form 'package.module:NAME'.
+    'package.module.NAME' is accepted as well.
+    """
+    module_name, attr = _split_reference(reference)
+    obj = import_module(module_name)
+    for name in attr.split('.'):
+        obj = getattr(obj, name)
+    return obj
+
+
+def bend_many(mapping, sources, context=None, **options):
+    """
+    Bend each source with the same mapping.
+
+    mapping: the map of benders, as passed to `bend()`.
+    sources: any iterable of sources, including generators.
+    context: optional. the context passed to every bend.
+    options: passed on to `compile()`.
+
+    The mapping is compiled once (see `compile()`), and the results are
+    produced lazily, one per source, as the returned iterator is consumed.
+    Sources are never held in memory, so bending a stream of any size
+    runs in constant memory.
+
+    Example:
+    ```
+    rows = bend_many({'b': S('a')}, [{'a': 23}, {'a': 27}])
+    list(rows)  # -> [{'b': 23}, {'b': 27}]
+    ```
+    """
+    func = compile_function(mapping, **options)
+    context = {} if context is None else context
+    return (func(source, context) for source in sources)
+
+
+class ResultCache(object):
+    """
+    Bends sources with a mapping, keeping the results of the sources seen
+    before, so that duplicates (like retried or fanned-out webhook
+    payloads) aren't bent again.
+
+    mapping: the map of benders, as passed to `bend()`. Its functions must
+             only depend on their input, or cached results would go stale.
+    max_bytes: the memory limit of the cache. Sources and results are kept
+               serialized (with `marshal`), and the least recently used
+               ones are evicted once their size goes over the limit.
+    key_context: whether the context can be part of the key of the
+                 results. A mapping that may read the context (because it
+                 has `Context()` or user-defined benders) can only be
+                 cached with it; a ValueError is raised otherwise.
+    options: passed on to `compile()`.
+
+    Sources are looked up by their serialized form, or by the raw JSON
+    document with `bend_json()`. Cached results are returned as new
+    copies, so callers can modify them freely.
+    Sources and results that `marshal` can't serialize, like those holding
+    datetimes, are bent every time; `uncacheable` counts them.
+
+    Example:
+    ```
+    cache = ResultCache(MAPPING, max_bytes=64 << 20)
+    for line in webhook_lines:
+        publish(cache.bend_json(line))
+    cache.info()  # -> CacheInfo(hits=..., misses=..., ...)
+    ```
+    """
+
+    def __init__(self, mapping, max_bytes=64 << 20, key_context=False,
+                 **options):
+        reads_context = _reads_context(mapping)
+        if reads_context and not key_context:
+            raise ValueError(
+                'The mapping may read the context, so its results can only '
+                'be cached with the context as part of the key '
+                '(key_context=True)')
+        # the context is left out of the key when it can't change results
+        self._key_context = reads_context
+        self.uncacheable = 0
+        self._func = compile_function(mapping, **options)
+        self._lru = LRUCache(maxsize=max_bytes)
+
+    def bend(self, source, context=None):
+        """
+        Return the result of bending `source`, like `bend()`.
+        """
+        context = {} if context is None else context
+        try:
+            key = self._key('obj', marshal.dumps(source, _KEY_VERSION),
+                            context)
+        except ValueError:
+            self.uncacheable += 1
+            return self._func(source, context)
+        return self._bend(key, source, None, context)
+
+    def bend_json(self, document, context=None):
+        """
+        Return the result of bending the JSON `document` (bytes or text),
+        like `bend(json.loads(document))`.
+        Duplicate documents are neither bent nor parsed again.
+        """
+        context = {} if context is None else context
+        try:
+            key = self._key('json', document, context)
+        except ValueError:
+            self.uncacheable += 1
+            return self._func(_loads(document), context)
+        return self._bend(key, None, document, context)
+
+    def bend_many(self, sources, context=None):
+        """
+        Like `bend_many()`: return an iterator over the results of bending
+        each source.
+        """
+        return (self.bend(source, context) for source in sources)
+
+    def info(self):
+        """
+        Return a CacheInfo with the number of hits, misses and evictions,
+        and the memory limit and use in bytes.
+        """
+        return self._lru.info()
+
+    def clear(self):
+        """
+        Forget every result and reset the statistics.
+        """
+        self._lru.clear()
+        self.uncacheable = 0
+
+    def _key(self, kind, data, context):
+        # sources and documents share the cache, so the kind tells a
+        # marshalled source from a document with the same bytes
+        if self._key_context:
+            return kind, data, marshal.dumps(context, _KEY_VERSION)
+        return kind, data, None
+
+    def _bend(self, key, source, document, context):
+        blob = self._lru.get(key)
+        if blob is not MISSING:
+            return marshal.loads(blob)
+        if document is not None:
+            source = _loads(document)
+        result = self._func(source, context)
+        try:
+            blob = marshal.dumps(result)
+        except ValueError:
+            self.uncacheable += 1
+        else:
+            self._lru.set(key, blob, size=len(key[1]) + len(blob) +
+                          len(key[2] or b''))
+        return result
+
+
+# Sources are serialized without references between objects, which depend
+# on reference counts and would make equal sources serialize differently.
+_KEY_VERSION = 2
+
+
+def _loads(document):
+    if isinstance(document, bytes):
+        document = document.decode('utf-8')
+    return json.loads(document)
+
+
+# Benders that don't read the context themselves. Every other bender, like
+# user-defined ones, might.
+_CONTEXT_FREE_TYPES = frozenset([
+    K, S, OptionalS, GetItem, F, ProtectedF, CachedF, Compose, Concat,
+    Format, ProtectedFormat, If, Switch, Alternation, Forall, Filter,
+    FlatForall, Reduce, ForallBend, Neg, Invert, Add, Sub, Mul, Div, Eq, And,
+    Or])
+
+
+def _reads_context(mapping):
+    return any(type(bender) not in _CONTEXT_FREE_TYPES or
+               _reads_context(bender.children())
+               for bender in iter_benders(mapping))
+
+
+def bend_parallel(mapping, sources, context=None, workers=None,
+                  chunksize=1000, mp_context=None, mapping_cache=None,
+                  **options):
+    """
+    Bend each source with the same mapping on a pool of worker processes.
+
+    mapping: the map of benders, or a reference to it of the form
+             'package.module:NAME' (see `load_mapping()`).
+    sources: any iterable of sources, including generators.
+    context: optional. the context passed to every bend.
+    workers: the number of worker processes. Defaults to the number of
+             CPUs.
+    chunksize: how many sources are sent to a worker at a time.
+    mp_context: optional. the multiprocessing context used to start the
+                workers, as accepted by ProcessPoolExecutor.
+    mapping_cache: optional. a directory where workers keep the mapping,
+                   when passed by reference, serialized (see
+                   `MappingCache`), so that they load it from there instead
+                   of importing it.
+    options: passed on to `compile()`.
+
+    The mapping and the context are sent to each worker once, when it
+    starts, and compiled there (see `compile()`). Sources are then sent in
+    chunks. Results are yielded lazily and in the same order as the
+    sources, and only a few chunks per worker are in flight at any time, so
+    memory use stays flat.
+
+    Unless the workers are forked, the mapping has to be pickled to be
+    sent to them, which fails for lambdas and other callables that can't be
+    imported by name. Such mappings can instead be passed by reference, in
+    which case each worker imports the mapping itself.
+
+    If bending a source fails, the BendingException is raised when its
+    result would have been yielded.
+
+    Needs Python 3.7 or later.
+    """
+    if sys.version_info < (3, 7):
+        # older ProcessPoolExecutors can't run an initializer in the
+        # workers, which is how the mapping is sent to them only once
+        raise RuntimeError('bend_parallel() needs Python 3.7 or later')
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+
+    pool_options = {}
+    if mp_context is None:
+        start_method = multiprocessing.get_start_method()
+    else:
+        start_method = mp_context.get_start_method()
+        pool_options['mp_context'] = mp_context
+    if start_method != 'fork' and not isinstance(mapping, str):
+        _check_picklable(mapping)
+
+    workers = workers or multiprocessing.cpu_count()
+    context = {} if context is None else context
+    executor = partial(ProcessPoolExecutor, max_workers=workers,
+                       initializer=_init_worker,
+                       initargs=(mapping, context, options, mapping_cache),
+                       **pool_options)
+    return _bend_chunks(executor, _chunks(sources, chunksize), workers * 2)
+
+
+def _check_picklable(mapping):
+    import pickle
+    try:
+        pickle.dumps(mapping, pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        raise TypeError(
+            "The mapping can't be sent to the worker processes ({}). "
+            'Use importable functions instead of lambdas, or pass the '
+            "mapping by reference, as 'package.module:NAME'.".format(e))
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _bend_chunks(make_executor, chunks, max_pending):
+    # the pool is only started once results are asked for, so that it's
+    # always shut down below, however the iteration ends
+    executor = make_executor()
+    pending = deque()
+    try:
+        for chunk in chunks:
+            pending.append(executor.submit(_bend_chunk, chunk))
+            if len(pending) >= max_pending:
+                for result in pending.popleft().result():
+                    yield result
+        while pending:
+            for result in pending.popleft().result():
+                yield result
+    finally:
+        for future in pending:
+            future.cancel()
+        # results that are abandoned don't wait for the chunks in flight
+        executor.shutdown(wait=not pending)
+
+
+_worker_func = None
+_worker_context = None
+
+
+def _init_worker(mapping, context, options, mapping_cache=None):
+    global _worker_func, _worker_context
+    if isinstance(mapping, str) and mapping_cache is not None:
+        from jsonbender.serialization import MappingCache
+        mapping = MappingCache(mapping_cache).load(mapping)
+    elif isinstance(mapping, str):
+        mapping = load_mapping(mapping)
+    _worker_func = compile_function(mapping, **options)
+    _worker_context = context
+
+
+def _bend_chunk(chunk):
+    func, context = _worker_func, _worker_context
+    return [func(source, context) for source in chunk]
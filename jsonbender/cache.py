@@ -0,0 +1,120 @@
+"""
+Caches used by the benders.
+"""
+from collections import OrderedDict, namedtuple
+import threading
+
+from jsonbender.core import MISSING
+from jsonbender._compat import monotonic, move_to_end
+
+
+class CacheInfo(namedtuple('CacheInfo', ['hits', 'misses', 'evictions',
+                                         'maxsize', 'currsize'])):
+    """
+    Statistics of a cache, like those of `functools.lru_cache()`, plus the
+    number of entries evicted to make room for new ones.
+    """
+
+    __slots__ = ()
+
+    @property
+    def hit_rate(self):
+        """
+        The fraction of the lookups that were hits, or 0 before any lookup.
+        """
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
+
+
+class LRUCache(object):
+    """
+    A mapping of keys to values holding at most `maxsize` entries (or any
+    number of them if it's None), evicting the least recently used ones
+    to make room for new ones.
+    Entries can be given a size other than 1, e.g. in bytes, in which case
+    `maxsize` bounds the sum of their sizes.
+    If `ttl` is given, entries expire that many seconds after they were
+    set.
+    It can be used from many threads at once.
+    """
+
+    def __init__(self, maxsize=128, ttl=None):
+        if maxsize is not None and maxsize < 0:
+            raise ValueError('maxsize must not be negative, not {!r}'
+                             .format(maxsize))
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.clear()
+
+    def get(self, key):
+        """
+        Return the value for `key`, or MISSING if it's not in the cache,
+        counting the lookup as a hit or a miss.
+        Raises TypeError if `key` is unhashable.
+        """
+        with self._lock:
+            try:
+                entry = self._entries.get(key)
+            except TypeError:
+                self.misses += 1
+                raise
+            if entry is not None:
+                value, expires, size = entry
+                if expires is None or monotonic() < expires:
+                    move_to_end(self._entries, key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self._size -= size
+            self.misses += 1
+            return MISSING
+
+    def set(self, key, value, size=1):
+        """
+        Set the value for `key`, evicting the least recently used entries
+        if the cache is full.
+        Values larger than the whole cache are not kept.
+        Raises TypeError if `key` is unhashable.
+        """
+        expires = None if self.ttl is None else monotonic() + self.ttl
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[2]
+            if self.maxsize is not None and size > self.maxsize:
+                return
+            self._entries[key] = (value, expires, size)
+            self._size += size
+            if self.maxsize is not None:
+                while self._size > self.maxsize:
+                    self._size -= self._entries.popitem(last=False)[1][2]
+                    self.evictions += 1
+
+    def clear(self):
+        """
+        Remove every entry and reset the statistics.
+        """
+        with self._lock:
+            self._entries = OrderedDict()
+            self._size = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def info(self):
+        """
+        Return the CacheInfo with the statistics of the cache.
+        Its `currsize` is the sum of the sizes of the entries.
+        """
+        return CacheInfo(self.hits, self.misses, self.evictions,
+                         self.maxsize, self._size)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getstate__(self):
+        # locks can't be pickled, and the entries are only worth keeping in
+        # the process that computed them
+        return {'maxsize': self.maxsize, 'ttl': self.ttl}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
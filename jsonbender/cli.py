@@ -0,0 +1,186 @@
+"""
+Command line interface: bend newline-delimited JSON.
+
+    jsonbender package.module:MAPPING [FILE ...] [-o OUTPUT]
+    jsonbender package.module:MAPPING --explain [--max-cost COST]
+
+Records are read one line at a time through large buffers and written out
+the same way, so the memory used doesn't depend on the size of the input.
+"""
+from __future__ import print_function
+
+import argparse
+import io
+import json
+import os
+import sys
+import timeit
+
+from jsonbender.batch import ResultCache, load_mapping
+from jsonbender.compiler import compile_function
+from jsonbender.explain import explain
+from jsonbender.serialization import MappingCache
+
+
+BUFFER_SIZE = 1 << 20
+
+FAIL, SKIP, DEAD_LETTER = 'fail', 'skip', 'dead-letter'
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog='jsonbender',
+        description='Bend newline-delimited JSON records with a mapping.')
+    parser.add_argument(
+        'mapping',
+        help="the mapping to use, as an import path like 'pkg.module:NAME'")
+    parser.add_argument(
+        'files', nargs='*', metavar='FILE',
+        help='NDJSON files to read. Reads from stdin if none are given, or '
+             'for "-"')
+    parser.add_argument(
+        '-o', '--output', default='-',
+        help='file to write the bent records to (default: stdout)')
+    parser.add_argument(
+        '-c', '--context', type=json.loads, default=None,
+        help='the bending context, as JSON')
+    parser.add_argument(
+        '-e', '--errors', choices=(FAIL, SKIP, DEAD_LETTER), default=FAIL,
+        help='what to do with records that fail to parse or bend: stop '
+             '(fail, the default), drop them (skip) or write them to '
+             '--dead-letter (dead-letter)')
+    parser.add_argument(
+        '--dead-letter', metavar='FILE',
+        help='file to write failed input lines to, with --errors '
+             'dead-letter')
+    parser.add_argument(
+        '--cache-bytes', type=int, default=0, metavar='BYTES',
+        help='keep the results of up to BYTES bytes of records, so that '
+             'duplicate records are not bent again (default: 0, no cache)')
+    parser.add_argument(
+        '--mapping-cache', metavar='DIR',
+        help='keep the mapping serialized in DIR, and load it from there '
+             'instead of importing it while its module is unchanged')
+    parser.add_argument(
+        '--buffer-size', type=int, default=BUFFER_SIZE,
+        help='size in bytes of the read and write buffers')
+    parser.add_argument(
+        '--explain', action='store_true',
+        help='print the plan of the mapping and its estimated cost per '
+             'record (see explain()) instead of bending anything')
+    parser.add_argument(
+        '--max-cost', type=int, metavar='COST',
+        help='with --explain, exit with status 1 if the estimated cost of '
+             'the mapping is over COST')
+    parser.add_argument(
+        '-q', '--quiet', action='store_true',
+        help="don't print the summary to stderr")
+    return parser
+
+
+def _open(path, mode, buffer_size, std):
+    if path == '-':
+        return io.open(std.fileno(), mode, buffering=buffer_size,
+                       closefd=False)
+    return io.open(path, mode, buffering=buffer_size)
+
+
+def _lines(paths, buffer_size, stdin):
+    for path in paths or ['-']:
+        with _open(path, 'rb', buffer_size, stdin) as f:
+            for lineno, line in enumerate(f, 1):
+                yield path, lineno, line
+
+
+def main(argv=None, stdin=None, stdout=None, stderr=None):
+    """
+    Run the command line interface, returning the exit status.
+    """
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+    parser = _parser()
+    args = parser.parse_args(argv)
+    if args.max_cost is not None and not args.explain:
+        parser.error('--max-cost must be given with --explain')
+    if (args.errors == DEAD_LETTER) != bool(args.dead_letter):
+        parser.error('--dead-letter FILE must be given with, and only '
+                     'with, --errors dead-letter')
+
+    # find the mappings of the working directory, as `python -m jsonbender`
+    # would, when run as the console script
+    cwd = os.getcwd()
+    if '' not in sys.path and cwd not in sys.path:
+        sys.path.insert(0, cwd)
+    if args.mapping_cache:
+        mapping = MappingCache(args.mapping_cache).load(args.mapping)
+    else:
+        mapping = load_mapping(args.mapping)
+    if args.explain:
+        plan = explain(mapping)
+        plan.report(file=stdout)
+        if args.max_cost is not None and plan.cost > args.max_cost:
+            print('jsonbender: the estimated cost, {}, is over {}'.format(
+                plan.cost, args.max_cost), file=stderr)
+            return 1
+        return 0
+    context = {} if args.context is None else args.context
+    if args.cache_bytes:
+        cache = ResultCache(mapping, max_bytes=args.cache_bytes,
+                            key_context=True)
+        bend_line = cache.bend_json
+    else:
+        cache = None
+        func = compile_function(mapping)
+
+        def bend_line(line, context):
+            return func(json.loads(line.decode('utf-8')), context)
+    dumps = json.JSONEncoder().encode
+
+    out = _open(args.output, 'wb', args.buffer_size, stdout)
+    dead_letter = None
+    if args.dead_letter:
+        dead_letter = _open(args.dead_letter, 'wb', args.buffer_size, stderr)
+
+    bent = failed = 0
+    status = 0
+    start = timeit.default_timer()
+    try:
+        for path, lineno, line in _lines(args.files, args.buffer_size,
+                                         stdin):
+            if not line.strip():
+                continue
+            try:
+                # encoding errors, like results that aren't JSON, are
+                # errors of the record too
+                encoded = dumps(bend_line(line, context)).encode('utf-8')
+            except Exception as e:
+                failed += 1
+                if args.errors == FAIL:
+                    print('jsonbender: {}:{}: {}'.format(
+                        path, lineno, e), file=stderr)
+                    status = 1
+                    break
+                elif dead_letter is not None:
+                    dead_letter.write(line if line.endswith(b'\n')
+                                      else line + b'\n')
+                continue
+            out.write(encoded)
+            out.write(b'\n')
+            bent += 1
+    finally:
+        out.close()
+        if dead_letter is not None:
+            dead_letter.close()
+
+    if not args.quiet:
+        elapsed = timeit.default_timer() - start
+        print('jsonbender: bent {} records, {} failed, in {:.2f}s '
+              '({:.0f} records/s)'.format(bent, failed, elapsed,
+                                          bent / elapsed if elapsed else 0),
+              file=stderr)
+        if cache is not None:
+            info = cache.info()
+            print('jsonbender: {} cache hits ({:.0%})'.format(
+                info.hits, info.hit_rate), file=stderr)
+    return status
@@ -0,0 +1,319 @@
+"""
+Bend many flat records at once, column by column, with NumPy.
+
+`bend_columns()` evaluates each bender of a mapping once for all the
+records instead of once per record: `S` paths are extracted into arrays
+and arithmetic, comparison and logical operators (`Add`, `Sub`, `Mul`,
+`Div`, `Eq`, `And`, `Or`, `Neg` and `Invert`) run as vectorized NumPy
+operations. Any other bender is evaluated record by record on the values
+computed so far, so every mapping is supported.
+
+Results are the same as those of `bend()`: values are converted back to
+plain Python objects, integer operations that could overflow and columns
+of mixed types are computed with Python objects, and if anything fails
+the records are bent again one by one with `bend()` so that the same
+exception is raised. Functions in `F` benders are called column by
+column, so in a different order than with `bend()`.
+
+This module requires NumPy.
+"""
+import operator
+
+import numpy as np
+
+from jsonbender.core import (Add, And, Bender, Compose, Div, Eq, GetItem,
+                             Invert, Mul, Neg, Or, Sub, bend)
+from jsonbender.selectors import K, S
+from jsonbender._compat import iteritems
+
+
+_INT64_LIMIT = 2 ** 63
+
+# Element-wise versions of the operators, applied to object arrays.
+_OBJECT_OPS = {
+    Add: np.frompyfunc(operator.add, 2, 1),
+    Sub: np.frompyfunc(operator.sub, 2, 1),
+    Mul: np.frompyfunc(operator.mul, 2, 1),
+    Div: np.frompyfunc(lambda v1, v2: float(v1) / float(v2), 2, 1),
+    Eq: np.frompyfunc(operator.eq, 2, 1),
+    And: np.frompyfunc(lambda v1, v2: v1 and v2, 2, 1),
+    Or: np.frompyfunc(lambda v1, v2: v1 or v2, 2, 1),
+    Neg: np.frompyfunc(operator.neg, 1, 1),
+    Invert: np.frompyfunc(operator.not_, 1, 1),
+}
+
+
+def bend_columns(mapping, sources, context=None, output='records'):
+    """
+    Bend each source with the same mapping, evaluating the mapping over
+    whole columns of values at once.
+
+    mapping: the map of benders, as passed to `bend()`.
+    sources: an iterable of sources.
+    context: optional. the context passed to every bend.
+    output: 'records' to return a list with a result per source, like
+            `[bend(mapping, s, context) for s in sources]`, or 'columns'
+            to return the mapping with each bender replaced by the list of
+            its values for all the sources.
+
+    Example:
+    ```
+    mapping = {'total': S('price') * S('qty')}
+    sources = [{'price': 2.5, 'qty': 2}, {'price': 1.0, 'qty': 3}]
+    bend_columns(mapping, sources)  # -> [{'total': 5.0}, {'total': 3.0}]
+    bend_columns(mapping, sources, output='columns')
+    # -> {'total': [5.0, 3.0]}
+    ```
+    """
+    if output not in ('records', 'columns'):
+        raise ValueError("output must be 'records' or 'columns', not {!r}"
+                         .format(output))
+    context = {} if context is None else context
+    sources = list(sources)
+    try:
+        # Python raises on division by zero, but not on overflows
+        with np.errstate(divide='raise', invalid='raise', over='ignore',
+                         under='ignore'):
+            columns = _Evaluator(sources, context).mapping(mapping)
+    except Exception:
+        # Bend again record by record to get the same exception bend()
+        # would raise, or the result of Python's own arithmetic.
+        records = [bend(mapping, s, context) for s in sources]
+        if output == 'records':
+            return records
+        return _records_to_columns(mapping, records)
+
+    if output == 'columns':
+        return columns
+    return _columns_to_records(mapping, columns, len(sources))
+
+
+class _Evaluator(object):
+    def __init__(self, sources, context):
+        self.sources = sources
+        self.context = context
+        # Values of the paths selected from the sources, as lists and as
+        # arrays, by path
+        self.paths = {(): sources}
+        self.arrays = {}
+
+    def mapping(self, mapping):
+        if isinstance(mapping, list):
+            return [self.mapping(v) for v in mapping]
+        elif isinstance(mapping, dict):
+            return {k: self.mapping(v) for k, v in iteritems(mapping)}
+        elif isinstance(mapping, Bender):
+            return self.values(mapping, self.sources)
+        else:
+            return [mapping] * len(self.sources)
+
+    def values(self, bender, rows):
+        """
+        Return a list with the values of `bender` for each of `rows`.
+        """
+        kind = type(bender)
+        if kind is S:
+            return self.select(rows, bender._path)
+        elif kind is GetItem:
+            return self.select(rows, (bender._index,))
+        elif kind is K:
+            return [bender._val] * len(rows)
+        elif kind is Compose:
+            return self.values(bender._second,
+                               self.values(bender._first, rows))
+        elif kind in _OBJECT_OPS:
+            return self.array(bender, rows).tolist()
+        else:
+            return [bender.evaluate(row, self.context) for row in rows]
+
+    def array(self, bender, rows):
+        """
+        Return an array with the values of `bender` for each of `rows`.
+        """
+        kind = type(bender)
+        if kind in (Neg, Invert):
+            return _unary_op(kind, self.array(bender.bender, rows))
+        elif kind in _OBJECT_OPS:
+            return _binary_op(kind, self.array(bender._bender1, rows),
+                              self.array(bender._bender2, rows))
+        elif kind is Compose:
+            return self.array(bender._second,
+                              self.values(bender._first, rows))
+        elif kind is K:
+            return np.broadcast_to(_column([bender._val]), (len(rows),))
+        elif kind is S and rows is self.sources:
+            array = self.arrays.get(bender._path)
+            if array is None:
+                array = self.arrays[bender._path] = _column(
+                    self.select(rows, bender._path))
+            return array
+        else:
+            return _column(self.values(bender, rows))
+
+    def select(self, rows, path):
+        if rows is not self.sources:
+            for key in path:
+                rows = list(map(operator.itemgetter(key), rows))
+            return rows
+
+        # Paths selected from the sources often share prefixes, so the
+        # values of every prefix are kept.
+        values = self.paths.get(path)
+        if values is not None:
+            return list(values)
+        for i in range(len(path) - 1, -1, -1):
+            values = self.paths.get(path[:i])
+            if values is not None:
+                break
+        for j in range(i, len(path)):
+            values = list(map(operator.itemgetter(path[j]), values))
+            self.paths[path[:j + 1]] = values
+        return values
+
+
+def _column(values):
+    """
+    Return an array of `values`, typed when they are all bools, ints that
+    fit in 64 bits or floats.
+    """
+    types = set(map(type, values))
+    if types == {float}:
+        return np.array(values, dtype=np.float64)
+    elif types == {bool}:
+        return np.array(values, dtype=np.bool_)
+    elif types == {int}:
+        try:
+            return np.array(values, dtype=np.int64)
+        except OverflowError:
+            pass
+    return np.fromiter(values, dtype=object, count=len(values))
+
+
+def _is_numeric(array):
+    return array.dtype.kind in 'bif'
+
+
+def _as_number(array):
+    # Python does arithmetic on bools as ints
+    return array.astype(np.int64) if array.dtype.kind == 'b' else array
+
+
+def _bound(array):
+    if not array.size:
+        return 0
+    return max(abs(int(array.min())), abs(int(array.max())))
+
+
+def _unary_op(kind, v):
+    if not _is_numeric(v):
+        return _OBJECT_OPS[kind](v)
+    if kind is Invert:
+        return np.logical_not(v)
+    v = _as_number(v)
+    if v.dtype.kind == 'i' and v.size and int(v.min()) == -_INT64_LIMIT:
+        return _OBJECT_OPS[kind](v.astype(object))
+    return -v
+
+
+def _binary_op(kind, v1, v2):
+    if not (_is_numeric(v1) and _is_numeric(v2)):
+        return _OBJECT_OPS[kind](v1.astype(object), v2.astype(object))
+    if kind is Eq:
+        # Python compares ints and floats exactly, without converting
+        if 'f' in (v1.dtype.kind, v2.dtype.kind) and v1.dtype != v2.dtype:
+            return _OBJECT_OPS[kind](v1.astype(object), v2.astype(object))
+        return v1 == v2
+    elif kind in (And, Or):
+        # the result is one of the operands, so they must keep their types
+        if v1.dtype != v2.dtype:
+            return _OBJECT_OPS[kind](v1.astype(object), v2.astype(object))
+        truth = v1.astype(np.bool_)
+        if kind is And:
+            return np.where(truth, v2, v1)
+        return np.where(truth, v1, v2)
+    elif kind is Div:
+        # dividing inf or nan by zero sets no floating-point error flag
+        if (v2 == 0).any():
+            raise ZeroDivisionError('division by zero')
+        return v1.astype(np.float64) / v2.astype(np.float64)
+
+    v1, v2 = _as_number(v1), _as_number(v2)
+    if v1.dtype.kind == 'i' and v2.dtype.kind == 'i':
+        b1, b2 = _bound(v1), _bound(v2)
+        bound = b1 * b2 if kind is Mul else b1 + b2
+        if bound >= _INT64_LIMIT:
+            return _OBJECT_OPS[kind](v1.astype(object), v2.astype(object))
+    if kind is Add:
+        return v1 + v2
+    elif kind is Sub:
+        return v1 - v2
+    else:
+        return v1 * v2
+
+
+def _columns_to_records(mapping, columns, count):
+    """
+    Return the list of results of the mapping given its columns, built by
+    a generated function with the shape of the mapping.
+    """
+    leaves = []
+    namespace = {}
+    expr = _record_expr(mapping, columns, leaves, namespace)
+    if leaves:
+        loop = 'for ({},) in zip(*columns)'.format(
+            ', '.join('v{}'.format(i) for i in range(len(leaves))))
+    else:
+        loop = 'for _ in range(count)'
+    code = 'def build(columns, count):\n    return [{} {}]'.format(expr, loop)
+    try:
+        exec(compile(code, '<jsonbender columnar>', 'exec'), namespace)
+    except (SyntaxError, RuntimeError, MemoryError):
+        # too deeply nested
+        return _zip_records(mapping, columns, count)
+    return namespace['build'](leaves, count)
+
+
+def _record_expr(mapping, columns, leaves, namespace):
+    if isinstance(mapping, dict):
+        items = []
+        for k, v in iteritems(mapping):
+            name = '_k{}'.format(len(namespace))
+            namespace[name] = k
+            items.append('{}: {}'.format(
+                name, _record_expr(v, columns[k], leaves, namespace)))
+        return '{{{}}}'.format(', '.join(items))
+    elif isinstance(mapping, list):
+        return '[{}]'.format(', '.join(
+            _record_expr(m, c, leaves, namespace)
+            for m, c in zip(mapping, columns)))
+    else:
+        leaves.append(columns)
+        return 'v{}'.format(len(leaves) - 1)
+
+
+def _zip_records(mapping, columns, count):
+    if isinstance(mapping, dict):
+        keys = list(columns)
+        values = [_zip_records(mapping[k], columns[k], count) for k in keys]
+        if not keys:
+            return [{} for _ in range(count)]
+        return [dict(zip(keys, row)) for row in zip(*values)]
+    elif isinstance(mapping, list):
+        values = [_zip_records(m, c, count)
+                  for m, c in zip(mapping, columns)]
+        if not values:
+            return [[] for _ in range(count)]
+        return [list(row) for row in zip(*values)]
+    else:
+        return columns
+
+
+def _records_to_columns(mapping, records):
+    if isinstance(mapping, dict):
+        return {k: _records_to_columns(v, [r[k] for r in records])
+                for k, v in iteritems(mapping)}
+    elif isinstance(mapping, list):
+        return [_records_to_columns(v, [r[i] for r in records])
+                for i, v in enumerate(mapping)]
+    else:
+        return records
@@ -0,0 +1,744 @@
+"""
+Compile bend() mappings into specialized Python functions.
+
+`bend()` walks the mapping tree on every call, dispatching on the type of
+each node. `compile()` does that walk once and generates the source of a
+single Python function with the walk unrolled, so bending a record costs
+roughly what a hand-written function would.
+
+Benders that the compiler doesn't know how to inline (including every
+user-defined bender and any subclass of a built-in one other than the
+selectors of `specialize()`) are called as regular benders from the
+generated code, so the compiled function always gives the same results as
+`bend()`.
+"""
+import re
+from functools import reduce
+from itertools import chain
+
+from jsonbender.core import (MISSING as _MISSING, Add, And, Bender,
+                             Compose, Concat, Context, Div, Eq, GetItem,
+                             Invert, Mul, Neg, Or, Sub, _key_error,
+                             _structural_key)
+from jsonbender.control_flow import Alternation, If, Switch
+from jsonbender.list_ops import (Filter, FlatForall, Forall, ForallBend,
+                                 fuse as fuse_list_ops)
+from jsonbender.selectors import F, K, OptionalS, ProtectedF, S
+from jsonbender.specialize import SpecializedOptionalS, SpecializedS
+from jsonbender.string_ops import Format, ProtectedFormat
+from jsonbender._compat import ifilter, imap, iteritems
+
+
+_py_compile = compile
+
+_BINARY_OPS = {
+    Add: '({} + {})',
+    Sub: '({} - {})',
+    Mul: '({} * {})',
+    Div: '(float({}) / float({}))',
+    Eq: '({} == {})',
+    And: '({} and {})',
+    Or: '({} or {})',
+}
+
+_UNARY_OPS = {
+    Neg: '(-{})',
+    Invert: '(not {})',
+}
+
+_LIST_OPS = {
+    Forall: 'list(map({}, {}))',
+    Filter: 'list(filter({}, {}))',
+    FlatForall: 'list(_chain_from_iterable(map({}, {})))',
+}
+
+# The same operations producing lazy iterators, for when they are followed
+# by another list operation.
+_LAZY_LIST_OPS = {
+    Forall: '_imap({}, {})',
+    Filter: '_ifilter({}, {})',
+    FlatForall: '_chain_from_iterable(_imap({}, {}))',
+}
+
+_LITERAL_TYPES = (bool, int, str, type(None))
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# Python refuses to compile more than 20 statically nested blocks. Dicts
+# deeper than this are compiled into functions of their own.
+_MAX_BLOCK_DEPTH = 12
+
+# Switches with more cases than this dispatch through a dict of functions
+# instead of an if/elif chain.
+_MAX_INLINE_CASES = 8
+
+# Shared subexpressions aren't memoized past this indentation level, which
+# keeps clear of Python's limit of 100.
+_MAX_MEMO_LEVEL = 60
+
+
+class _Function(object):
+    """
+    The body of a generated function.
+    Lines are kept with their indentation level relative to the body.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.lines = []
+        self.level = 0
+        self.depth = 0
+        self.memo = {}
+        self.prefixes = {}
+
+    def emit(self, line):
+        self.lines.append((self.level, line))
+
+    def source(self, result):
+        out = ['def {}(source, context):'.format(self.name)]
+        body = self.lines + [(0, 'return {}'.format(result))]
+        out.extend('    ' * (level + 1) + line for level, line in body)
+        return '\n'.join(out)
+
+
+class _Compiler(object):
+    def __init__(self, cse=False, share_prefixes=False):
+        self.cse = cse
+        self.share_prefixes = share_prefixes
+        self.namespace = {
+            'LookupError': LookupError,
+            '_MISSING': _MISSING,
+            '_chain_from_iterable': chain.from_iterable,
+            '_imap': imap,
+            '_key_error': _key_error,
+            '_ifilter': ifilter,
+        }
+        self.sources = []
+        self.literals = set()
+        self.fixups = []
+        self.counter = 0
+        self.func = None
+
+    # -- naming helpers --
+
+    def fresh(self, prefix):
+        self.counter += 1
+        return '_{}{}'.format(prefix, self.counter)
+
+    def const(self, value):
+        """
+        Return an expression for the constant `value`.
+        Literals are inlined, everything else is bound in the namespace of
+        the generated code.
+        """
+        if type(value) in _LITERAL_TYPES or (
+                type(value) is float and float(repr(value)) == value):
+            literal = repr(value)
+            self.literals.add(literal)
+            return literal
+        name = self.fresh('c')
+        self.namespace[name] = value
+        return name
+
+    def tmp(self, expr):
+        name = self.fresh('t')
+        self.func.emit('{} = {}'.format(name, expr))
+        return name
+
+    def atom(self, expr):
+        """
+        Make sure `expr` is evaluated now, returning a name or literal
+        that can be used any number of times.
+        """
+        if _IDENTIFIER.match(expr) or expr in self.literals:
+            return expr
+        return self.tmp(expr)
+
+    # -- buffering helpers --
+
+    def capture(self, gen, *args):
+        """
+        Run `gen(*args)` collecting the lines it emits instead of emitting
+        them. Return `(expr, lines)`.
+        """
+        saved_lines, saved_level = self.func.lines, self.func.level
+        self.func.lines, self.func.level = [], 0
+        try:
+            expr = gen(*args)
+            return expr, self.func.lines
+        finally:
+            self.func.lines, self.func.level = saved_lines, saved_level
+
+    def splice(self, lines, extra_level=0):
+        base = self.func.level + extra_level
+        self.func.lines.extend((base + level, line) for level, line in lines)
+
+    def sequence(self, items):
+        """
+        Generate each `(gen, args)` item in order and return the list of
+        expressions, preserving the evaluation order of the items even if
+        some of them need to emit statements.
+        """
+        exprs = []
+        for gen, args in items:
+            expr, lines = self.capture(gen, *args)
+            if lines:
+                exprs = [self.atom(e) for e in exprs]
+                self.splice(lines)
+            exprs.append(expr)
+        return exprs
+
+    def block(self, header, gen, *args):
+        """
+        Emit `header` followed by an indented block generated by `gen`.
+        """
+        self.func.emit(header)
+        self.func.level += 1
+        self.func.depth += 1
+        try:
+            return gen(*args)
+        finally:
+            self.func.level -= 1
+            self.func.depth -= 1
+
+    # -- functions --
+
+    def function(self, mapping):
+        """
+        Compile `mapping` into a new function, returning its name.
+        """
+        name = self.fresh('bend')
+        outer, self.func = self.func, _Function(name)
+        try:
+            if self.cse:
+                for key in _shared_subtrees(mapping):
+                    self.func.memo[key] = slot = self.fresh('m')
+                    self.func.emit('{} = _MISSING'.format(slot))
+            if self.share_prefixes:
+                for prefix in _shared_prefixes(mapping):
+                    self.func.prefixes[prefix] = slot = self.fresh('p')
+                    self.func.emit('{} = _MISSING'.format(slot))
+            result = self.mapping(mapping, 'source', 'context')
+            self.sources.append(self.func.source(result))
+        finally:
+            self.func = outer
+        return name
+
+    # -- mappings --
+
+    def mapping(self, mapping, src, ctx):
+        if isinstance(mapping, list):
+            items = [(self.mapping, (v, src, ctx)) for v in mapping]
+            return '[{}]'.format(', '.join(self.sequence(items)))
+
+        elif isinstance(mapping, dict):
+            if self.func.depth >= _MAX_BLOCK_DEPTH:
+                name = self.function(mapping)
+                return '{}({}, {})'.format(name, src, ctx)
+            res = self.fresh('r')
+            self.func.emit('{} = {{}}'.format(res))
+            for k, v in iteritems(mapping):
+                self.block('try:', self.dict_item, res, k, v, src, ctx)
+                self.func.emit('except Exception as e:')
+                self.func.emit(
+                    '    raise _key_error({}, e)'.format(self.const(k)))
+            return res
+
+        elif isinstance(mapping, Bender):
+            return self.bender(mapping, src, ctx)
+
+        else:
+            return self.const(mapping)
+
+    def dict_item(self, res, k, v, src, ctx):
+        expr = self.mapping(v, src, ctx)
+        self.func.emit('{}[{}] = {}'.format(res, self.const(k), expr))
+
+    # -- benders --
+
+    def bender(self, bender, src, ctx):
+        gen = _GENERATORS.get(type(bender), _Compiler.generic)
+        if (self.func.memo and src == 'source' and ctx == 'context' and
+                self.func.level < _MAX_MEMO_LEVEL and
+                type(bender) in _PURE_TYPES):
+            slot = self.func.memo.get(bender.structural_key())
+            if slot is not None:
+                return self.memoized(slot, gen, bender, src, ctx)
+        return gen(self, bender, src, ctx)
+
+    def memoized(self, slot, gen, bender, src, ctx):
+        """
+        Evaluate `bender` at most once per call of the generated function,
+        keeping its value in the variable `slot`.
+        If evaluating it raises, it will be evaluated (and raise) again the
+        next time it's needed, just like without memoization.
+        """
+        self.func.emit('if {} is _MISSING:'.format(slot))
+        expr = self.block_body(gen, self, bender, src, ctx)
+        self.func.emit('    {} = {}'.format(slot, expr))
+        return slot
+
+    def generic(self, bender, src, ctx):
+        return '{}({}, {})'.format(self.const(bender.evaluate), src, ctx)
+
+    def k(self, bender, src, ctx):
+        return self.const(bender._val)
+
+    def s(self, bender, src, ctx):
+        path = bender._path
+        if self.func.prefixes and src == 'source':
+            src, path = self.shared_prefix(path)
+        return self.path(src, path)
+
+    def path(self, src, path):
+        return src + ''.join('[{}]'.format(self.const(key)) for key in path)
+
+    def shared_prefix(self, path):
+        """
+        Return a name holding the value of the longest shared proper prefix
+        of `path`, along with the rest of the path.
+        The prefix is read from the source (through shorter shared
+        prefixes) the first time it's needed.
+        """
+        key = _path_key(path)
+        for n in range(len(path) - 1, 0, -1):
+            slot = self.func.prefixes.get(key[:n])
+            if slot is not None:
+                self.func.emit('if {} is _MISSING:'.format(slot))
+                self.block_body(self.fill_prefix, slot, path[:n])
+                return slot, path[n:]
+        return 'source', path
+
+    def fill_prefix(self, slot, prefix):
+        src, rest = self.shared_prefix(prefix)
+        self.func.emit('{} = {}'.format(slot, self.path(src, rest)))
+
+    def optional_s(self, bender, src, ctx):
+        res = self.fresh('t')
+        self.block('try:', self.assign, res, bender, src, ctx, S)
+        self.func.emit('except LookupError:')
+        self.func.emit('    {} = {}'.format(res, self.const(bender.default)))
+        return res
+
+    def get_item(self, bender, src, ctx):
+        return '{}[{}]'.format(src, self.const(bender._index))
+
+    def context(self, bender, src, ctx):
+        return ctx
+
+    def compose(self, bender, src, ctx, lazy=False):
+        second = bender._second
+        if bender._fused and second._lazy_input:
+            first = self.lazy(bender._first, src, ctx)
+        else:
+            first = self.bender(bender._first, src, ctx)
+        if first in self.literals:
+            # literals can't be subscripted without a SyntaxWarning
+            first = self.tmp(first)
+        elif type(second) not in (S, GetItem, F):
+            first = self.atom(first)
+        if lazy:
+            return self.lazy(second, first, ctx)
+        return self.bender(second, first, ctx)
+
+    def lazy(self, bender, src, ctx):
+        """
+        Like bender(), but list operations produce lazy iterators instead
+        of lists (see `Bender.evaluate_lazy()`).
+        """
+        kind = type(bender)
+        if kind in _LAZY_LIST_OPS and bender._bender is None:
+            return _LAZY_LIST_OPS[kind].format(self.const(bender._func), src)
+        elif kind is ForallBend:
+            return self.forall_bend(bender, src, ctx, lazy=True)
+        elif kind is Compose and not _is_pure(bender):
+            # pure compositions have no list operations and may be memoized
+            return self.compose(bender, src, ctx, lazy=True)
+        elif kind not in _GENERATORS:
+            return '{}({}, {})'.format(self.const(bender.evaluate_lazy),
+                                       src, ctx)
+        return self.bender(bender, src, ctx)
+
+    def f(self, bender, src, ctx):
+        args = [src]
+        if bender._args:
+            args.append('*' + self.const(bender._args))
+        if bender._kwargs:
+            args.append('**' + self.const(bender._kwargs))
+        return '{}({})'.format(self.const(bender._func), ', '.join(args))
+
+    def protected_f(self, bender, src, ctx):
+        src = self.atom(src)
+        return '({} if {} == {} else {})'.format(
+            src, src, self.const(bender._protect_against),
+            self.f(bender, src, ctx))
+
+    def unary_op(self, bender, src, ctx):
+        val = self.operand(self.bender(bender.bender, src, ctx))
+        return _UNARY_OPS[type(bender)].format(val)
+
+    def binary_op(self, bender, src, ctx):
+        src = self.atom(src)
+        v1, v2 = self.sequence([(self.bender, (bender._bender1, src, ctx)),
+                                (self.bender, (bender._bender2, src, ctx))])
+        if type(bender) in (And, Or):
+            # both operands are always evaluated, so no short-circuiting
+            v1, v2 = self.atom(v1), self.atom(v2)
+        else:
+            v1 = self.operand(v1)
+            if v2.startswith('('):
+                # v2 will be evaluated into a variable, so v1 must be first
+                v1 = self.atom(v1)
+            v2 = self.operand(v2)
+        return _BINARY_OPS[type(bender)].format(v1, v2)
+
+    def concat(self, bender, src, ctx):
+        # the chain of `+` is already as fast as it gets in generated code
+        return self.bender(reduce(Add, bender.benders), src, ctx)
+
+    def operand(self, expr):
+        # keep generated expressions shallow so that long operator chains
+        # don't hit the parser's nesting limit
+        if expr.startswith('('):
+            return self.atom(expr)
+        return expr
+
+    def format(self, bender, src, ctx):
+        if not all(_IDENTIFIER.match(k) for k in bender._named_benders):
+            return self.generic(bender, src, ctx)
+        args = self.format_args(bender, src, ctx)
+        return '{}.format({})'.format(self.const(bender._format_str),
+                                      ', '.join(args))
+
+    def protected_format(self, bender, src, ctx):
+        if not all(_IDENTIFIER.match(k) for k in bender._named_benders):
+            return self.generic(bender, src, ctx)
+        args = self.format_args(bender, src, ctx, atoms=True)
+        expr = '{}.format({})'.format(self.const(bender._format_str),
+                                      ', '.join(args))
+        if not args:
+            return expr
+        values = [arg.split('=', 1)[-1] for arg in args]
+        if 'None' in values:
+            return 'None'
+        # other literals are never None, and `is` can't test them without
+        # a SyntaxWarning
+        names = [v for v in values if v not in self.literals]
+        if not names:
+            return expr
+        return '(None if {} else {})'.format(
+            ' or '.join('{} is None'.format(v) for v in names), expr)
+
+    def format_args(self, bender, src, ctx, atoms=False):
+        """
+        Return the arguments of the call to `str.format()`, with each value
+        evaluated to a name or literal if `atoms` is true.
+        """
+        src = self.atom(src)
+        named = bender._named_benders
+        items = [(self.bender, (b, src, ctx))
+                 for b in bender._positional_benders]
+        items.extend((self.bender, (b, src, ctx)) for b in named.values())
+        exprs = self.sequence(items)
+        if atoms:
+            exprs = [self.atom(e) for e in exprs]
+        n = len(bender._positional_benders)
+        return exprs[:n] + ['{}={}'.format(k, e)
+                            for k, e in zip(named, exprs[n:])]
+
+    def if_(self, bender, src, ctx):
+        src = self.atom(src)
+        cond = self.bender(bender.condition, src, ctx)
+        true, true_lines = self.capture(self.bender, bender.when_true,
+                                        src, ctx)
+        false, false_lines = self.capture(self.bender, bender.when_false,
+                                          src, ctx)
+        if not true_lines and not false_lines:
+            return '({} if {} else {})'.format(true, cond, false)
+        res = self.fresh('t')
+        self.func.emit('if {}:'.format(cond))
+        self.splice(true_lines, 1)
+        self.func.emit('    {} = {}'.format(res, true))
+        self.func.emit('else:')
+        self.splice(false_lines, 1)
+        self.func.emit('    {} = {}'.format(res, false))
+        return res
+
+    def alternation(self, bender, src, ctx):
+        if not bender.benders:
+            return self.generic(bender, src, ctx)
+        src = self.atom(src)
+        res = self.fresh('t')
+        init, last = bender.benders[:-1], bender.benders[-1]
+        for i, b in enumerate(init):
+            if i:
+                self.func.emit('if {} is _MISSING:'.format(res))
+                self.func.level += 1
+            self.block('try:', self.assign, res, b, src, ctx)
+            self.func.emit('except LookupError:')
+            self.func.emit('    {} = _MISSING'.format(res))
+            if i:
+                self.func.level -= 1
+        if init:
+            self.func.emit('if {} is _MISSING:'.format(res))
+            self.block_body(self.assign, res, last, src, ctx)
+        else:
+            self.assign(res, last, src, ctx)
+        return res
+
+    def assign(self, name, bender, src, ctx, as_type=None):
+        if as_type is None:
+            expr = self.bender(bender, src, ctx)
+        else:
+            expr = _GENERATORS[as_type](self, bender, src, ctx)
+        self.func.emit('{} = {}'.format(name, expr))
+
+    def block_body(self, gen, *args):
+        self.func.level += 1
+        self.func.depth += 1
+        try:
+            return gen(*args)
+        finally:
+            self.func.level -= 1
+            self.func.depth -= 1
+
+    def switch(self, bender, src, ctx):
+        if type(bender.cases) is not dict:
+            return self.generic(bender, src, ctx)
+        src = self.atom(src)
+        key = self.atom(self.bender(bender.key_bender, src, ctx))
+        if len(bender.cases) > _MAX_INLINE_CASES:
+            return self.switch_dispatch(bender, key, src, ctx)
+
+        branches = list(bender.cases.values())
+        dispatch = self.const({k: i for i, k in enumerate(bender.cases)})
+        i = self.fresh('t')
+        if bender.default:
+            self.func.emit('{} = {}.get({}, -1)'.format(i, dispatch, key))
+            branches.append(bender.default)
+        else:
+            # raise the same KeyError as indexing the cases would
+            self.func.emit('{} = {}[{}]'.format(i, dispatch, key))
+        res = self.fresh('t')
+        for n, b in enumerate(branches):
+            last = n == len(branches) - 1
+            if n == 0:
+                header = 'if {} == {}:'.format(i, n)
+            else:
+                header = 'else:' if last else 'elif {} == {}:'.format(i, n)
+            if n == 0 and last:
+                self.assign(res, b, src, ctx)
+            else:
+                self.block(header, self.assign, res, b, src, ctx)
+        return res
+
+    def switch_dispatch(self, bender, key, src, ctx):
+        # the table is filled with the generated functions once they exist
+        table = {}
+        for k, b in iteritems(bender.cases):
+            self.fixups.append((table, k, self.function(b)))
+        table = self.const(table)
+        if bender.default:
+            default = self.function(bender.default)
+            return '{}.get({}, {})({}, {})'.format(table, key, default,
+                                                   src, ctx)
+        return '{}[{}]({}, {})'.format(table, key, src, ctx)
+
+    def forall(self, bender, src, ctx):
+        if bender._bender is not None:
+            return self.generic(bender, src, ctx)
+        return _LIST_OPS[type(bender)].format(self.const(bender._func), src)
+
+    def forall_bend(self, bender, src, ctx, lazy=False):
+        if bender._executor is not None:
+            return self.generic(bender, src, ctx)
+        func = self.function(bender._mapping)
+        if bender._context is not None:
+            ctx = self.atom('({} or {})'.format(self.const(bender._context),
+                                                ctx))
+        if lazy:
+            return '({}(v, {}) for v in {})'.format(func, ctx, src)
+        return '[{}(v, {}) for v in {}]'.format(func, ctx, src)
+
+
+# Benders whose value only depends on the value and context they are
+# evaluated with, and that are safe to evaluate once instead of many times
+# as long as everything inside them is too.
+_PURE_TYPES = frozenset([S, OptionalS, SpecializedS, SpecializedOptionalS,
+                         GetItem, Compose, Concat, Format, ProtectedFormat,
+                         If, Switch, Alternation, K, Context] +
+                        list(_UNARY_OPS) + list(_BINARY_OPS))
+
+# Benders that are too cheap to be worth memoizing.
+_CHEAP_TYPES = frozenset([K, Context, GetItem])
+
+
+def _is_pure(bender):
+    return (type(bender) in _PURE_TYPES and
+            all(_is_pure(child) for child in bender.children()))
+
+
+def _same_input_children(bender):
+    """
+    Return the benders inside `bender` that are evaluated with the same
+    value it is.
+    """
+    if type(bender) is Compose:
+        return [bender._first]
+    elif type(bender) in (ForallBend, Forall, Filter, FlatForall):
+        return []
+    elif type(bender) in _GENERATORS:
+        return bender.children()
+    return []
+
+
+def _root_benders(mapping):
+    """
+    Yield every bender of `mapping` that is evaluated with the source the
+    mapping is bent with.
+    """
+    if isinstance(mapping, list):
+        for v in mapping:
+            for bender in _root_benders(v):
+                yield bender
+    elif isinstance(mapping, dict):
+        for v in mapping.values():
+            for bender in _root_benders(v):
+                yield bender
+    elif isinstance(mapping, Bender):
+        yield mapping
+        for child in _same_input_children(mapping):
+            for bender in _root_benders(child):
+                yield bender
+
+
+def _is_cheap(bender):
+    return (type(bender) in _CHEAP_TYPES or
+            (type(bender) is S and len(bender._path) == 1))
+
+
+def _shared_subtrees(mapping):
+    """
+    Return the structural keys of the pure benders that are evaluated more
+    than once with the source of `mapping`.
+    """
+    counts = {}
+    for bender in _root_benders(mapping):
+        if _is_pure(bender) and not _is_cheap(bender):
+            key = bender.structural_key()
+            counts[key] = counts.get(key, 0) + 1
+    return [key for key, n in iteritems(counts) if n > 1]
+
+
+def _path_key(path):
+    return tuple(_structural_key(key) for key in path)
+
+
+def _shared_prefixes(mapping):
+    """
+    Return the path prefixes that more than one S or OptionalS of `mapping`
+    go through when reading the source, leaving out prefixes that are only
+    ever followed by the same next key.
+    """
+    counts = {}
+    for bender in _root_benders(mapping):
+        if type(bender) in (S, OptionalS):
+            key = _path_key(bender._path)
+            for n in range(1, len(key)):
+                counts[key[:n]] = counts.get(key[:n], 0) + 1
+    shared = set(prefix for prefix, n in iteritems(counts) if n > 1)
+    for prefix in list(shared):
+        parent = prefix[:-1]
+        if parent in shared and counts[parent] == counts[prefix]:
+            shared.discard(parent)
+    return sorted(shared, key=len)
+
+
+_GENERATORS = {
+    K: _Compiler.k,
+    S: _Compiler.s,
+    OptionalS: _Compiler.optional_s,
+    # the generated code is already specialized
+    SpecializedS: _Compiler.s,
+    SpecializedOptionalS: _Compiler.optional_s,
+    GetItem: _Compiler.get_item,
+    Context: _Compiler.context,
+    Compose: _Compiler.compose,
+    Concat: _Compiler.concat,
+    F: _Compiler.f,
+    ProtectedF: _Compiler.protected_f,
+    Format: _Compiler.format,
+    ProtectedFormat: _Compiler.protected_format,
+    If: _Compiler.if_,
+    Alternation: _Compiler.alternation,
+    Switch: _Compiler.switch,
+    Forall: _Compiler.forall,
+    Filter: _Compiler.forall,
+    FlatForall: _Compiler.forall,
+    ForallBend: _Compiler.forall_bend,
+}
+_GENERATORS.update((cls, _Compiler.unary_op) for cls in _UNARY_OPS)
+_GENERATORS.update((cls, _Compiler.binary_op) for cls in _BINARY_OPS)
+
+
+def compile(mapping, cse=False, share_prefixes=False, fuse=False):
+    """
+    Compile a mapping into a function that bends a single source.
+
+    mapping: the map of benders, as passed to `bend()`.
+    cse: optional. if true, benders that appear more than once in the
+         mapping (compared with `Bender.structural_key()`) and that only
+         depend on the source are evaluated at most once per source.
+         Only built-in selectors, operators, Format and control flow
+         benders are shared this way, never F or user-defined benders,
+         which may have side effects.
+    share_prefixes: optional. if true, path prefixes shared by several S or
+                    OptionalS selectors (like ('payload', 'order') in
+                    S('payload', 'order', 'id') and
+                    S('payload', 'order', 'total')) are looked up once per
+                    source. Errors are the same as without it, and
+                    OptionalS still returns its default on any missing key.
+    fuse: optional. if true, the mapping is compiled as `fuse(mapping)`,
+          running chained list operations as a single lazy pipeline.
+          See `jsonbender.list_ops.fuse()` for how this changes which
+          error is raised.
+
+    Returns a function `f(source, context=None)` that gives the same results
+    as `bend(mapping, source, context)`, including raising the same
+    BendingException.
+    The mapping is read once at compile time, so later changes to it are
+    not seen by the compiled function.
+
+    Example:
+    ```
+    bend_user = compile({'name': S('first') + K(' ') + S('last')})
+    bend_user({'first': 'Ada', 'last': 'Lovelace'})  # -> {'name': ...}
+    ```
+    """
+    func = compile_function(mapping, cse=cse, share_prefixes=share_prefixes,
+                            fuse=fuse)
+
+    def compiled(source, context=None):
+        return func(source, {} if context is None else context)
+
+    compiled.source = func.source
+    return compiled
+
+
+def compile_function(mapping, cse=False, share_prefixes=False, fuse=False):
+    """
+    Like `compile()`, but the returned function takes the context as a
+    required second argument, saving a call when bending many sources.
+    """
+    if fuse:
+        mapping = fuse_list_ops(mapping)
+    compiler = _Compiler(cse=cse, share_prefixes=share_prefixes)
+    entry = compiler.function(mapping)
+    code = '\n\n'.join(compiler.sources)
+    exec(_py_compile(code, '<jsonbender compiled mapping>', 'exec'),
+         compiler.namespace)
+    for table, key, name in compiler.fixups:
+        table[key] = compiler.namespace[name]
+    func = compiler.namespace[entry]
+    func.source = code
+    return func
@@ -1,4 +1,4 @@
-from jsonbender.core import Bender
+from jsonbender.core import MISSING, Bender
 from jsonbender.selectors import K
 
 
@@ -21,11 +21,19 @@ class If(Bender):
     ```
     """
 
+    __slots__ = ('condition', 'when_true', 'when_false')
+    _bender_fields = ('condition', 'when_true', 'when_false')
+
     def __init__(self, condition, when_true=K(None), when_false=K(None)):
         self.condition = condition
         self.when_true = when_true
         self.when_false = when_false
 
+    def evaluate(self, value, context):
+        if self.condition.evaluate(value, context):
+            return self.when_true.evaluate(value, context)
+        return self.when_false.evaluate(value, context)
+
     def execute(self, val):
         return (self.when_true(val)
                 if self.condition(val)
@@ -49,9 +57,32 @@ class Alternation(Bender):
     ```
     """
 
+    __slots__ = ('benders',)
+    _bender_fields = ('benders',)
+
     def __init__(self, *benders):
         self.benders = benders
 
+    def evaluate(self, value, context):
+        if not self.benders:
+            raise ValueError()
+        # probe all but the last bender without raising; the last one
+        # raises its own LookupError if it misses too
+        for bender in self.benders[:-1]:
+            result = bender.try_evaluate(value, context)
+            if result is not MISSING:
+                return result
+        return self.benders[-1].evaluate(value, context)
+
+    def try_evaluate(self, value, context):
+        for bender in self.benders:
+            result = bender.try_evaluate(value, context)
+            if result is not MISSING:
+                return result
+        if not self.benders:
+            raise ValueError()
+        return MISSING
+
     def execute(self, source):
         exc = ValueError()
         for bender in self.benders:
@@ -89,11 +120,42 @@ class Switch(Bender):
     ```
     """
 
+    __slots__ = ('key_bender', 'cases', 'default')
+    _bender_fields = ('key_bender', 'cases', 'default')
+
     def __init__(self, key_bender, cases, default=None):
         self.key_bender = key_bender
         self.cases = cases
         self.default = default
 
+    def evaluate(self, value, context):
+        key = self.key_bender.evaluate(value, context)
+        try:
+            bender = self.cases[key]
+        except LookupError:
+            if self.default:
+                bender = self.default
+            else:
+                raise
+        return bender.evaluate(value, context)
+
+    def try_evaluate(self, value, context):
+        key = self.key_bender.try_evaluate(value, context)
+        if key is MISSING:
+            return MISSING
+        if type(self.cases) is dict:
+            bender = self.cases.get(key, MISSING)
+        else:
+            try:
+                bender = self.cases[key]
+            except LookupError:
+                bender = MISSING
+        if bender is MISSING:
+            if not self.default:
+                return MISSING
+            bender = self.default
+        return bender.try_evaluate(value, context)
+
     def execute(self, source):
         key = self.key_bender(source)
         try:
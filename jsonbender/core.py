@@ -1,32 +1,185 @@
-from jsonbender._compat import iteritems
+from jsonbender._compat import iteritems, with_metaclass
 
 
-class Bender(object):
+def _evaluate_via_execute(self, value, context):
+    return self.execute(value)
+
+
+def _evaluate_via_raw_execute(self, value, context):
+    return self.raw_execute(Transport(value, context)).value
+
+
+def _evaluate_lazy_via_evaluate(self, value, context):
+    return self.evaluate(value, context)
+
+
+def _try_evaluate_via_evaluate(self, value, context):
+    try:
+        return self.evaluate(value, context)
+    except LookupError:
+        return MISSING
+
+
+class _Missing(object):
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'MISSING'
+
+    def __reduce__(self):
+        return 'MISSING'
+
+
+# Returned by try_evaluate() instead of raising LookupError.
+MISSING = _Missing()
+
+
+class BenderType(type):
+    """
+    Metaclass of all benders.
+
+    Benders can be written by overriding `evaluate()`, `execute()` or (for
+    older benders) `raw_execute()`. This makes sure `evaluate()`, which is
+    what the bending machinery calls, runs whichever of them the class
+    actually overrides.
+    It also makes classes that override any of them, but not
+    `evaluate_lazy()` or `try_evaluate()`, use the generic versions of
+    those.
+    """
+
+    def __init__(cls, name, bases, namespace):
+        super(BenderType, cls).__init__(name, bases, namespace)
+        legacy = (getattr(cls.evaluate, '__func__', cls.evaluate) is
+                  _evaluate_via_raw_execute)
+        if 'evaluate' in namespace:
+            cls._base_evaluate = namespace['evaluate']
+        elif 'execute' in namespace:
+            cls._base_evaluate = _evaluate_via_execute
+            if not legacy:
+                cls.evaluate = _evaluate_via_execute
+        if 'raw_execute' in namespace and 'evaluate' not in namespace:
+            cls.evaluate = _evaluate_via_raw_execute
+        # Lazy and non-raising evaluation must be opted into again by
+        # classes that change how they evaluate.
+        if any(m in namespace for m in ('evaluate', 'execute', 'raw_execute')):
+            if 'evaluate_lazy' not in namespace:
+                cls.evaluate_lazy = _evaluate_lazy_via_evaluate
+            if 'try_evaluate' not in namespace:
+                cls.try_evaluate = _try_evaluate_via_evaluate
+            if '_lazy_input' not in namespace:
+                cls._lazy_input = False
+
+
+class Bender(with_metaclass(BenderType, object)):
 
     """
     Base bending class. All selectors and transformations should directly or
     indirectly derive from this. Should not be instantiated.
 
-    Whenever a bender is activated (by the bend() function), the execute()
-    method is called with the source as it's single argument.
-    All bending logic should be there.
+    Whenever a bender is activated (by the bend() function), the evaluate()
+    method is called with the value being bent and the bending context.
+    By default it calls the execute() method with the value as it's single
+    argument, so simple benders only need to implement that.
 
-    Subclasses must implement __init__() and execute() methods.
+    Subclasses must implement __init__() and either execute() or evaluate().
+    Evaluating must not change the bender: everything a call needs is in its
+    arguments, so that the same mapping can be bent by many threads at once,
+    or nested inside itself.
     """
 
+    __slots__ = ()
+
+    # Names of the attributes holding inner benders, or lists, tuples and
+    # dicts (including mappings) of them.
+    _bender_fields = ()
+
+    # Names of the fields among those above that hold mappings bent
+    # separately for each element of a list (like in `Forall.bend()`).
+    _mapping_fields = ()
+
+    # Whether the bender only iterates once over the value it is evaluated
+    # with, so that when composed after another bender that one can be
+    # evaluated lazily (see `evaluate_lazy()`).
+    _lazy_input = False
+
     def __init__(self, *args, **kwargs):
         pass
 
     def __call__(self, source):
-        return self.raw_execute(source).value
+        if isinstance(source, Transport):
+            return self.evaluate(source.value, source.context)
+        return self.evaluate(source, {})
 
     def raw_execute(self, source):
+        """
+        Compatibility wrapper around evaluate() that takes and returns a
+        Transport.
+        """
         transport = Transport.from_source(source)
-        return Transport(self.execute(transport.value), transport.context)
+        value = self._base_evaluate(transport.value, transport.context)
+        return Transport(value, transport.context)
+
+    def evaluate(self, value, context):
+        """
+        Return the result of bending `value` with the given `context`.
+        The context is passed unchanged to any inner benders.
+        """
+        return self.execute(value)
+
+    def evaluate_lazy(self, value, context):
+        """
+        Like evaluate(), but may return a lazy iterator instead of a list.
+        Used when the result will only be iterated over once, to avoid
+        building intermediate lists.
+        """
+        return self.evaluate(value, context)
+
+    def try_evaluate(self, value, context):
+        """
+        Like evaluate(), but return MISSING instead of raising LookupError
+        (KeyError, IndexError etc.).
+        Selectors implement it without raising, which makes misses much
+        cheaper for the benders that expect them, like Alternation and
+        OptionalS.
+        """
+        try:
+            return self.evaluate(value, context)
+        except LookupError:
+            return MISSING
 
     def execute(self, source):
         raise NotImplementedError()
 
+    def children(self):
+        """
+        Return a list with the benders directly inside this one.
+        """
+        return [bender
+                for name in self._bender_fields
+                for bender in iter_benders(getattr(self, name))]
+
+    def structural_key(self):
+        """
+        Return a hashable key that is equal for benders of the same class
+        built from equal parameters.
+        Benders overload `==` to build `Eq` benders, so this is the way to
+        compare them, or to use them as dict keys.
+        """
+        # slots that are never set, like the `_func` of ForallBend, are
+        # MISSING
+        return (type(self),) + tuple(
+            _structural_key(getattr(self, name, MISSING))
+            for name in _field_names(self))
+
+    def __getstate__(self):
+        # pickle's default only handles __slots__ with protocol 2 and newer
+        slots = {}
+        for name in _slot_names(type(self)):
+            value = getattr(self, name, MISSING)
+            if value is not MISSING:
+                slots[name] = value
+        return getattr(self, '__dict__', None) or None, slots
+
     def __eq__(self, other):
         return Eq(self, other)
 
@@ -70,18 +223,117 @@ class Bender(object):
         return self >> GetItem(index)
 
 
+def iter_benders(value):
+    """
+    Yield the outermost benders found in `value`, which can be a bender or
+    a list, tuple or dict (like a mapping) of them.
+    """
+    if isinstance(value, Bender):
+        yield value
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            for bender in iter_benders(v):
+                yield bender
+    elif isinstance(value, dict):
+        for v in value.values():
+            for bender in iter_benders(v):
+                yield bender
+
+
+_SLOT_NAMES = {}
+
+
+def _slot_names(cls):
+    names = _SLOT_NAMES.get(cls)
+    if names is None:
+        names = []
+        for klass in reversed(cls.__mro__):
+            slots = klass.__dict__.get('__slots__', ())
+            if isinstance(slots, str):
+                slots = (slots,)
+            names.extend(n for n in slots if n not in ('__dict__',
+                                                       '__weakref__'))
+        names = _SLOT_NAMES[cls] = tuple(names)
+    return names
+
+
+def _field_names(bender):
+    names = _slot_names(type(bender))
+    instance_dict = getattr(bender, '__dict__', None)
+    if instance_dict:
+        return names + tuple(sorted(instance_dict))
+    return names
+
+
+def _structural_key(value):
+    if isinstance(value, Bender):
+        return value.structural_key()
+    elif isinstance(value, (list, tuple)):
+        return (type(value),) + tuple(_structural_key(v) for v in value)
+    elif isinstance(value, dict):
+        return (type(value),) + tuple((_structural_key(k), _structural_key(v))
+                                      for k, v in iteritems(value))
+    elif isinstance(value, float):
+        # tell 0.0 from -0.0
+        return (float, repr(value))
+    try:
+        hash(value)
+    except TypeError:
+        return ('id', id(value))
+    return (type(value), value)
+
+
 class GetItem(Bender):
+    __slots__ = ('_index',)
+
     def __init__(self, index):
         self._index = index
 
+    def evaluate(self, value, context):
+        return value[self._index]
+
+    def try_evaluate(self, value, context):
+        if type(value) is dict:
+            return value.get(self._index, MISSING)
+        try:
+            return value[self._index]
+        except LookupError:
+            return MISSING
+
     def execute(self, value):
         return value[self._index]
 
 
 class Compose(Bender):
-    def __init__(self, first, second):
+    __slots__ = ('_first', '_second', '_fused')
+    _bender_fields = ('_first', '_second')
+
+    def __init__(self, first, second, fused=False):
         self._first = first
         self._second = second
+        # whether the first bender is evaluated lazily when the second one
+        # is a list operation (see `jsonbender.list_ops.fuse()`)
+        self._fused = fused
+
+    def evaluate(self, value, context):
+        if self._fused and self._second._lazy_input:
+            value = self._first.evaluate_lazy(value, context)
+        else:
+            value = self._first.evaluate(value, context)
+        return self._second.evaluate(value, context)
+
+    def evaluate_lazy(self, value, context):
+        if self._fused and self._second._lazy_input:
+            value = self._first.evaluate_lazy(value, context)
+        else:
+            value = self._first.evaluate(value, context)
+        return self._second.evaluate_lazy(value, context)
+
+    def try_evaluate(self, value, context):
+        value = self._first.try_evaluate(value, context)
+        if value is MISSING:
+            return MISSING
+        return self._second.try_evaluate(value, context)
 
     def raw_execute(self, source):
         return self._second.raw_execute(self._first.raw_execute(source))
@@ -99,24 +351,29 @@ class UnaryOperator(Bender):
     should return the desired result.
     """
 
+    __slots__ = ('bender',)
+    _bender_fields = ('bender',)
+
     def __init__(self, bender):
         self.bender = bender
 
     def op(self, v):
         raise NotImplementedError()
 
-    def raw_execute(self, source):
-        source = Transport.from_source(source)
-        val = self.op(self.bender(source))
-        return Transport(val, source.context)
+    def evaluate(self, value, context):
+        return self.op(self.bender.evaluate(value, context))
 
 
 class Neg(UnaryOperator):
+    __slots__ = ()
+
     def op(self, v):
         return -v
 
 
 class Invert(UnaryOperator):
+    __slots__ = ()
+
     def op(self, v):
         return not v
 
@@ -133,6 +390,9 @@ class BinaryOperator(Bender):
     should return the desired result.
     """
 
+    __slots__ = ('_bender1', '_bender2')
+    _bender_fields = ('_bender1', '_bender2')
+
     def __init__(self, bender1, bender2):
         self._bender1 = bender1
         self._bender2 = bender2
@@ -140,59 +400,169 @@ class BinaryOperator(Bender):
     def op(self, v1, v2):
         raise NotImplementedError()
 
-    def raw_execute(self, source):
-        source = Transport.from_source(source)
-        val = self.op(self._bender1(source),
-                      self._bender2(source))
-        return Transport(val, source.context)
+    def evaluate(self, value, context):
+        return self.op(self._bender1.evaluate(value, context),
+                       self._bender2.evaluate(value, context))
 
 
 class Add(BinaryOperator):
+    __slots__ = ()
+
     def op(self, v1, v2):
         return v1 + v2
 
 
 class Sub(BinaryOperator):
+    __slots__ = ()
+
     def op(self, v1, v2):
         return v1 - v2
 
 
 class Mul(BinaryOperator):
+    __slots__ = ()
+
     def op(self, v1, v2):
         return v1 * v2
 
 
 class Div(BinaryOperator):
+    __slots__ = ()
+
     def op(self, v1, v2):
         return float(v1) / float(v2)
 
 
 class Eq(BinaryOperator):
+    __slots__ = ()
+
     def op(self, v1, v2):
         return v1 == v2
 
 
 class And(BinaryOperator):
+    __slots__ = ()
+
     def op(self, v1, v2):
         return v1 and v2
 
 
 class Or(BinaryOperator):
+    __slots__ = ()
+
     def op(self, v1, v2):
         return v1 or v2
 
 
+class Concat(Bender):
+    """
+    Add the values of any number of benders from left to right, like a
+    chain of `Add`, but joining strings in a single pass instead of
+    building an intermediate string for each `+`.
+    `optimize()` replaces chains of `Add` with it.
+
+    Example:
+    ```
+    Concat(S('first'), K(' '), S('last'))
+    # same as S('first') + K(' ') + S('last')
+    ```
+    """
+
+    __slots__ = ('benders',)
+    _bender_fields = ('benders',)
+
+    def __init__(self, *benders):
+        if not benders:
+            raise ValueError('No benders given')
+        self.benders = benders
+
+    def evaluate(self, value, context):
+        benders = iter(self.benders)
+        result = next(benders).evaluate(value, context)
+        if type(result) is str:
+            parts = [result]
+            for bender in benders:
+                v = bender.evaluate(value, context)
+                if type(v) is not str:
+                    # from here on, add exactly as the chain of `+` would
+                    result = ''.join(parts) + v
+                    break
+                parts.append(v)
+            else:
+                return ''.join(parts)
+        for bender in benders:
+            result = result + bender.evaluate(value, context)
+        return result
+
+
 class Context(Bender):
-    def raw_execute(self, source):
-        transport = Transport.from_source(source)
-        return Transport(transport.context, transport.context)
+    __slots__ = ()
+
+    def evaluate(self, value, context):
+        return context
 
 
 class BendingException(Exception):
-    pass
+    """
+    Raised by bend() when bending the value of a key of a mapping fails.
+
+    `path` is the list of keys leading to the value that failed, from the
+    outermost one, and the original exception is kept as `__cause__`.
+    The message, like "Error for key a: Error for key b: 'x'", is only built
+    when it is read.
+    """
+
+    @property
+    def path(self):
+        # keys are added while unwinding, so the innermost one is first
+        return getattr(self, '_keys', [])[::-1]
+
+    def __str__(self):
+        if self.args:
+            detail = super(BendingException, self).__str__()
+        else:
+            cause = getattr(self, '__cause__', None)
+            detail = '' if cause is None else str(cause)
+        return ''.join('Error for key {}: '.format(k)
+                       for k in self.path) + detail
+
+    def __reduce__(self):
+        # the cause may not be picklable, so only its message is kept
+        state = dict(self.__dict__)
+        state.pop('__cause__', None)
+        args = self.args
+        if not args and getattr(self, '__cause__', None) is not None:
+            args = (str(self.__cause__),)
+        return type(self), args, state
+
+
+def _key_error(key, exc):
+    """
+    Return the BendingException to raise when bending the value of `key`
+    raised `exc`.
+    """
+    if isinstance(exc, BendingException):
+        error = exc
+    else:
+        error = BendingException()
+        error.__cause__ = exc
+    try:
+        error._keys.append(key)
+    except AttributeError:
+        error._keys = [key]
+    return error
 
 
 class Transport(object):
+    """
+    Pairs a value with the bending context.
+    Only kept for compatibility with benders that override raw_execute();
+    the built-in benders get the value and the context as separate
+    arguments to evaluate().
+    """
+
+    __slots__ = ('value', 'context')
+
     def __init__(self, value, context):
         self.value = value
         self.context = context
@@ -205,37 +575,82 @@ class Transport(object):
             return cls(source, {})
 
 
-def bend(mapping, source, context=None):
+def bend(mapping, source, context=None, profile=None, errors='raise'):
     """
     The main bending function.
 
     mapping: the map of benders
     source: a dict to be bent
+    profile: optional. a `jsonbender.profiling.Profile` in which to record
+             the timings of the benders.
+    errors: optional. 'raise' to raise a BendingException for the first
+            key that fails, or 'collect' to bend every other key anyway and
+            return a tuple `(result, exceptions)`, where `result` lacks the
+            keys that failed and `exceptions` is a list with a
+            BendingException for each of them.
 
     returns a new dict according to the provided map.
     """
     context = {} if context is None else context
-    transport = Transport(source, context)
-    return _bend(mapping, transport)
+    if profile is not None:
+        mapping = profile.instrument(mapping)
+    if errors == 'raise':
+        return _bend(mapping, source, context)
+    elif errors == 'collect':
+        exceptions = []
+        result = _bend_collecting(mapping, source, context, exceptions, [])
+        return result, exceptions
+    raise ValueError("errors must be 'raise' or 'collect', not {!r}"
+                     .format(errors))
+
+
+def _bend(mapping, source, context):
+    if isinstance(mapping, list):
+        return [_bend(v, source, context) for v in mapping]
+
+    elif isinstance(mapping, dict):
+        res = {}
+        for k, v in iteritems(mapping):
+            try:
+                res[k] = _bend(v, source, context)
+            except Exception as e:
+                raise _key_error(k, e)
+        return res
+
+    elif isinstance(mapping, Bender):
+        return mapping.evaluate(source, context)
+
+    else:
+        return mapping
 
 
-def _bend(mapping, transport):
+def _bend_collecting(mapping, source, context, exceptions, path):
+    """
+    Like `_bend()`, but append the exceptions for the keys that fail to
+    `exceptions` instead of raising them.
+    `path` is the list of keys leading to `mapping`.
+    """
     if isinstance(mapping, list):
-        return [_bend(v, transport) for v in mapping]
+        return [_bend_collecting(v, source, context, exceptions, path)
+                for v in mapping]
 
     elif isinstance(mapping, dict):
         res = {}
         for k, v in iteritems(mapping):
+            path.append(k)
             try:
-                res[k] = _bend(v, transport)
+                res[k] = _bend_collecting(v, source, context, exceptions,
+                                          path)
             except Exception as e:
-                m = 'Error for key {}: {}'.format(k, str(e))
-                raise BendingException(m)
+                for key in reversed(path):
+                    e = _key_error(key, e)
+                exceptions.append(e)
+            finally:
+                path.pop()
         return res
 
     elif isinstance(mapping, Bender):
-        return mapping(transport)
+        return mapping.evaluate(source, context)
 
     else:
         return mapping
-
@@ -0,0 +1,296 @@
+"""
+Tell what bending with a mapping involves, without bending anything.
+
+`explain()` walks a mapping the way `bend()` does and returns a `Plan` with
+the benders it's made of, the paths it selects, the places that rely on
+exceptions or on callables that can't be looked into, and a rough estimate
+of the operations needed per record, which can be checked against a budget
+before deploying the mapping.
+"""
+from __future__ import print_function
+
+from collections import Counter
+import sys
+
+from jsonbender.control_flow import Alternation, If, Switch
+from jsonbender.core import (Add, And, Bender, Compose, Concat, Context, Div,
+                             Eq, GetItem, Invert, Mul, Neg, Or, Sub,
+                             _try_evaluate_via_evaluate, iter_benders)
+from jsonbender.list_ops import (Filter, FlatForall, Forall, ForallBend,
+                                 Reduce)
+from jsonbender.profiling import _join
+from jsonbender.selectors import CachedF, F, K, OptionalS, ProtectedF, S
+from jsonbender.specialize import SpecializedOptionalS, SpecializedS
+from jsonbender.string_ops import Format, ProtectedFormat
+from jsonbender._compat import iteritems
+
+
+_SELECTOR_TYPES = frozenset([S, OptionalS, SpecializedS,
+                             SpecializedOptionalS])
+
+_CALL_TYPES = frozenset([F, ProtectedF])
+
+_LIST_OP_TYPES = frozenset([Forall, Filter, FlatForall, Reduce])
+
+# Benders that evaluate all their inner benders, and do one operation with
+# what those return.
+_OPERATOR_TYPES = frozenset([Add, Sub, Mul, Div, Eq, And, Or, Neg, Invert,
+                             Concat, Format, ProtectedFormat])
+
+# Benders that can't miss, and so never raise to tell a miss.
+_NEVER_MISS_TYPES = frozenset([K, Context])
+
+# The versions of try_evaluate() that catch the LookupErrors of evaluate().
+_RAISING_TRY_EVALUATE = (
+    getattr(Bender.try_evaluate, '__func__', Bender.try_evaluate),
+    _try_evaluate_via_evaluate)
+
+
+class Plan(object):
+    """
+    What bending a record with a mapping involves, as found by `explain()`.
+
+    counts: the number of benders of each class, by class name.
+    depth: the maximum nesting depth of the mapping, counting its dicts,
+           lists and benders.
+    path_lengths: the number of selectors (`S`, `OptionalS`, `GetItem`)
+                  with each path length, by length.
+    exception_paths: the paths of the `Alternation` and `OptionalS`
+                     benders that find out about misses by catching
+                     LookupErrors, which is much slower than the checks
+                     of the other ones.
+    opaque: `(path, name)` pairs for the callables of `F` benders, list ops
+            and user-defined benders, whose cost can't be known.
+    element_mappings: `(path, class name, cost)` triples for the benders
+                      that run once per element of a list, like
+                      `Forall.bend()` and `Reduce`, with the estimated cost
+                      of each element.
+    recursive: the paths where the mapping is nested inside itself, which
+               aren't walked again, and so add nothing to the cost.
+    cost: the estimated number of operations per record.
+
+    Paths are those of the output, written like those of `Profile`:
+    dotted keys, with `[]` for the elements of lists bent once per element
+    and `[i]` for the items of lists in the mapping, e.g. `lines[].total`.
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+        self.depth = 0
+        self.path_lengths = Counter()
+        self.exception_paths = []
+        self.opaque = []
+        self.element_mappings = []
+        self.recursive = []
+        self.cost = 0
+
+    def as_dict(self):
+        """
+        Return the plan as a dict with JSON-compatible values.
+        """
+        return {
+            'counts': dict(self.counts),
+            'depth': self.depth,
+            'path_lengths': dict(self.path_lengths),
+            'exception_paths': list(self.exception_paths),
+            'opaque': [list(item) for item in self.opaque],
+            'element_mappings': [list(item)
+                                 for item in self.element_mappings],
+            'recursive': list(self.recursive),
+            'cost': self.cost,
+        }
+
+    def report(self, file=None):
+        """
+        Print the plan.
+        """
+        file = sys.stdout if file is None else file
+        print('estimated cost: {} operations per record'.format(self.cost),
+              file=file)
+        print('depth: {}'.format(self.depth), file=file)
+        print('benders: {}'.format(', '.join(
+            '{} {}'.format(n, name)
+            for name, n in sorted(iteritems(self.counts),
+                                  key=lambda c: (-c[1], c[0])))), file=file)
+        print('selector path lengths: {}'.format(', '.join(
+            '{} of {}'.format(n, length)
+            for length, n in sorted(iteritems(self.path_lengths)))),
+            file=file)
+        for title, rows in (
+                ('relying on exceptions',
+                 [_shown(path) for path in self.exception_paths]),
+                ('opaque callables',
+                 ['{}: {}'.format(_shown(path), name)
+                  for path, name in self.opaque]),
+                ('per element',
+                 ['{}: {}, {} operations per element'.format(
+                     _shown(path), name, cost)
+                  for path, name, cost in self.element_mappings]),
+                ('nested inside itself',
+                 [_shown(path) for path in self.recursive])):
+            if rows:
+                print('{}:'.format(title), file=file)
+                for row in rows:
+                    print('  {}'.format(row), file=file)
+
+
+def explain(mapping, list_length=10, call_cost=5):
+    """
+    Return a `Plan` telling what bending a record with `mapping` involves.
+
+    The cost is a rough count of the operations per record: each key
+    looked up, operator applied and output key or item set is one, calls
+    to functions and user-defined benders are `call_cost` each, and lists
+    are taken to have `list_length` elements. Where only some of the
+    benders run, as with `If` and `Switch`, the most costly ones are
+    counted, and all the benders of an `Alternation` are, as if all but
+    the last missed. It's meant for comparing mappings and catching costly
+    ones, not for predicting times.
+
+    Example:
+    ```
+    plan = explain(load_mapping('tenants.acme:MAPPING'))
+    plan.report()
+    assert plan.cost <= 500, 'the mapping of acme is too costly'
+    ```
+    """
+    plan = Plan()
+    walker = _Walker(plan, list_length, call_cost)
+    plan.cost = walker.mapping(mapping, '', 0, ())
+    return plan
+
+
+class _Walker(object):
+    def __init__(self, plan, list_length, call_cost):
+        self.plan = plan
+        self.list_length = list_length
+        self.call_cost = call_cost
+
+    def mapping(self, value, path, depth, outer):
+        """
+        Return the cost of bending with the mapping `value`, found at
+        `path` and `depth`, inside the mappings whose ids are `outer`.
+        """
+        if isinstance(value, (list, dict)):
+            if id(value) in outer:
+                self.plan.recursive.append(path)
+                return 0
+            outer += (id(value),)
+            self.plan.depth = max(self.plan.depth, depth + 1)
+        if isinstance(value, list):
+            return sum(1 + self.mapping(v, '{}[{}]'.format(path, i),
+                                        depth + 1, outer)
+                       for i, v in enumerate(value))
+        elif isinstance(value, dict):
+            return sum(1 + self.mapping(v, _join(path, k), depth + 1, outer)
+                       for k, v in iteritems(value))
+        elif isinstance(value, Bender):
+            return self.bender(value, path, depth, outer)
+        return 0
+
+    def bender(self, bender, path, depth, outer):
+        plan = self.plan
+        kind = type(bender)
+        plan.counts[kind.__name__] += 1
+        plan.depth = max(plan.depth, depth + 1)
+        depth += 1
+
+        if kind in _SELECTOR_TYPES:
+            plan.path_lengths[len(bender._path)] += 1
+            if isinstance(bender, OptionalS) and _raises_on_miss(bender):
+                plan.exception_paths.append(path)
+            return len(bender._path)
+        elif kind is GetItem:
+            plan.path_lengths[1] += 1
+            return 1
+        elif kind in _NEVER_MISS_TYPES:
+            return 1
+        elif kind is Compose:
+            return (self.bender(bender._first, path, depth, outer) +
+                    self.bender(bender._second, path, depth, outer))
+        elif kind is Alternation:
+            if any(_raises_on_miss(b) for b in bender.benders[:-1]):
+                plan.exception_paths.append(path)
+            return 1 + self.children(bender, path, depth, outer)
+        elif kind is If:
+            return 1 + self.bender(bender.condition, path, depth, outer) + max(
+                self.bender(bender.when_true, path, depth, outer),
+                self.bender(bender.when_false, path, depth, outer))
+        elif kind is Switch:
+            costs = [self.bender(b, path, depth, outer)
+                     for b in _values(bender.cases)]
+            if bender.default:
+                costs.append(self.bender(bender.default, path, depth, outer))
+            return (1 + self.bender(bender.key_bender, path, depth, outer) +
+                    max(costs or [0]))
+        elif kind is ForallBend:
+            element = self.mapping(bender._mapping, path + '[]', depth,
+                                   outer)
+            plan.element_mappings.append((path, kind.__name__, element))
+            return 1 + self.list_length * element
+        elif kind in _LIST_OP_TYPES:
+            plan.opaque.append((path, _name(bender._func)))
+            plan.element_mappings.append((path, kind.__name__,
+                                          self.call_cost))
+            return (1 + self.list_length * self.call_cost +
+                    self.children(bender, path, depth, outer))
+        elif kind in _CALL_TYPES:
+            plan.opaque.append((path, _name(bender._func)))
+            return self.call_cost
+        elif kind is CachedF:
+            return 1 + self.bender(bender._bender, path, depth, outer)
+        elif kind in _OPERATOR_TYPES:
+            return 1 + self.children(bender, path, depth, outer)
+        plan.opaque.append((path, _name(bender)))
+        return self.call_cost + self.children(bender, path, depth, outer)
+
+    def children(self, bender, path, depth, outer):
+        cost = 0
+        for name in bender._bender_fields:
+            value = getattr(bender, name)
+            if name in bender._mapping_fields:
+                cost += self.mapping(value, path + '[]', depth, outer)
+            else:
+                cost += sum(self.bender(b, path, depth, outer)
+                            for b in iter_benders(value))
+        return cost
+
+
+def _raises_on_miss(bender):
+    """
+    Return whether `bender.try_evaluate()` finds out about misses by
+    catching LookupErrors.
+    """
+    kind = type(bender)
+    if isinstance(bender, SpecializedS):
+        # the generated expressions raise, and then fall back
+        return True
+    elif kind in _SELECTOR_TYPES:
+        # only dicts are looked up without raising
+        return not all(isinstance(k, (str, type(u''))) for k in bender._path)
+    elif kind is GetItem:
+        return not isinstance(bender._index, (str, type(u'')))
+    elif kind in _NEVER_MISS_TYPES:
+        return False
+    elif kind is Compose:
+        return (_raises_on_miss(bender._first) or
+                _raises_on_miss(bender._second))
+    elif kind in (Alternation, Switch):
+        return any(_raises_on_miss(b) for b in bender.children())
+    try_evaluate = getattr(kind.try_evaluate, '__func__', kind.try_evaluate)
+    return try_evaluate in _RAISING_TRY_EVALUATE
+
+
+def _values(cases):
+    return cases.values() if isinstance(cases, dict) else cases
+
+
+def _name(func):
+    if isinstance(func, Bender):
+        return type(func).__name__
+    return (getattr(func, '__qualname__', None) or
+            getattr(func, '__name__', None) or repr(func))
+
+
+def _shown(path):
+    return path or '<root>'
@@ -0,0 +1,254 @@
+"""
+Share the benders that many mappings have in common.
+
+Applications keeping many similar mappings in memory (one per tenant, say)
+end up with many copies of the same benders. `InternTable` makes
+structurally identical benders, across all the mappings interned with it,
+a single shared object, and `memory_usage()` and `memory_report()` tell how
+much memory each mapping takes and how much of it is shared.
+"""
+from __future__ import print_function
+
+from collections import Counter, namedtuple
+import copy
+import sys
+import types
+
+from jsonbender.core import (MISSING, Add, And, Bender, Compose, Concat,
+                             Context, Div, Eq, GetItem, Invert, Mul, Neg, Or,
+                             Sub, _field_names, _structural_key)
+from jsonbender.control_flow import Alternation, If, Switch
+from jsonbender.list_ops import (Filter, FlatForall, Forall, ForallBend,
+                                 Reduce)
+from jsonbender.selectors import F, K, OptionalS, ProtectedF, S
+from jsonbender.specialize import SpecializedOptionalS, SpecializedS
+from jsonbender.string_ops import Format, ProtectedFormat
+from jsonbender._compat import iteritems
+
+
+# Benders that keep nothing but their parameters, and so can be shared.
+# User-defined benders and subclasses of the built-in ones may keep state,
+# and are left as they are, with everything inside them.
+_SHAREABLE_TYPES = frozenset([K, S, OptionalS, SpecializedS,
+                              SpecializedOptionalS, F, ProtectedF, GetItem,
+                              Compose, Concat, Context, Neg, Invert, Add, Sub,
+                              Mul, Div, Eq, And, Or, Format, ProtectedFormat,
+                              If, Switch, Alternation, Forall, Filter,
+                              FlatForall, Reduce, ForallBend])
+
+# Objects that are shared by the whole interpreter, and so aren't counted
+# as part of any mapping.
+_UNCOUNTED_TYPES = (type, types.ModuleType, type(None), bool)
+
+
+class InternTable(object):
+    """
+    Keeps a single instance of each built-in bender, and of each dict and
+    list of a mapping, by structure (see `Bender.structural_key()`), for the
+    mappings interned with it.
+
+    Interned benders are shared by all those mappings, so they must not be
+    modified. Benders that can't be shared, like user-defined ones and
+    `F(...).cached()`, are kept as they are, and so are the benders, dicts
+    and lists containing them, although the shareable benders inside those
+    are interned too.
+    The table keeps everything interned alive for as long as it lives.
+
+    Example:
+    ```
+    table = InternTable()
+    mappings = {tenant: table.intern(load_mapping(tenant))
+                for tenant in tenants}
+    ```
+    """
+
+    def __init__(self):
+        # the interned benders, dicts and lists, by structure
+        self._values = {}
+        # their ids, which stay the same since the table keeps them alive
+        self._ids = set()
+        self._keys = {}
+
+    def __len__(self):
+        return len(self._values)
+
+    def intern(self, mapping):
+        """
+        Return a mapping that bends exactly like `mapping`, made of the
+        interned benders. `mapping` itself isn't modified, and neither is
+        the dict or list returned, but the dicts, lists and benders in it
+        may be shared with other mappings, so they must not be modified.
+        The string keys of the dicts in the mapping are interned too.
+        """
+        if isinstance(mapping, list):
+            return [self._intern(v) for v in mapping]
+        elif isinstance(mapping, dict):
+            return {self._intern_key(k): self._intern(v)
+                    for k, v in iteritems(mapping)}
+        return self._intern(mapping)
+
+    def _intern(self, value):
+        if isinstance(value, list):
+            return self._intern_container([self._intern(v) for v in value])
+        elif isinstance(value, dict):
+            return self._intern_container({self._intern_key(k): self._intern(v)
+                                           for k, v in iteritems(value)})
+        elif isinstance(value, Bender):
+            return self._intern_bender(value)
+        return value
+
+    def _intern_container(self, container):
+        values = container.values() if type(container) is dict else container
+        if not all(id(v) in self._ids for v in values
+                   if isinstance(v, (Bender, list, dict))):
+            return container
+        return self._interned(_interned_key(container, self._ids), container)
+
+    def _intern_bender(self, bender):
+        if type(bender) not in _SHAREABLE_TYPES:
+            return bender
+        if bender._bender_fields:
+            bender = copy.copy(bender)
+            for name in bender._bender_fields:
+                value = getattr(bender, name)
+                if name in bender._mapping_fields:
+                    setattr(bender, name, self._intern(value))
+                else:
+                    setattr(bender, name, self._intern_field(value))
+            if not all(id(child) in self._ids for child in bender.children()):
+                return bender
+            key = _shallow_key(bender, self._ids)
+        else:
+            key = bender.structural_key()
+        return self._interned(key, bender)
+
+    def _interned(self, key, value):
+        interned = self._values.get(key)
+        if interned is None:
+            interned = self._values[key] = value
+            self._ids.add(id(value))
+        return interned
+
+    def _intern_key(self, key):
+        if isinstance(key, (str, type(u''))):
+            return self._keys.setdefault(key, key)
+        return key
+
+    def _intern_field(self, value):
+        if isinstance(value, Bender):
+            return self._intern_bender(value)
+        elif type(value) in (list, tuple):
+            return type(value)(self._intern_field(v) for v in value)
+        elif type(value) is dict:
+            return {k: self._intern_field(v) for k, v in iteritems(value)}
+        return value
+
+
+def _shallow_key(bender, interned):
+    """
+    Return the structural key of a bender whose inner benders, dicts and
+    lists are all interned, and so stand for themselves in it.
+    """
+    return (type(bender),) + tuple(
+        _interned_key(getattr(bender, name, MISSING), interned)
+        for name in _field_names(bender))
+
+
+def _interned_key(value, interned):
+    """
+    Like `_structural_key()`, but the values whose ids are in `interned`
+    stand for themselves, without going through them.
+    """
+    if id(value) in interned:
+        return (InternTable, id(value))
+    elif type(value) in (list, tuple):
+        return (type(value),) + tuple(_interned_key(v, interned)
+                                      for v in value)
+    elif type(value) is dict:
+        return (dict,) + tuple((_structural_key(k), _interned_key(v, interned))
+                               for k, v in iteritems(value))
+    return _structural_key(value)
+
+
+class MemoryUsage(namedtuple('MemoryUsage', ['total', 'shared'])):
+    """
+    The memory taken by a mapping, in bytes: `total` counts every object in
+    it, and `shared` the part of those that other mappings have too.
+    """
+
+    __slots__ = ()
+
+    @property
+    def own(self):
+        """
+        The memory taken by the objects no other mapping has.
+        """
+        return self.total - self.shared
+
+
+def memory_usage(mappings):
+    """
+    Return a dict with the MemoryUsage of each mapping of the dict
+    `mappings`, by the same keys.
+
+    The size of a mapping is that of every object in it: its dicts and
+    lists, the benders with their parameters, constants, strings etc.
+    Classes and modules aren't counted, and neither are the insides of
+    functions, like their code, which are shared with the rest of the
+    program.
+    """
+    sizes = {name: _sizes(mapping) for name, mapping in iteritems(mappings)}
+    owners = Counter(i for objects in sizes.values() for i in objects)
+    return {name: MemoryUsage(sum(objects.values()),
+                              sum(size for i, size in iteritems(objects)
+                                  if owners[i] > 1))
+            for name, objects in iteritems(sizes)}
+
+
+def memory_report(mappings, sort='total', limit=None, file=None):
+    """
+    Print the memory taken by each mapping of the dict `mappings` (see
+    `memory_usage()`), in decreasing order of `sort` (one of `total`,
+    `own` and `shared`), showing at most `limit` of them, followed by the
+    memory taken by all of them together.
+    """
+    file = sys.stdout if file is None else file
+    usage = memory_usage(mappings)
+    rows = sorted(iteritems(usage), key=lambda r: getattr(r[1], sort),
+                  reverse=True)[:limit]
+    width = max([len('mapping')] + [len(str(name)) for name, _ in rows])
+    print('{:<{w}}  {:>12}  {:>12}  {:>12}'.format(
+        'mapping', 'total', 'own', 'shared', w=width), file=file)
+    for name, u in rows:
+        print('{:<{w}}  {:>12}  {:>12}  {:>12}'.format(
+            str(name), u.total, u.own, u.shared, w=width), file=file)
+    every = {}
+    for mapping in mappings.values():
+        every.update(_sizes(mapping))
+    print('{} mappings: {} bytes'.format(len(mappings),
+                                         sum(every.values())), file=file)
+
+
+def _sizes(mapping):
+    """
+    Return the size of each object in `mapping`, by id.
+    """
+    sizes = {}
+    pending = [mapping]
+    while pending:
+        value = pending.pop()
+        if (value is MISSING or isinstance(value, _UNCOUNTED_TYPES) or
+                id(value) in sizes):
+            continue
+        sizes[id(value)] = sys.getsizeof(value)
+        if isinstance(value, Bender):
+            pending.extend(getattr(value, name, MISSING)
+                           for name in _field_names(value))
+            if hasattr(value, '__dict__'):
+                pending.append(value.__dict__)
+        elif isinstance(value, dict):
+            pending.extend(value)
+            pending.extend(value.values())
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            pending.extend(value)
+    return sizes
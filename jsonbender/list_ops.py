@@ -1,17 +1,47 @@
-from functools import reduce
-from itertools import chain
+from collections import deque
+import copy
+from functools import partial, reduce
+from itertools import chain, islice
 from warnings import warn
 
-from jsonbender.core import Bender, bend, Transport
+from jsonbender.cache import LRUCache
+from jsonbender.core import MISSING, Bender, BenderType, Compose, bend
+from jsonbender._compat import ifilter, imap, iteritems, with_metaclass
 
 
-class ListOp(Bender):
+def _lazy_op_via_op(self, func, vals):
+    return self.op(func, vals)
+
+
+class ListOpType(BenderType):
+    """
+    Metaclass of list operations, making classes that override `op()` but
+    not `lazy_op()` use their `op()` for both.
+    """
+
+    def __init__(cls, name, bases, namespace):
+        super(ListOpType, cls).__init__(name, bases, namespace)
+        if 'op' in namespace and 'lazy_op' not in namespace:
+            cls.lazy_op = _lazy_op_via_op
+
+
+class ListOp(with_metaclass(ListOpType, Bender)):
     """
     Base class for operations on lists.
     Subclasses must implement the op() method, which takes the function passed
     to the operator's __init__(), an iterable, and should return the
     desired result.
+    They can also implement lazy_op(), which takes the same arguments and
+    may return a lazy iterator over the result instead. It is used when
+    the operation is followed by another one in a fused composition chain
+    (see `fuse()`), so that chained operations run as a single pass over
+    the list, e.g. `S('items') >> Filter(p) >> Forall(f) >> Reduce(g)`
+    builds no intermediate lists.
     """
+
+    __slots__ = ('_func', '_bender')
+    _bender_fields = ('_bender',)
+
     def __init__(self, *args):
         if len(args) == 1:
             self._func = args[0]
@@ -29,9 +59,29 @@ class ListOp(Bender):
                    .format(type(self).__name__, len(args)))
             raise TypeError(msg)
 
+    @property
+    def _lazy_input(self):
+        # the deprecated inner bender may do anything with the value
+        return self._bender is None
+
     def op(self, func, vals):
         raise NotImplementedError()
 
+    def lazy_op(self, func, vals):
+        return self.op(func, vals)
+
+    def evaluate(self, value, context):
+        # TODO: this is here for compatibility reasons
+        if self._bender is not None:
+            value = self._bender.evaluate(value, context)
+        return self.op(self._func, value)
+
+    def evaluate_lazy(self, value, context):
+        # TODO: this is here for compatibility reasons
+        if self._bender is not None:
+            value = self._bender.evaluate(value, context)
+        return self.lazy_op(self._func, value)
+
     def execute(self, source):
         # TODO: this is here for compatibility reasons
         if self._bender:
@@ -51,11 +101,16 @@ class Forall(ListOp):
     ```
     """
 
+    __slots__ = ()
+
     def op(self, func, vals):
         return list(map(func, vals))
 
+    def lazy_op(self, func, vals):
+        return imap(func, vals)
+
     @classmethod
-    def bend(cls, mapping, context=None):
+    def bend(cls, mapping, context=None, executor=None, chunksize=1000):
         """
         Return a ForallBend instance that bends each element of the list with the
         given mapping.
@@ -64,6 +119,9 @@ class Forall(ListOp):
         context: optional. the context that will be passed to `bend()`.
                  Note that if context is not passed, it defaults at bend-time
                  to the one passed to the outer mapping.
+        executor: optional. a `concurrent.futures` executor to bend the
+                  elements on, `chunksize` elements at a time.
+        chunksize: how many elements are bent in each task of the executor.
 
         Example:
         ```
@@ -73,7 +131,7 @@ class Forall(ListOp):
         ```
 
         """
-        return ForallBend(mapping, context)
+        return ForallBend(mapping, context, executor, chunksize)
 
 
 class ForallBend(Forall):
@@ -84,21 +142,175 @@ class ForallBend(Forall):
     context: optional. the context that will be passed to `bend()`.
              Note that if context is not passed, it defaults at bend-time
              to the one passed to the outer mapping.
+    executor: optional. a `concurrent.futures` executor to bend the
+              elements on. The list is split in chunks of `chunksize`
+              elements, each bent by a task of the executor, and their
+              results are put back together in order. At most twice as
+              many chunks as CPUs are in flight at any time.
+              With a ProcessPoolExecutor, the mapping is pickled the first
+              time it's bent (so later changes to it aren't seen), the
+              context once per evaluation, and both are unpickled once per
+              worker; past the first chunks in flight, chunks only carry
+              short digests of them.
+    chunksize: how many elements are bent in each task of the executor.
     """
 
-    def __init__(self, mapping, context=None):
+    __slots__ = ('_mapping', '_context', '_executor', '_chunksize')
+    _bender_fields = ('_mapping', '_bender')
+    _mapping_fields = ('_mapping',)
+    _lazy_input = True
+
+    def __init__(self, mapping, context=None, executor=None, chunksize=1000):
+        if chunksize < 1:
+            raise ValueError('chunksize must be at least 1, got {}'
+                             .format(chunksize))
         self._mapping = mapping
         self._context = context
+        self._executor = executor
+        self._chunksize = chunksize
         # TODO this is here for retrocompatibility reasons.
         # remove this when ListOp also breaks retrocompatibility
         self._bender = None
 
-    def raw_execute(self, source):
-        transport = Transport.from_source(source)
-        context = self._context or transport.context
-        # ListOp.execute assumes the func is saved on self._func
-        self._func = lambda v: bend(self._mapping, v, context)
-        return Transport(self.execute(transport.value), transport.context)
+    def evaluate(self, value, context):
+        if self._executor is not None:
+            return list(self.evaluate_lazy(value, context))
+        context = self._context or context
+        return self.op(lambda v: bend(self._mapping, v, context), value)
+
+    def evaluate_lazy(self, value, context):
+        context = self._context or context
+        if self._executor is not None:
+            return _bend_chunked(self._mapping, value, context,
+                                 self._executor, self._chunksize)
+        return self.lazy_op(lambda v: bend(self._mapping, v, context), value)
+
+
+def _bend_chunked(mapping, value, context, executor, chunksize):
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import cpu_count
+
+    if isinstance(executor, ProcessPoolExecutor):
+        # workers are only sent the pickles they don't have yet
+        digests, pickles = zip(_pickled_mapping(mapping), _pickled(context))
+        submit = partial(executor.submit, _bend_pickled_chunk, digests)
+        resubmit = partial(submit, pickles=pickles)
+    else:
+        submit = resubmit = partial(executor.submit, _bend_chunk, mapping,
+                                    context)
+    max_pending = 2 * cpu_count()
+    # any worker may pick up the first chunks, so those carry the pickles,
+    # and so do the next ones whenever a worker turns out not to have them
+    warm_up = max_pending
+    values = iter(value)
+    pending = deque()
+    try:
+        while True:
+            chunk = list(islice(values, chunksize))
+            if not chunk:
+                break
+            if warm_up:
+                warm_up -= 1
+                pending.append((resubmit(chunk), chunk))
+            else:
+                pending.append((submit(chunk), chunk))
+            if len(pending) >= max_pending:
+                if _requeue_missed(pending, resubmit):
+                    warm_up = max_pending
+                for result in _chunk_result(pending, resubmit):
+                    yield result
+        while pending:
+            _requeue_missed(pending, resubmit)
+            for result in _chunk_result(pending, resubmit):
+                yield result
+    finally:
+        for future, _ in pending:
+            future.cancel()
+
+
+def _requeue_missed(pending, resubmit):
+    """
+    Resubmit, with the pickles, the pending chunks that a worker couldn't
+    bend for lack of the mapping or the context. Returns their number.
+    """
+    missed = 0
+    for i, (future, chunk) in enumerate(pending):
+        if future.done() and isinstance(future.exception(), _NotUnpickled):
+            pending[i] = (resubmit(chunk), chunk)
+            missed += 1
+    return missed
+
+
+def _chunk_result(pending, resubmit):
+    future, chunk = pending.popleft()
+    try:
+        return future.result()
+    except _NotUnpickled:
+        # the worker hasn't unpickled the mapping or the context yet
+        return resubmit(chunk).result()
+
+
+def _bend_chunk(mapping, context, chunk):
+    return [bend(mapping, v, context) for v in chunk]
+
+
+# The pickles of the mappings bent on process pools, by the ids of the
+# mappings, as `(mapping, digest, pickled)`, so that each mapping is
+# pickled once.
+_mapping_pickles = LRUCache(maxsize=8)
+
+
+def _pickled_mapping(mapping):
+    entry = _mapping_pickles.get(id(mapping))
+    if entry is MISSING or entry[0] is not mapping:
+        entry = (mapping,) + _pickled(mapping)
+        _mapping_pickles.set(id(mapping), entry)
+    return entry[1:]
+
+
+def _pickled(obj):
+    """
+    Return `(digest, pickled)` for `obj`, where `digest` is a short hash of
+    its pickle.
+    """
+    import hashlib
+    import pickle
+    pickled = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+    return hashlib.sha1(pickled).digest(), pickled
+
+
+class _NotUnpickled(Exception):
+    """
+    Raised by a worker process asked to bend with a mapping or a context
+    that it doesn't have yet.
+    """
+
+
+# The mappings and contexts unpickled by a worker process, by the digests
+# of their pickles.
+_unpickled = LRUCache(maxsize=8)
+
+
+def _bend_pickled_chunk(digests, chunk, pickles=(None, None)):
+    """
+    Bend `chunk` in a worker process, with the mapping and the context
+    whose pickles have `digests`. Raises _NotUnpickled if the worker
+    doesn't have them and `pickles` aren't given.
+    """
+    mapping, context = [_unpickle(digest, pickled)
+                        for digest, pickled in zip(digests, pickles)]
+    return _bend_chunk(mapping, context, chunk)
+
+
+def _unpickle(digest, pickled):
+    obj = _unpickled.get(digest)
+    if obj is MISSING:
+        if pickled is None:
+            raise _NotUnpickled()
+        import pickle
+        obj = pickle.loads(pickled)
+        _unpickled.set(digest, obj)
+    return obj
 
 
 class Reduce(ListOp):
@@ -116,11 +328,17 @@ class Reduce(ListOp):
     Reduce(lambda acc, i: acc + i)([1, 4, 6])  # -> 11
     ```
     """
+
+    __slots__ = ()
+
     def op(self, func, vals):
+        vals = iter(vals)
         try:
-            return reduce(func, vals)
-        except TypeError as e:  # empty list with no initial value
-            raise ValueError(e.args[0])
+            first = next(vals)
+        except StopIteration:
+            raise ValueError('reduce() of empty iterable with no initial '
+                             'value')
+        return reduce(func, vals, first)
 
 
 class Filter(ListOp):
@@ -135,9 +353,14 @@ class Filter(ListOp):
     ```
     """
 
+    __slots__ = ()
+
     def op(self, func, vals):
         return list(filter(func, vals))
 
+    def lazy_op(self, func, vals):
+        return ifilter(func, vals)
+
 
 class FlatForall(ListOp):
     """
@@ -152,5 +375,56 @@ class FlatForall(ListOp):
          [0, 1, 9, 11, 99, 101]
     ```
     """
+
+    __slots__ = ()
+
     def op(self, func, vals):
         return list(chain.from_iterable(map(func, vals)))
+
+    def lazy_op(self, func, vals):
+        return chain.from_iterable(imap(func, vals))
+
+
+def fuse(mapping):
+    """
+    Return a copy of `mapping` whose chained list operations run as a
+    single lazy pipeline: in `S('items') >> Filter(p) >> Forall(f) >>
+    Reduce(g)` each element goes through the whole chain before the next
+    one, and only the last operation builds a list (or, for `Reduce`, a
+    single value).
+
+    The results are the same, but when more than one of the operations
+    would raise, the error raised is that of the first element to fail
+    instead of that of the first operation, e.g. with
+    `S('l') >> Forall(f1) >> Forall(f2)`, if `f1` fails on the second
+    element and `f2` on the first one, the fused mapping raises the error
+    of `f2`.
+
+    Benders built after fusing, like those of `optimize()` and
+    `specialize()`, aren't fused, so this should be applied last.
+    """
+    return _fuse(mapping, {})
+
+
+def _fuse(value, memo):
+    fused = memo.get(id(value))
+    if fused is not None:
+        return fused
+    if type(value) is list:
+        fused = memo[id(value)] = []
+        fused.extend(_fuse(v, memo) for v in value)
+    elif type(value) is dict:
+        fused = memo[id(value)] = {}
+        for k, v in iteritems(value):
+            fused[k] = _fuse(v, memo)
+    elif type(value) is tuple:
+        fused = tuple(_fuse(v, memo) for v in value)
+    elif isinstance(value, Bender):
+        fused = memo[id(value)] = copy.copy(value)
+        for name in value._bender_fields:
+            setattr(fused, name, _fuse(getattr(value, name), memo))
+        if isinstance(value, Compose):
+            fused._fused = True
+    else:
+        fused = value
+    return fused
@@ -0,0 +1,234 @@
+"""
+Rewrite mappings into equivalent ones that are cheaper to bend.
+
+`optimize()` returns a new mapping that gives exactly the same results
+(and raises exactly the same exceptions) as the original with `bend()`,
+`compile()` or any other way of bending it. It never modifies the original
+mapping, and it only rewrites the built-in benders: user-defined benders and
+subclasses of the built-in ones are kept as they are, with everything inside
+them.
+"""
+import copy
+
+from jsonbender.core import (Add, And, Bender, Compose, Concat, Context, Div,
+                             Eq, GetItem, Invert, Mul, Neg, Or, Sub)
+from jsonbender.control_flow import Alternation, If, Switch
+from jsonbender.list_ops import (Filter, FlatForall, Forall, ForallBend,
+                                 Reduce)
+from jsonbender.selectors import F, K, OptionalS, ProtectedF, S
+from jsonbender.string_ops import Format, ProtectedFormat
+from jsonbender._compat import iteritems
+
+
+# Benders whose value only depends on the value they are evaluated with,
+# so that they are constant when that value is.
+_PURE_TYPES = frozenset([K, S, OptionalS, GetItem, Compose, Concat, Format,
+                         ProtectedFormat, If, Switch, Alternation, Neg,
+                         Invert, Add, Sub, Mul, Div, Eq, And, Or])
+
+# The benders above that select from the value they are evaluated with.
+_SELECTOR_TYPES = frozenset([S, OptionalS, GetItem])
+
+# Every bender that is rewritten, or whose inner benders are.
+_KNOWN_TYPES = _PURE_TYPES | frozenset([Context, F, ProtectedF, Forall,
+                                        Filter, FlatForall, Reduce,
+                                        ForallBend])
+
+# Folded values are shared by every bend, so they must be immutable.
+_IMMUTABLE_TYPES = frozenset([type(None), bool, int, float, complex, str,
+                              bytes, type(u'')])
+
+# Chains of `Add` with fewer operands than this are left alone.
+_MIN_CONCAT_OPERANDS = 3
+
+
+def optimize(mapping):
+    """
+    Return a mapping equivalent to `mapping` that is cheaper to bend:
+
+    * constant subtrees (like `K(2) * K(3)`) are evaluated ahead of time,
+      as long as they don't raise and their value is immutable;
+    * chains of selectors (like `S('a') >> S('b')[0]`) are merged into a
+      single `S('a', 'b', 0)`;
+    * chains of `Add` that build strings (like
+      `S('first') + K(' ') + S('last')`) are replaced with a single
+      `Concat`;
+    * `If` and `Switch` benders with a constant condition or key are
+      replaced with the bender they would pick.
+
+    Example:
+    ```
+    optimize({'name': S('user')['name'] + K(' (') + S('id') + K(')'),
+              'rate': If(K(True), S('rate') * (K(1) + K(0.5)))})
+    # -> {'name': Concat(S('user', 'name'), K(' ('), S('id'), K(')')),
+    #     'rate': S('rate') * K(1.5)}
+    ```
+    """
+    if isinstance(mapping, list):
+        return [optimize(v) for v in mapping]
+    elif isinstance(mapping, dict):
+        return {k: optimize(v) for k, v in iteritems(mapping)}
+    elif isinstance(mapping, Bender):
+        return _optimize_bender(mapping)
+    else:
+        return mapping
+
+
+def _optimize_field(value):
+    """
+    Optimize the benders in the value of a field listed in
+    `Bender._bender_fields`, keeping the types of its containers.
+    """
+    if isinstance(value, Bender):
+        return _optimize_bender(value)
+    elif type(value) in (list, tuple):
+        return type(value)(_optimize_field(v) for v in value)
+    elif type(value) is dict:
+        return {k: _optimize_field(v) for k, v in iteritems(value)}
+    else:
+        return value
+
+
+def _optimize_bender(bender):
+    if type(bender) not in _KNOWN_TYPES:
+        return bender
+    if bender._bender_fields:
+        bender = copy.copy(bender)
+        for name in bender._bender_fields:
+            value = getattr(bender, name)
+            if name in bender._mapping_fields:
+                setattr(bender, name, optimize(value))
+            else:
+                setattr(bender, name, _optimize_field(value))
+
+    kind = type(bender)
+    if kind is Compose:
+        bender = _merge_selectors(bender)
+    elif kind is Add:
+        bender = _concat(bender)
+    elif kind is If:
+        bender = _resolve_if(bender)
+    elif kind is Switch:
+        bender = _resolve_switch(bender)
+
+    if type(bender) is not K and _is_constant(bender):
+        bender = _fold(bender)
+    return bender
+
+
+def _is_constant(bender):
+    kind = type(bender)
+    if kind is K:
+        return True
+    elif kind is Compose:
+        return _is_constant(bender._first) and _is_pure(bender._second)
+    return (kind in _PURE_TYPES and kind not in _SELECTOR_TYPES and
+            all(_is_constant(child) for child in bender.children()))
+
+
+def _is_pure(bender):
+    return (type(bender) in _PURE_TYPES and
+            all(_is_pure(child) for child in bender.children()))
+
+
+def _is_immutable(value):
+    if type(value) in (tuple, frozenset):
+        return all(_is_immutable(v) for v in value)
+    return type(value) in _IMMUTABLE_TYPES
+
+
+def _fold(bender):
+    try:
+        value = bender.evaluate(None, {})
+    except Exception:
+        # it must raise when bent, so it can't be folded
+        return bender
+    if not _is_immutable(value):
+        return bender
+    return K(value)
+
+
+def _path(bender):
+    """
+    Return the path of a plain selector, or None.
+    """
+    if type(bender) is S:
+        return bender._path
+    elif type(bender) is GetItem:
+        return (bender._index,)
+    return None
+
+
+def _merge_selectors(bender):
+    first, second = bender._first, bender._second
+    # the inner compositions are already merged, so only a selector at the
+    # end of one can be merged with a selector next to it
+    if type(first) is Compose and _path(second) is not None:
+        merged = _merge_selectors(Compose(first._second, second))
+        if type(merged) is not Compose:
+            return Compose(first._first, merged)
+    elif type(second) is Compose and _path(first) is not None:
+        merged = _merge_selectors(Compose(first, second._first))
+        if type(merged) is not Compose:
+            return Compose(merged, second._second)
+
+    first_path, second_path = _path(first), _path(second)
+    if first_path is None or second_path is None:
+        return bender
+    return S(*(first_path + second_path))
+
+
+def _concat(bender):
+    # `a + b + c` is `Add(Add(a, b), c)`, and inner chains may have been
+    # replaced already
+    operands = []
+    first = bender
+    while type(first) is Add:
+        operands.append(first._bender2)
+        first = first._bender1
+    if type(first) is Concat:
+        operands.extend(reversed(first.benders))
+    else:
+        operands.append(first)
+    operands.reverse()
+
+    builds_string = any(type(b) is K and type(b._val) is str
+                        for b in operands)
+    if len(operands) < _MIN_CONCAT_OPERANDS or not builds_string:
+        return bender
+    return Concat(*operands)
+
+
+def _constant_value(bender):
+    """
+    Return a tuple with the value of a constant bender, or None.
+    """
+    if type(bender) is K:
+        return (bender._val,)
+    return None
+
+
+def _resolve_if(bender):
+    condition = _constant_value(bender.condition)
+    if condition is None:
+        return bender
+    try:
+        truth = bool(condition[0])
+    except Exception:
+        return bender
+    return bender.when_true if truth else bender.when_false
+
+
+def _resolve_switch(bender):
+    key = _constant_value(bender.key_bender)
+    if key is None:
+        return bender
+    try:
+        return bender.cases[key[0]]
+    except LookupError:
+        if bender.default:
+            return bender.default
+        # it must raise when bent
+        return bender
+    except Exception:
+        return bender
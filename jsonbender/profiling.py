@@ -0,0 +1,202 @@
+from __future__ import print_function
+
+import copy
+import sys
+from timeit import default_timer
+
+from jsonbender.core import Bender
+from jsonbender._compat import iteritems
+
+
+class Stats(object):
+    """
+    Counters for a mapping path or a bender class.
+
+    calls: number of evaluations.
+    cumulative: total time in seconds, including inner benders.
+    own: time in seconds excluding inner benders (for bender classes) or
+         inner paths (for paths).
+    exceptions: number of evaluations that raised.
+    """
+
+    __slots__ = ('calls', 'cumulative', 'own', 'exceptions', '_active')
+
+    def __init__(self):
+        self.calls = 0
+        self.cumulative = 0.0
+        self.own = 0.0
+        self.exceptions = 0
+        self._active = 0
+
+    def as_dict(self):
+        return {'calls': self.calls, 'cumulative': self.cumulative,
+                'self': self.own, 'exceptions': self.exceptions}
+
+
+class Profile(object):
+    """
+    Collects timings of the benders run by `bend()`.
+
+    Pass an instance as the `profile` argument of `bend()` to record, for
+    each path of the mapping and for each bender class, the number of
+    calls, the cumulative and self time and the number of exceptions.
+    The same instance can be passed to many bends to accumulate their
+    statistics.
+
+    Paths are dotted output keys, with `[]` for the elements bent by
+    `Forall.bend()` and `[i]` for the items of lists in the mapping, e.g.
+    `orders[].total`.
+
+    A profile must not be shared by bends running concurrently.
+
+    Example:
+    ```
+    stats = Profile()
+    for order in orders:
+        bend(MAPPING, order, profile=stats)
+    stats.report()
+    ```
+    """
+
+    def __init__(self):
+        self.paths = {}
+        self.benders = {}
+        # Time spent in inner benders and in inner paths by the calls
+        # in progress, to compute self times.
+        self._bender_stack = []
+        self._path_stack = []
+        self._mapping = None
+        self._instrumented = None
+
+    def instrument(self, mapping):
+        """
+        Return a copy of `mapping` whose benders record their calls in this
+        profile.
+        """
+        if mapping is not self._mapping:
+            self._instrumented = self._instrument(mapping, '')
+            self._mapping = mapping
+        return self._instrumented
+
+    def _instrument(self, value, path):
+        if isinstance(value, list):
+            return [self._instrument(v, '{}[{}]'.format(path, i))
+                    for i, v in enumerate(value)]
+        elif isinstance(value, dict):
+            return {k: self._instrument(v, _join(path, k))
+                    for k, v in iteritems(value)}
+        elif isinstance(value, Bender):
+            return self._wrap(value, path, True)
+        else:
+            return value
+
+    def _wrap(self, bender, path, outermost):
+        bender = copy.copy(bender)
+        for name in bender._bender_fields:
+            value = getattr(bender, name)
+            if name in bender._mapping_fields:
+                value = self._instrument(value, path + '[]')
+            else:
+                value = self._wrap_inner(value, path)
+            setattr(bender, name, value)
+
+        name = type(bender).__name__
+        records = [(self.benders.setdefault(name, Stats()),
+                    self._bender_stack)]
+        if outermost:
+            records.append((self.paths.setdefault(path, Stats()),
+                            self._path_stack))
+        return _ProfiledBender(bender, records)
+
+    def _wrap_inner(self, value, path):
+        if isinstance(value, Bender):
+            return self._wrap(value, path, False)
+        elif isinstance(value, (list, tuple)):
+            return type(value)(self._wrap_inner(v, path) for v in value)
+        elif isinstance(value, dict):
+            return {k: self._wrap_inner(v, path)
+                    for k, v in iteritems(value)}
+        else:
+            return value
+
+    def clear(self):
+        """
+        Reset all the statistics.
+        """
+        for stats in list(self.paths.values()) + list(self.benders.values()):
+            stats.__init__()
+
+    def as_dict(self):
+        """
+        Return the statistics as a dict of the form
+        `{'paths': {path: stats}, 'benders': {class name: stats}}` where
+        each `stats` is a dict with the keys `calls`, `cumulative`, `self`
+        and `exceptions`.
+        """
+        return {
+            'paths': {k: v.as_dict() for k, v in iteritems(self.paths)},
+            'benders': {k: v.as_dict() for k, v in iteritems(self.benders)},
+        }
+
+    def report(self, sort='cumulative', limit=None, file=None):
+        """
+        Print the statistics per path and per bender class, sorted in
+        decreasing order of `sort` (one of `calls`, `cumulative`, `self`
+        and `exceptions`), showing at most `limit` rows in each table.
+        """
+        file = sys.stdout if file is None else file
+        data = self.as_dict()
+        for title, rows in (('path', data['paths']),
+                            ('bender', data['benders'])):
+            rows = sorted(iteritems(rows), key=lambda r: r[1][sort],
+                          reverse=True)[:limit]
+            width = max([len(title)] + [len(k or '<root>') for k, _ in rows])
+            print('{:<{w}}  {:>10}  {:>12}  {:>12}  {:>10}'.format(
+                title, 'calls', 'cumulative', 'self', 'exceptions',
+                w=width), file=file)
+            for key, s in rows:
+                print('{:<{w}}  {:>10}  {:>12.6f}  {:>12.6f}  {:>10}'.format(
+                    key or '<root>', s['calls'], s['cumulative'], s['self'],
+                    s['exceptions'], w=width), file=file)
+            print(file=file)
+
+
+class _ProfiledBender(Bender):
+    """
+    Evaluates a bender, recording the time and outcome of the call.
+    """
+
+    __slots__ = ('bender', 'records')
+
+    def __init__(self, bender, records):
+        self.bender = bender
+        self.records = records
+
+    def evaluate(self, value, context):
+        records = self.records
+        for stats, stack in records:
+            stats._active += 1
+            stack.append(0.0)
+        start = default_timer()
+        try:
+            return self.bender.evaluate(value, context)
+        except Exception:
+            for stats, _ in records:
+                stats.exceptions += 1
+            raise
+        finally:
+            elapsed = default_timer() - start
+            for stats, stack in records:
+                inner = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                stats._active -= 1
+                stats.calls += 1
+                stats.own += elapsed - inner
+                # Don't count recursive calls twice
+                if not stats._active:
+                    stats.cumulative += elapsed
+
+
+def _join(path, key):
+    return '{}.{}'.format(path, key) if path else str(key)
@@ -0,0 +1,382 @@
+"""
+Parse only the parts of a JSON document that a mapping reads.
+
+`source_paths()` finds the paths of the source a mapping can read, and
+`load_projected()` parses a JSON document building only the values at
+those paths, skipping over everything else without creating any Python
+objects for it. Bending the projected document gives the same results,
+and raises the same exceptions, as bending the whole one.
+"""
+import json
+import re
+from json.decoder import scanstring
+from json.scanner import make_scanner
+
+from jsonbender.control_flow import Alternation, If, Switch
+from jsonbender.core import (Add, And, Compose, Concat, Context, Div, Eq,
+                             GetItem, Invert, Mul, Neg, Or, Sub,
+                             iter_benders)
+from jsonbender.list_ops import (Filter, FlatForall, Forall, ForallBend,
+                                 Reduce)
+from jsonbender.selectors import K, OptionalS, S
+from jsonbender.specialize import SpecializedOptionalS, SpecializedS
+from jsonbender.string_ops import Format, ProtectedFormat
+from jsonbender._compat import PY2, iteritems
+
+
+class _Any(object):
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'ANY'
+
+    def __reduce__(self):
+        return 'ANY'
+
+
+# Stands for every element of a list in a path.
+ANY = _Any()
+
+_SELECTOR_TYPES = frozenset([S, OptionalS, SpecializedS,
+                             SpecializedOptionalS])
+
+# Benders whose inner benders are evaluated with the same value they are,
+# and whose results are made of what those return.
+_SAME_VALUE_TYPES = frozenset([Add, Sub, Mul, Div, Eq, And, Or, Neg, Invert,
+                               Concat, Format, ProtectedFormat, If, Switch,
+                               Alternation])
+
+_LIST_OP_TYPES = frozenset([Forall, Filter, FlatForall, Reduce])
+
+# Marks the parts of a projection that are needed whole.
+_WHOLE = True
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+# Everything up to the next bracket that isn't part of a string, which is
+# all that matters to skip over a list or an object.
+_UP_TO_BRACKET = re.compile(
+    r'[^"\[\]{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{}]*)*([\[\]{}])')
+
+# Lists and objects shorter than this are parsed whole and then projected,
+# which is faster than projecting them while parsing.
+_SMALL = 1024
+
+# An object key along with the colon after it.
+_KEY = re.compile(r'"([^"\\]*)"[ \t\n\r]*:[ \t\n\r]*')
+
+_scan_once = make_scanner(json.JSONDecoder())
+
+
+def source_paths(mapping):
+    """
+    Return the set of the paths of the source that bending with `mapping`
+    can read.
+
+    Each path is a tuple of keys, and stands for the whole value at it:
+    a bender that reads a value in ways that can't be analyzed, like `F`,
+    a list op or a user-defined bender, needs everything below the path of
+    that value. `ANY` stands for every element of a list, as in the paths
+    read by the mapping of `Forall.bend()`.
+    Paths below other paths of the set are left out, so the empty path
+    means that the whole source is read.
+
+    Example:
+    ```
+    source_paths({'id': S('order', 'id'),
+                  'skus': S('order', 'lines') >> Forall.bend(
+                      {'sku': S('sku')}),
+                  'total': S('order', 'totals') >> F(sum)})
+    # -> {('order', 'id'), ('order', 'lines', ANY, 'sku'),
+    #     ('order', 'totals')}
+    ```
+    """
+    paths = set()
+    _read_mapping(mapping, (), paths)
+    return set(path for path in paths
+               if not any(path[:n] in paths for n in range(len(path))))
+
+
+def _read_mapping(mapping, prefix, paths):
+    for bender in iter_benders(mapping):
+        _read_whole(bender, prefix, paths)
+
+
+def _read_whole(bender, prefix, paths, selected=False):
+    """
+    Add to `paths` what bending the value at `prefix` with `bender`
+    reads, when its result is used whole.
+    """
+    path = _read(bender, prefix, paths, selected)
+    if path is not None:
+        paths.add(path)
+
+
+def _read(bender, prefix, paths, selected=False):
+    """
+    Add to `paths` what bending the value at `prefix` with `bender`
+    reads, and return the path of the value it returns if it's a value of
+    the source, or None.
+    `prefix` is None when the value isn't one of the source, and
+    `selected` is true when it was selected by another bender, and so has
+    to be there even if `bender` doesn't read it.
+    """
+    if prefix is None:
+        return None
+    kind = type(bender)
+    if kind in _SELECTOR_TYPES:
+        return prefix + bender._path
+    elif kind is GetItem:
+        return prefix + (bender._index,)
+    elif kind is Compose:
+        return _read(bender._second, _read(bender._first, prefix, paths,
+                                           selected),
+                     paths, True)
+    elif kind is ForallBend:
+        inner = set()
+        _read_mapping(bender._mapping, prefix + (ANY,), inner)
+        # the elements have to be there even if nothing is read from them
+        paths.update(inner or [prefix + (ANY,)])
+    elif kind in _SAME_VALUE_TYPES:
+        for child in bender.children():
+            _read_whole(child, prefix, paths, selected)
+    elif kind in _LIST_OP_TYPES and bender._bender is not None:
+        _read_whole(bender._bender, prefix, paths, selected)
+    elif kind not in (K, Context) or selected:
+        paths.add(prefix)
+    return None
+
+
+def load_projected(document, paths):
+    """
+    Parse the JSON `document`, building only the values at `paths` (as
+    returned by `source_paths()`).
+
+    document: a str or bytes with the document, or a file it can be read
+              from.
+    paths: the paths to keep.
+
+    Objects only get the keys leading to `paths`. Lists keep their length,
+    so that indexes work the same, but the elements that aren't needed are
+    None.
+    The parts of the document that aren't needed are skipped over, without
+    creating the values in them and without validating them either.
+
+    Example:
+    ```
+    with open('order.json', 'rb') as f:
+        source = load_projected(f, source_paths(ORDER_MAPPING))
+    bend(ORDER_MAPPING, source)
+    ```
+    """
+    if hasattr(document, 'read'):
+        document = document.read()
+    if isinstance(document, bytes) and not PY2:
+        document = document.decode('utf-8-sig')
+    projection = _projection(paths)
+    idx = _WHITESPACE.match(document, 0).end()
+    value, idx = _parse(document, idx, projection)
+    idx = _WHITESPACE.match(document, idx).end()
+    if idx != len(document):
+        raise _error('Extra data', document, idx)
+    return value
+
+
+def _projection(paths):
+    """
+    Return a tree of nested dicts with the keys of `paths`, with _WHOLE for
+    the values needed whole.
+    """
+    root = {}
+    for path in paths:
+        if not path:
+            return _WHOLE
+        node = root
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+            if node is _WHOLE:
+                break
+        else:
+            node[path[-1]] = _WHOLE
+    return _fold_indexes(root)
+
+
+def _fold_indexes(node):
+    # every element of lists read with ANY is parsed with the same
+    # projection, so it has to include the one of each index
+    if node is _WHOLE:
+        return node
+    for key, child in list(iteritems(node)):
+        node[key] = _fold_indexes(child)
+    if ANY in node:
+        for key in list(node):
+            if isinstance(key, int):
+                node[ANY] = _merge(node[ANY], node.pop(key))
+    return node
+
+
+def _merge(a, b):
+    if a is _WHOLE or b is _WHOLE:
+        return _WHOLE
+    merged = dict(a)
+    for key, child in iteritems(b):
+        merged[key] = _merge(merged[key], child) if key in merged else child
+    return merged
+
+
+def _parse(text, idx, projection):
+    char = text[idx:idx + 1]
+    if projection is _WHOLE or (char == '{' and ANY in projection):
+        return _scan(text, idx)
+    elif char not in ('{', '['):
+        return _scan(text, idx)
+    elif _container_end(text, idx, idx + _SMALL) is not None:
+        value, idx = _scan(text, idx)
+        return _project(value, projection), idx
+    elif char == '{':
+        return _parse_object(text, idx, projection)
+    return _parse_array(text, idx, projection)
+
+
+def _parse_object(text, idx, projection):
+    result = {}
+    idx = _WHITESPACE.match(text, idx + 1).end()
+    if text[idx:idx + 1] == '}':
+        return result, idx + 1
+    while True:
+        match = _KEY.match(text, idx)
+        if match is not None:
+            key, idx = match.group(1), match.end()
+        else:
+            # keys with escapes, or errors
+            if text[idx:idx + 1] != '"':
+                raise _error('Expecting property name enclosed in double '
+                             'quotes', text, idx)
+            key, idx = scanstring(text, idx + 1)
+            idx = _WHITESPACE.match(text, idx).end()
+            if text[idx:idx + 1] != ':':
+                raise _error("Expecting ':' delimiter", text, idx)
+            idx = _WHITESPACE.match(text, idx + 1).end()
+        child = projection.get(key)
+        if child is None:
+            idx = _skip(text, idx)
+        else:
+            result[key], idx = _parse(text, idx, child)
+        idx = _WHITESPACE.match(text, idx).end()
+        char = text[idx:idx + 1]
+        if char == '}':
+            return result, idx + 1
+        elif char != ',':
+            raise _error("Expecting ',' delimiter", text, idx)
+        idx = _WHITESPACE.match(text, idx + 1).end()
+
+
+def _parse_array(text, idx, projection):
+    each = projection.get(ANY)
+    values, starts = [], []
+    idx = _WHITESPACE.match(text, idx + 1).end()
+    if text[idx:idx + 1] == ']':
+        return values, idx + 1
+    while True:
+        if each is None:
+            starts.append(idx)
+            idx = _skip(text, idx)
+        else:
+            value, idx = _parse(text, idx, each)
+            values.append(value)
+        idx = _WHITESPACE.match(text, idx).end()
+        char = text[idx:idx + 1]
+        if char == ']':
+            break
+        elif char != ',':
+            raise _error("Expecting ',' delimiter", text, idx)
+        idx = _WHITESPACE.match(text, idx + 1).end()
+
+    if each is None:
+        # negative indexes need the length, so the needed elements are
+        # only parsed once every element has been skipped over
+        values = [None] * len(starts)
+        for index, child in _indexes(projection, len(starts)):
+            values[index] = _parse(text, starts[index], child)[0]
+    return values, idx + 1
+
+
+def _project(value, projection):
+    """
+    Return the projection of an already parsed value.
+    """
+    if projection is _WHOLE:
+        return value
+    elif type(value) is dict:
+        if ANY in projection:
+            return value
+        return {k: _project(v, projection[k])
+                for k, v in iteritems(value) if k in projection}
+    elif type(value) is list:
+        each = projection.get(ANY)
+        if each is not None:
+            return [_project(v, each) for v in value]
+        values = [None] * len(value)
+        for index, child in _indexes(projection, len(value)):
+            values[index] = _project(value[index], child)
+        return values
+    return value
+
+
+def _indexes(projection, length):
+    """
+    Return the indexes of a list of `length` elements needed by
+    `projection`, along with the projection of each, as a list of pairs.
+    """
+    needed = {}
+    for key, child in iteritems(projection):
+        if isinstance(key, int) and -length <= key < length:
+            index = key % length
+            needed[index] = (_merge(needed[index], child)
+                             if index in needed else child)
+    return list(iteritems(needed))
+
+
+def _skip(text, idx):
+    """
+    Return the index right after the value starting at `idx`.
+    """
+    if text[idx:idx + 1] not in ('{', '['):
+        return _scan(text, idx)[1]
+    end = _container_end(text, idx, len(text))
+    if end is None:
+        raise _error('Unterminated list or object', text, idx)
+    return end
+
+
+def _container_end(text, idx, endpos):
+    """
+    Return the index right after the list or object starting at `idx`, or
+    None if it doesn't end before `endpos`.
+    """
+    depth = 0
+    for match in _UP_TO_BRACKET.finditer(text, idx, endpos):
+        if match.start() != idx:
+            # something that isn't JSON, or a string cut at `endpos`
+            return None
+        idx = match.end()
+        if match.group(1) in ('{', '['):
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return idx
+    return None
+
+
+def _scan(text, idx):
+    try:
+        return _scan_once(text, idx)
+    except StopIteration:
+        raise _error('Expecting value', text, idx)
+
+
+def _error(message, text, idx):
+    if PY2:
+        return ValueError('{}: char {}'.format(message, idx))
+    return json.JSONDecodeError(message, text, idx)
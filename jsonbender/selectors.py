@@ -1,13 +1,20 @@
-from jsonbender.core import Bender
+from jsonbender.cache import LRUCache
+from jsonbender.core import MISSING, Bender
 
 
 class K(Bender):
     """
     Selects a constant value.
     """
+
+    __slots__ = ('_val',)
+
     def __init__(self, value):
         self._val = value
 
+    def evaluate(self, value, context):
+        return self._val
+
     def execute(self, source):
         return self._val
 
@@ -18,11 +25,32 @@ class S(Bender):
     Example:
         S('a', 0, 'b').execute({'a': [{'b': 42}]}) -> 42
     """
+
+    __slots__ = ('_path',)
+
     def __init__(self, *path):
         if not path:
             raise ValueError('No path given')
         self._path = path
 
+    def evaluate(self, value, context):
+        for key in self._path:
+            value = value[key]
+        return value
+
+    def try_evaluate(self, value, context):
+        for key in self._path:
+            if type(value) is dict:
+                value = value.get(key, MISSING)
+                if value is MISSING:
+                    return MISSING
+            else:
+                try:
+                    value = value[key]
+                except LookupError:
+                    return MISSING
+        return value
+
     def execute(self, source):
         for key in self._path:
             source = source[key]
@@ -45,10 +73,27 @@ class OptionalS(S):
         OptionalS('a', 0, 'b', default=23).execute({'a': []}) -> 23
     """
 
+    __slots__ = ('default',)
+
     def __init__(self, *path, **kwargs):
         self.default = kwargs.get('default')
         super(OptionalS, self).__init__(*path)
 
+    def evaluate(self, value, context):
+        for key in self._path:
+            if type(value) is dict:
+                value = value.get(key, MISSING)
+                if value is MISSING:
+                    return self.default
+            else:
+                try:
+                    value = value[key]
+                except LookupError:
+                    return self.default
+        return value
+
+    try_evaluate = evaluate
+
     def execute(self, source):
         try:
             ret = super(OptionalS, self).execute(source)
@@ -72,11 +117,17 @@ class F(Bender):
     K([{'id': 3}, {'id': 1}]) >> f  #  -> [{'id': 1}, {'id': 3}]
     ```
     """
+
+    __slots__ = ('_func', '_args', '_kwargs')
+
     def __init__(self, func, *args, **kwargs):
         self._func = func
         self._args = args
         self._kwargs = kwargs
 
+    def evaluate(self, value, context):
+        return self._func(value, *self._args, **self._kwargs)
+
     def execute(self, value):
         return self._func(value, *self._args, **self._kwargs)
 
@@ -90,6 +141,13 @@ class F(Bender):
                           protect_against=protect_against,
                           **self._kwargs)
 
+    def cached(self, maxsize=128, key=None, ttl=None):
+        """
+        Return a CachedF remembering the results of this bender for the
+        last `maxsize` inputs (see CachedF).
+        """
+        return CachedF(self, maxsize=maxsize, key=key, ttl=ttl)
+
 
 class ProtectedF(F):
     """
@@ -105,10 +163,18 @@ class ProtectedF(F):
     ```
 
     """
+
+    __slots__ = ('_protect_against',)
+
     def __init__(self, func, *args, **kwargs):
         self._protect_against = kwargs.pop('protect_against', None)
         super(ProtectedF, self).__init__(func, *args, **kwargs)
 
+    def evaluate(self, value, context):
+        if value == self._protect_against:
+            return value
+        return self._func(value, *self._args, **self._kwargs)
+
     def execute(self, value):
         if value == self._protect_against:
             return value
@@ -116,3 +182,67 @@ class ProtectedF(F):
             return super(ProtectedF, self).execute(value)
 
 
+class CachedF(Bender):
+    """
+    Wraps an F (or ProtectedF) bender, remembering its results for the last
+    `maxsize` inputs (or for any number of them if it's None), for as long
+    as the bender lives.
+    Only use it with functions whose result depends on their input alone.
+
+    key: optional. a function returning the key under which the result for
+         an input is kept. By default, inputs of the same type that are
+         equal share their result. Inputs that can't be hashed, like dicts
+         and lists, are not cached unless `key` makes a hashable key out of
+         them.
+    ttl: optional. the number of seconds after which a result is computed
+         again.
+
+    Example:
+    ```
+    slugify = F(make_slug).cached(maxsize=1000)
+    bend({'slug': S('title') >> slugify}, source)
+    slugify.cache_info()  # -> CacheInfo(hits=..., misses=..., ...)
+    ```
+    """
+
+    __slots__ = ('_bender', '_key', '_cache')
+    _bender_fields = ('_bender',)
+
+    def __init__(self, bender, maxsize=128, key=None, ttl=None):
+        self._bender = bender
+        self._key = key
+        self._cache = LRUCache(maxsize, ttl)
+
+    def evaluate(self, value, context):
+        key = _default_key(value) if self._key is None else self._key(value)
+        cache = self._cache
+        try:
+            result = cache.get(key)
+        except TypeError:
+            # unhashable
+            return self._bender.evaluate(value, context)
+        if result is MISSING:
+            result = self._bender.evaluate(value, context)
+            cache.set(key, result)
+        return result
+
+    def cache_info(self):
+        """
+        Return a CacheInfo with the number of hits, misses and evictions,
+        and the size of the cache. Its `hit_rate` is the fraction of inputs
+        whose result was cached.
+        """
+        return self._cache.info()
+
+    def clear(self):
+        """
+        Forget every cached result and reset the statistics.
+        """
+        self._cache.clear()
+
+
+def _default_key(value):
+    if type(value) is float:
+        # tell 0.0 from -0.0
+        return (float, repr(value))
+    return (type(value), value)
@@ -0,0 +1,386 @@
+"""
+Save mappings as plain data, and cache them on disk.
+
+`serialize()` turns a mapping into JSON-compatible data, with the functions
+and classes in it stored as references to import them by, and
+`deserialize()` rebuilds the mapping from that data. `MappingCache` keeps
+the mappings of Python modules serialized on disk, like `.pyc` files keep
+compiled modules, so that processes starting up load them from there
+instead of building them again.
+"""
+import hashlib
+import marshal
+import mmap
+import os
+import sys
+import tempfile
+import types
+from warnings import warn
+
+from jsonbender.batch import _split_reference, load_mapping
+from jsonbender.core import MISSING, Bender
+from jsonbender.interning import InternTable
+from jsonbender._compat import PY2, iteritems, replace
+
+try:
+    from importlib.util import find_spec
+except ImportError:  # Python 2
+    from pkgutil import get_loader
+    find_spec = None
+
+
+# The version of the serialized form, part of the keys of the cache.
+_FORMAT = 1
+
+_SCALAR_TYPES = frozenset([type(None), bool, int, float, str, type(u''),
+                           type(2 ** 64)])
+
+# Functions and methods, stored as references.
+_ROUTINE_TYPES = (types.FunctionType, types.BuiltinFunctionType,
+                  type(str.upper), type(dict.__dict__['fromkeys']))
+
+
+def serialize(mapping):
+    """
+    Return `mapping` as data made of dicts, lists, strings, numbers,
+    booleans and None, which can be written as JSON (with `json.dumps()`)
+    or with `marshal`, and read back with `deserialize()`.
+
+    Functions and classes, including those of the benders, are stored as
+    references to import them by, like 'package.module:name', so they must
+    be importable by name: lambdas, nested functions and bound methods
+    can't be serialized. Other values must be plain data, or objects whose
+    class defines `__getstate__()` and `__setstate__()`.
+    Benders and dicts found more than once in the mapping, including
+    mappings nested inside themselves, are stored once and stay shared;
+    this relies on the order of the keys of the data, so it must be kept
+    (don't use `sort_keys`).
+    Raises TypeError for anything that can't be serialized.
+
+    Example:
+    ```
+    json.dumps(serialize({'name': S('user', 'name') >> F(str.title)}))
+    # -> '{"name": {"$bender": "jsonbender.core:Compose", "fields": ...}}'
+    ```
+    """
+    return _Serializer().serialize(mapping)
+
+
+# Lists being serialized, to catch lists nested inside themselves.
+_IN_PROGRESS = object()
+
+
+class _Serializer(object):
+    def __init__(self):
+        # the data of the benders and dicts serialized so far, along with
+        # them to keep their ids from being reused, by id
+        self.seen = {}
+        self.shared = 0
+
+    def serialize(self, mapping):
+        kind = type(mapping)
+        if kind in _SCALAR_TYPES:
+            return mapping
+        elif kind is list:
+            if self.seen.get(id(mapping)) is _IN_PROGRESS:
+                raise TypeError("Lists nested inside themselves can't be "
+                                'serialized')
+            self.seen[id(mapping)] = _IN_PROGRESS
+            data = [self.serialize(v) for v in mapping]
+            del self.seen[id(mapping)]
+            return data
+        elif kind is dict or isinstance(mapping, Bender):
+            seen = self.seen.get(id(mapping))
+            if seen is not None:
+                return self.same(seen[1])
+            data = {}
+            self.seen[id(mapping)] = (mapping, data)
+            data.update(self.serialize_object(mapping))
+            return data
+        return self.serialize_object(mapping)
+
+    def same(self, data):
+        if '$id' not in data:
+            data['$id'] = self.shared
+            self.shared += 1
+        return {'$same': data['$id']}
+
+    def serialize_object(self, mapping):
+        kind = type(mapping)
+        if kind is dict:
+            if all(type(k) is str and not k.startswith('$') for k in mapping):
+                return {k: self.serialize(v) for k, v in iteritems(mapping)}
+            return {'$dict': [[self.serialize(k), self.serialize(v)]
+                              for k, v in iteritems(mapping)]}
+        elif kind is tuple:
+            return {'$tuple': [self.serialize(v) for v in mapping]}
+        elif isinstance(mapping, (type, _ROUTINE_TYPES)):
+            return {'$ref': _reference(mapping)}
+        elif _defined_by(kind, '__reduce__') is not object:
+            reduced = mapping.__reduce__()
+            if any(extra is not None for extra in reduced[2:]):
+                raise TypeError("{!r} can't be serialized".format(mapping))
+            return {'$reduce': [self.serialize(reduced[0]),
+                                self.serialize(reduced[1])]}
+        elif (isinstance(mapping, Bender) and
+                _defined_by(kind, '__getstate__') is Bender):
+            state, slots = mapping.__getstate__()
+            fields = dict(state or {}, **slots)
+            return {'$bender': _reference(kind),
+                    'fields': {k: self.serialize(v)
+                               for k, v in iteritems(fields)}}
+        elif hasattr(kind, '__getstate__') and hasattr(kind, '__setstate__'):
+            return {'$object': _reference(kind),
+                    'state': self.serialize(mapping.__getstate__())}
+        raise TypeError("{!r} can't be serialized".format(mapping))
+
+
+def _defined_by(kind, name):
+    """
+    Return the class in the MRO of `kind` that defines the attribute `name`.
+    """
+    # comparing the attributes themselves doesn't work on Python 2, where
+    # each access to a method makes a new unbound method
+    for cls in kind.__mro__:
+        if name in cls.__dict__:
+            return cls
+    return None
+
+
+def _reference(obj):
+    module = getattr(obj, '__module__', None)
+    if module is None and hasattr(obj, '__objclass__'):
+        module = obj.__objclass__.__module__
+    name = getattr(obj, '__qualname__', None) or getattr(obj, '__name__', '')
+    if not hasattr(obj, '__qualname__') and hasattr(obj, '__objclass__'):
+        # methods of builtin types on Python 2, like str.lower
+        name = '{}.{}'.format(obj.__objclass__.__name__, name)
+    reference = '{}:{}'.format(module, name)
+    if module and name and '<' not in name:
+        try:
+            if load_mapping(reference) is obj:
+                return reference
+        except (ImportError, AttributeError, ValueError):
+            pass
+    raise TypeError("{!r} can't be serialized, since it can't be imported "
+                    'by name'.format(obj))
+
+
+def deserialize(data):
+    """
+    Return the mapping serialized by `serialize()` as `data`.
+    It imports the modules of the functions and classes in the mapping, so
+    only deserialize data from trusted sources, just like with `pickle`.
+    """
+    return _deserialize(data, {})
+
+
+def _deserialize(data, memo):
+    # memo has the imported functions and classes, by reference, and the
+    # shared benders and dicts, by their '$id'
+    kind = type(data)
+    if kind is list:
+        return [_deserialize(v, memo) for v in data]
+    elif kind is not dict:
+        return data
+    for tag, load in _LOADERS:
+        if tag in data:
+            return load(data, memo)
+    return {k: _deserialize(v, memo) for k, v in iteritems(data)}
+
+
+def _import(reference, memo):
+    obj = memo.get(reference, MISSING)
+    if obj is MISSING:
+        obj = memo[reference] = load_mapping(reference)
+    return obj
+
+
+def _load_bender(data, memo):
+    cls = _import(data['$bender'], memo)
+    bender = cls.__new__(cls)
+    if '$id' in data:
+        memo[data['$id']] = bender
+    for name, value in iteritems(data['fields']):
+        setattr(bender, name, _deserialize(value, memo))
+    return bender
+
+
+def _load_dict(data, memo):
+    loaded = {}
+    if '$id' in data:
+        memo[data['$id']] = loaded
+    if '$dict' in data:
+        for k, v in data['$dict']:
+            loaded[_deserialize(k, memo)] = _deserialize(v, memo)
+    else:
+        for k, v in iteritems(data):
+            if k != '$id':
+                loaded[k] = _deserialize(v, memo)
+    return loaded
+
+
+def _load_reduce(data, memo):
+    func, args = data['$reduce']
+    return _deserialize(func, memo)(*_deserialize(args, memo))
+
+
+def _load_object(data, memo):
+    cls = _import(data['$object'], memo)
+    obj = cls.__new__(cls)
+    obj.__setstate__(_deserialize(data['state'], memo))
+    return obj
+
+
+# The tags of the data that isn't a plain dict, by how common they are.
+# Plain dicts have no keys starting with '$' other than '$id'.
+_LOADERS = [
+    ('$bender', _load_bender),
+    ('$same', lambda data, memo: memo[data['$same']]),
+    ('$tuple', lambda data, memo: tuple(
+        _deserialize(v, memo) for v in data['$tuple'])),
+    ('$ref', lambda data, memo: _import(data['$ref'], memo)),
+    ('$dict', _load_dict),
+    ('$id', _load_dict),
+    ('$reduce', _load_reduce),
+    ('$object', _load_object),
+]
+
+
+class MappingCache(object):
+    """
+    Keeps the mappings of Python modules serialized on disk (see
+    `serialize()`), so that they are loaded from there instead of being
+    built again by importing their modules.
+
+    directory: where the cache files are kept, one per mapping. It's
+               created if it doesn't exist.
+    intern: optional. if true, mappings are interned (see `InternTable`)
+            before being written, so that the benders they have in common
+            are stored once, and loaded once, making mappings with many
+            near-duplicate parts much faster to load.
+
+    Each file is only used as long as the source of the module defining the
+    mapping, the version of jsonbender and that of Python are the same as
+    when it was written; otherwise the mapping is imported and the file
+    written again, just like `.pyc` files. Files are read through `mmap`.
+
+    Mappings that can't be serialized, like those with lambdas, are
+    imported every time, with a RuntimeWarning.
+    Loading a mapping imports the modules of the functions and classes in
+    it, so the directory must be as trusted as the code itself.
+
+    Example:
+    ```
+    cache = MappingCache('/var/cache/mappings')
+    mapping = cache.load('tenants.acme:MAPPING')
+    ```
+    """
+
+    def __init__(self, directory, intern=False):
+        self.directory = directory
+        self.intern = intern
+
+    def load(self, reference, depends=()):
+        """
+        Return the mapping at `reference`, of the form
+        'package.module:NAME' (see `load_mapping()`), from the cache if
+        it's there and up to date.
+
+        depends: the names of other modules whose source the mapping is
+                 built from, like those defining mappings it's made of.
+                 Changing any of them makes the mapping be imported again
+                 too.
+        """
+        key = self._key(reference, depends)
+        path = self._path(reference)
+        if key is not None:
+            data = _read(path, key)
+            if data is not MISSING:
+                return deserialize(data)
+        mapping = load_mapping(reference)
+        if self.intern:
+            mapping = InternTable().intern(mapping)
+        if key is not None:
+            try:
+                data = serialize(mapping)
+            except TypeError as e:
+                warn(RuntimeWarning(
+                    "The mapping {} can't be cached: {}".format(reference,
+                                                               e)))
+            else:
+                _write(self.directory, path, key, data)
+        return mapping
+
+    def _path(self, reference):
+        return os.path.join(self.directory,
+                            reference.replace(':', '.') + '.jbm')
+
+    def _key(self, reference, depends):
+        import jsonbender
+        digest = hashlib.sha256()
+        for part in (_FORMAT, jsonbender.__version__, sys.version, reference,
+                     self.intern):
+            digest.update(u'{}\0'.format(part).encode('utf-8'))
+        for module_name in (_split_reference(reference)[0],) + tuple(depends):
+            source = _source(module_name)
+            if source is None:
+                return None
+            digest.update(source)
+        return digest.hexdigest()
+
+
+def _source(module_name):
+    """
+    Return the source of the module, without importing it, or None if it
+    can't be found.
+    """
+    try:
+        if find_spec is None:
+            loader = get_loader(module_name)
+            path = loader and loader.get_filename(module_name)
+        else:
+            spec = find_spec(module_name)
+            path = spec and spec.has_location and spec.origin
+    except (ImportError, ValueError):
+        return None
+    if not path:
+        return None
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except (IOError, OSError):
+        return None
+
+
+def _read(path, key):
+    try:
+        with open(path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (IOError, OSError, ValueError):
+        return MISSING
+    try:
+        stored_key, mapping = marshal.loads(data[:] if PY2 else data)
+    except (EOFError, ValueError, TypeError):
+        return MISSING
+    finally:
+        data.close()
+    return mapping if stored_key == key else MISSING
+
+
+def _write(directory, path, key, data):
+    # written to a temporary file and then moved into place, so that
+    # processes reading it never see half of it. Failing to write it
+    # isn't an error, just like with `.pyc` files.
+    try:
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        fd, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    except (IOError, OSError):
+        return
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            marshal.dump((key, data), f)
+        replace(temporary, path)
+    except (IOError, OSError):
+        os.remove(temporary)
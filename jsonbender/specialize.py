@@ -0,0 +1,320 @@
+"""
+Specialize the selectors of a mapping for the records it will bend.
+
+`S` and `OptionalS` walk their path with a generic loop that works whatever
+each step turns out to be. `specialize()` replaces them with selectors that
+read the whole path with a single expression generated for it, like
+`value['order']['lines'][0]`, guarded so that they fall back to the generic
+loop whenever the expression fails. They give exactly the same results,
+and raise exactly the same exceptions, as the selectors they replace, for
+records that match the schema and for those that don't.
+"""
+import copy
+
+from jsonbender.cache import LRUCache
+from jsonbender.core import (MISSING, Add, And, Bender, Compose, Concat,
+                             Div, Eq, GetItem, Invert, Mul, Neg, Or, Sub,
+                             _structural_key)
+from jsonbender.control_flow import Alternation, If, Switch
+from jsonbender.list_ops import ForallBend
+from jsonbender.selectors import OptionalS, S
+from jsonbender.string_ops import Format, ProtectedFormat
+from jsonbender._compat import iteritems
+
+
+# Keys that can be written as literals in the generated code.
+_LITERAL_TYPES = frozenset([int, str, type(u'')])
+
+_JSON_TYPES = {dict: 'object', list: 'array', str: 'string',
+               type(u''): 'string', int: 'integer', float: 'number',
+               bool: 'boolean', type(None): 'null'}
+
+# Benders whose inner benders are evaluated with the same value they are.
+_SAME_VALUE_TYPES = frozenset([Add, Sub, Mul, Div, Eq, And, Or, Neg, Invert,
+                               Concat, Format, ProtectedFormat, If, Switch,
+                               Alternation])
+
+# S selectors shorter than this aren't worth specializing.
+_MIN_DEPTH = 2
+
+_ACCESSOR_SOURCE = '''\
+def make(generic, generic_try{params}):
+    def evaluate(value, context):
+        try:
+            return value{path}
+        except Exception:
+            return generic(value, context)
+
+    def try_evaluate(value, context):
+        try:
+            return value{path}
+        except Exception:
+            return generic_try(value, context)
+
+    return evaluate, try_evaluate
+'''
+
+_FACTORIES = LRUCache(maxsize=1024)
+
+
+def specialize(mapping, schema=None, samples=None):
+    """
+    Return a mapping equivalent to `mapping` whose selectors read their
+    paths with code generated for them, which is faster the deeper the
+    paths are.
+
+    `schema` is a JSON Schema of the records the mapping will bend, or
+    `samples` a few of those records. They tell which paths are always
+    there: `OptionalS` selectors are only specialized for those, since
+    misses are cheaper with the generic ones, and `S` selectors are left
+    alone when their path can't be there at all.
+    Only `type`, `properties`, `required`, `additionalProperties`,
+    `items`, `prefixItems` and `minItems` are looked at; anything else in
+    the schema is taken to allow any value.
+
+    The original mapping is not modified. Like `optimize()`, only the
+    built-in benders are rewritten, so `specialize(optimize(mapping))`
+    gets the most out of both: merged selectors have longer paths.
+
+    Example:
+    ```
+    mapping = specialize({'city': S('customer', 'address', 'city')},
+                         samples=records[:10])
+    ```
+    """
+    if schema is not None and samples is not None:
+        raise ValueError('Pass either a schema or samples, not both')
+    if samples is not None:
+        samples = list(samples)
+        schema = _infer_schema(samples) if samples else None
+    return _specialize(mapping, {} if schema is None else schema)
+
+
+class SpecializedS(S):
+    """
+    An S that reads its whole path with an expression generated for it,
+    falling back to S for the values where that fails.
+    """
+
+    _generic_type = S
+
+    def __init__(self, *path, **kwargs):
+        super(SpecializedS, self).__init__(*path, **kwargs)
+        generic = self._generic_type(*path, **kwargs)
+        self.evaluate, self.try_evaluate = _accessors(self._path, generic)
+
+    def _options(self):
+        return {}
+
+    def structural_key(self):
+        return (type(self), _structural_key(self._path),
+                _structural_key(self._options()))
+
+    def __reduce__(self):
+        # the generated functions can't be pickled, so they are generated
+        # again
+        return _rebuild, (type(self), self._path, self._options())
+
+
+class SpecializedOptionalS(SpecializedS, OptionalS):
+    """
+    An OptionalS that reads its whole path with an expression generated for
+    it, falling back to OptionalS for the values where that fails.
+    """
+
+    _generic_type = OptionalS
+
+    def _options(self):
+        return {'default': self.default}
+
+
+def _rebuild(cls, path, options):
+    return cls(*path, **options)
+
+
+def _accessors(path, generic):
+    """
+    Return the `evaluate()` and `try_evaluate()` functions of a selector
+    of `path` that falls back to `generic`.
+    """
+    keys, path_source = [], []
+    for key in path:
+        if type(key) in _LITERAL_TYPES:
+            path_source.append('[{!r}]'.format(key))
+        else:
+            path_source.append('[k{}]'.format(len(keys)))
+            keys.append(key)
+    source = _ACCESSOR_SOURCE.format(
+        params=''.join(', k{}'.format(i) for i in range(len(keys))),
+        path=''.join(path_source))
+    make = _FACTORIES.get(source)
+    if make is MISSING:
+        namespace = {}
+        exec(compile(source, '<jsonbender specialized S>', 'exec'),
+             namespace)
+        make = namespace['make']
+        _FACTORIES.set(source, make)
+    return make(generic.evaluate, generic.try_evaluate, *keys)
+
+
+def _specialize(mapping, schema):
+    if isinstance(mapping, list):
+        return [_specialize(v, schema) for v in mapping]
+    elif isinstance(mapping, dict):
+        return {k: _specialize(v, schema) for k, v in iteritems(mapping)}
+    elif isinstance(mapping, Bender):
+        return _specialize_bender(mapping, schema)
+    else:
+        return mapping
+
+
+def _specialize_field(value, schema):
+    if isinstance(value, Bender):
+        return _specialize_bender(value, schema)
+    elif type(value) in (list, tuple):
+        return type(value)(_specialize_field(v, schema) for v in value)
+    elif type(value) is dict:
+        return {k: _specialize_field(v, schema) for k, v in iteritems(value)}
+    else:
+        return value
+
+
+def _specialize_bender(bender, schema):
+    kind = type(bender)
+    if kind is S:
+        found, _ = _walk(schema, bender._path)
+        if len(bender._path) >= _MIN_DEPTH and found is not False:
+            return SpecializedS(*bender._path)
+    elif kind is OptionalS:
+        _, present = _walk(schema, bender._path)
+        if present:
+            return SpecializedOptionalS(*bender._path,
+                                        default=bender.default)
+    elif kind is Compose:
+        return Compose(_specialize_bender(bender._first, schema),
+                       _specialize_bender(bender._second,
+                                          _result_schema(bender._first,
+                                                         schema)))
+    elif kind is ForallBend:
+        bender = copy.copy(bender)
+        bender._mapping = _specialize(bender._mapping, _items(schema))
+    elif kind in _SAME_VALUE_TYPES:
+        bender = copy.copy(bender)
+        for name in bender._bender_fields:
+            setattr(bender, name,
+                    _specialize_field(getattr(bender, name), schema))
+    return bender
+
+
+def _result_schema(bender, schema):
+    """
+    Return the schema of the values `bender` returns when evaluated with
+    values matching `schema`.
+    """
+    kind = type(bender)
+    if kind in (S, OptionalS):
+        found, present = _walk(schema, bender._path)
+        if kind is S or present:
+            return found
+    elif kind is GetItem:
+        return _walk(schema, (bender._index,))[0]
+    elif kind is Compose:
+        return _result_schema(bender._second,
+                              _result_schema(bender._first, schema))
+    return {}
+
+
+def _walk(schema, path):
+    """
+    Return the schema of the value at `path` of values matching `schema`,
+    which is False if no value can be there, and whether it's sure to be
+    there.
+    """
+    present = True
+    for key in path:
+        schema, step_present = _child(schema, key)
+        present = present and step_present
+        if schema is False:
+            return False, False
+    return schema, present
+
+
+def _child(schema, key):
+    if schema is False:
+        return False, False
+    elif schema is True:
+        return {}, False
+    types = schema.get('type')
+    if types is not None and not isinstance(types, list):
+        types = [types]
+
+    if type(key) is int:
+        if types is not None and 'array' not in types:
+            return False, False
+        prefix = schema.get('prefixItems')
+        items = schema.get('items', {})
+        if prefix is None and isinstance(items, list):
+            # the tuple form of older drafts
+            prefix, items = items, schema.get('additionalItems', {})
+        if prefix and -len(prefix) <= key < len(prefix):
+            items = prefix[key]
+        min_items = schema.get('minItems', 0)
+        present = key < min_items if key >= 0 else -key <= min_items
+        return items, present and types == ['array']
+
+    elif type(key) in _LITERAL_TYPES:
+        if types is not None and 'object' not in types:
+            return False, False
+        properties = schema.get('properties', {})
+        if key in properties:
+            child = properties[key]
+        else:
+            child = schema.get('additionalProperties', {})
+        present = key in schema.get('required', ()) and types == ['object']
+        return child, present
+
+    return {}, False
+
+
+def _items(schema):
+    """
+    Return the schema of the elements of lists matching `schema`.
+    """
+    if schema is False:
+        return False
+    elif schema is True:
+        return {}
+    items = schema.get('items', {})
+    return items if not isinstance(items, list) else {}
+
+
+def _infer_schema(samples):
+    """
+    Return the narrowest schema, among those `specialize()` understands,
+    that every value of `samples` matches.
+    """
+    types = []
+    for sample in samples:
+        json_type = _JSON_TYPES.get(type(sample))
+        if json_type not in types:
+            types.append(json_type)
+    schema = {}
+    if types and None not in types:
+        schema['type'] = types[0] if len(types) == 1 else types
+
+    objects = [s for s in samples if type(s) is dict]
+    if objects:
+        keys = []
+        for obj in objects:
+            keys.extend(k for k in obj if k not in keys)
+        schema['properties'] = {
+            k: _infer_schema([obj[k] for obj in objects if k in obj])
+            for k in keys}
+        schema['required'] = [k for k in keys
+                              if all(k in obj for obj in objects)]
+
+    arrays = [s for s in samples if type(s) is list]
+    if arrays:
+        schema['items'] = _infer_schema([v for a in arrays for v in a])
+        schema['minItems'] = min(len(a) for a in arrays)
+    return schema
@@ -0,0 +1,167 @@
+"""
+Bend straight into JSON text, without building the result first.
+"""
+import json
+
+from jsonbender.core import Bender, Compose, _key_error
+from jsonbender.list_ops import ForallBend
+from jsonbender._compat import iteritems
+
+
+# Encodes like json.dumps() with its default options.
+_encode = json.JSONEncoder().encode
+
+# How much text is buffered before it's written to the file.
+_BUFFER_SIZE = 1 << 16
+
+
+def bend_to_stream(mapping, source, fp, context=None):
+    """
+    Bend `source` with `mapping` like `bend()`, writing the result to the
+    text file `fp` as JSON instead of returning it.
+
+    What is written is exactly what `json.dumps(bend(mapping, source,
+    context))` returns, but the result is never built: each value is
+    written as soon as it's bent, and the lists built by `Forall.bend()`
+    are written one element at a time, so the memory used doesn't depend
+    on the size of the result.
+
+    It raises the same exceptions as `bend()`, and failing to encode the
+    result raises what `json.dumps()` would. Whatever was written before
+    the error is left in `fp`.
+
+    Example:
+    ```
+    with open('out.json', 'w') as f:
+        bend_to_stream({'lines': S('lines') >> Forall.bend({'a': S('b')})},
+                       source, f)
+    ```
+    """
+    stream = _Stream(fp)
+    _write(mapping, source, {} if context is None else context, stream)
+    stream.flush()
+    if stream.error is not None:
+        raise stream.error
+
+
+class _Stream(object):
+    """
+    Buffers the text written to a file.
+    After an error encoding the result, nothing else is written, but the
+    bending goes on, since `bend()` would raise its errors first.
+    """
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.parts = []
+        self.size = 0
+        self.error = None
+
+    def write(self, text):
+        if self.error is None:
+            self.parts.append(text)
+            self.size += len(text)
+            if self.size >= _BUFFER_SIZE:
+                self.flush()
+
+    def encode(self, value):
+        if self.error is None:
+            try:
+                text = _encode(value)
+            except (TypeError, ValueError) as e:
+                self.error = e
+            else:
+                self.write(text)
+
+    def flush(self):
+        if self.parts:
+            self.fp.write(''.join(self.parts))
+            self.parts = []
+            self.size = 0
+
+
+def _write(mapping, source, context, stream):
+    if isinstance(mapping, list):
+        stream.write('[')
+        for i, v in enumerate(mapping):
+            if i:
+                stream.write(', ')
+            _write(v, source, context, stream)
+        stream.write(']')
+
+    elif isinstance(mapping, dict):
+        stream.write('{')
+        for i, (k, v) in enumerate(iteritems(mapping)):
+            if i:
+                stream.write(', ')
+            _write_key(k, stream)
+            try:
+                _write(v, source, context, stream)
+            except Exception as e:
+                raise _key_error(k, e)
+        stream.write('}')
+
+    elif isinstance(mapping, Bender):
+        forall = _streamed_forall(mapping)
+        if forall is None:
+            stream.encode(mapping.evaluate(source, context))
+            return
+        if forall is not mapping:
+            if mapping._fused:
+                source = mapping._first.evaluate_lazy(source, context)
+            else:
+                source = mapping._first.evaluate(source, context)
+        stream.write('[')
+        if forall._executor is not None:
+            # the elements are bent on the executor, and written as their
+            # chunks are done
+            for i, item in enumerate(forall.evaluate_lazy(source, context)):
+                if i:
+                    stream.write(', ')
+                stream.encode(item)
+        else:
+            context = forall._context or context
+            for i, item in enumerate(source):
+                if i:
+                    stream.write(', ')
+                _write(forall._mapping, item, context, stream)
+        stream.write(']')
+
+    else:
+        stream.encode(mapping)
+
+
+def _streamed_forall(bender):
+    """
+    Return the ForallBend that makes the list `bender` returns, if it can
+    be written one element at a time.
+    """
+    if type(bender) is ForallBend:
+        return bender
+    elif type(bender) is Compose and type(bender._second) is ForallBend:
+        return bender._second
+    return None
+
+
+def _write_key(key, stream):
+    # the same conversions as json.dumps()
+    if isinstance(key, (str, type(u''))):
+        pass
+    elif isinstance(key, float):
+        key = _encode(key)
+    elif key is True:
+        key = 'true'
+    elif key is False:
+        key = 'false'
+    elif key is None:
+        key = 'null'
+    elif isinstance(key, int):
+        key = int.__repr__(key)
+    else:
+        if stream.error is None:
+            stream.error = TypeError(
+                'keys must be str, int, float, bool or None, not {}'
+                .format(type(key).__name__))
+        return
+    stream.write(_encode(key))
+    stream.write(': ')
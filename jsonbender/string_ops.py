@@ -1,4 +1,4 @@
-from jsonbender.core import Bender, Transport
+from jsonbender.core import Bender
 from jsonbender._compat import iteritems
 
 
@@ -17,18 +17,21 @@ class Format(Bender):
     fmt.execute(source)  # -> 'Edsger W. Dijkstra'
     ```
     """
+
+    __slots__ = ('_format_str', '_positional_benders', '_named_benders')
+    _bender_fields = ('_positional_benders', '_named_benders')
+
     def __init__(self, format_string, *args, **kwargs):
         self._format_str = format_string
         self._positional_benders = args
         self._named_benders = kwargs
 
-    def raw_execute(self, source):
-        transport = Transport.from_source(source)
-        args = [bender(source) for bender in self._positional_benders]
-        kwargs = {k: bender(source)
+    def evaluate(self, value, context):
+        args = [bender.evaluate(value, context)
+                for bender in self._positional_benders]
+        kwargs = {k: bender.evaluate(value, context)
                   for k, bender in iteritems(self._named_benders)}
-        value = self._format_str.format(*args, **kwargs)
-        return Transport(value, transport.context)
+        return self._format_str.format(*args, **kwargs)
 
 
 class ProtectedFormat(Format):
@@ -44,13 +47,16 @@ class ProtectedFormat(Format):
         source = {'first': 'Edsger'}
         fmt.execute(source)  # -> None
     """
-    def raw_execute(self, source):
+
+    __slots__ = ()
+
+    def evaluate(self, value, context):
+        args = [bender.evaluate(value, context)
+                for bender in self._positional_benders]
+        kwargs = {k: bender.evaluate(value, context)
+                  for k, bender in iteritems(self._named_benders)}
         # if any of the args to print are None, return None
-        if any(
-            [bender(source) is None for bender in self._positional_benders] +
-            [bender(source) is None for bender in self._named_benders.values()]
-        ):
-            # create an object with property value=None so it can be processed
-            return type(str('none_obj'), (object,), dict(value=None))
-        # else just behave normally
-        return super(ProtectedFormat, self).raw_execute(source)
+        if (any(arg is None for arg in args) or
+                any(arg is None for arg in kwargs.values())):
+            return None
+        return self._format_str.format(*args, **kwargs)
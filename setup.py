@@ -12,6 +12,12 @@ setup(
     download_url='https://codeload.github.com/Onyo/jsonbender/tar.gz/' + __version__,
     keywords=['dsl', 'edsl', 'json'],
     packages=['jsonbender'],
+    extras_require={
+        'columnar': ['numpy>=1.23'],
+    },
+    entry_points={
+        'console_scripts': ['jsonbender = jsonbender.cli:main'],
+    },
     classifiers=[
         'Intended Audience :: Developers',
         'Programming Language :: Python',
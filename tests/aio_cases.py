@@ -0,0 +1,222 @@
+import asyncio
+import unittest
+
+from jsonbender import (Alternation, Bender, BendingException, F, Filter,
+                        Forall, Format, If, K, Reduce, S, Switch, bend)
+from jsonbender.aio import AF, abend, abend_many
+from jsonbender.core import Concat
+
+
+class LookupServer(object):
+    """
+    A stub lookup service: answers each line with the upper-cased line,
+    after a short delay, and keeps track of the concurrent requests.
+    """
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self.requests = 0
+
+    async def handle(self, reader, writer):
+        line = (await reader.readline()).decode().strip()
+        self.requests += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(0.01)
+            if line == 'missing':
+                writer.write(b'!\n')
+            else:
+                writer.write(line.upper().encode() + b'\n')
+            await writer.drain()
+        finally:
+            self.active -= 1
+            writer.close()
+
+    async def lookup(self, value):
+        reader, writer = await asyncio.open_connection(*self.address)
+        writer.write(str(value).encode() + b'\n')
+        await writer.drain()
+        answer = (await reader.readline()).decode().strip()
+        writer.close()
+        if answer == '!':
+            raise KeyError(value)
+        return answer
+
+    async def run(self, coroutine_function):
+        server = await asyncio.start_server(self.handle, '127.0.0.1', 0)
+        self.address = server.sockets[0].getsockname()[:2]
+        try:
+            return await coroutine_function(self.lookup)
+        finally:
+            server.close()
+            await server.wait_closed()
+
+
+def sync_lookup(value):
+    if value == 'missing':
+        raise KeyError(value)
+    return str(value).upper()
+
+
+def run_loop(coroutine):
+    # asyncio.run() needs Python 3.7
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+async def is_even(value):
+    return value % 2 == 0
+
+
+async def add(acc, value):
+    return acc + value
+
+
+class Upper(Bender):
+    _bender_fields = ('bender',)
+
+    def __init__(self, bender):
+        self.bender = bender
+
+    def evaluate(self, value, context):
+        return self.bender.evaluate(value, context).upper()
+
+
+class TestAbend(unittest.TestCase):
+    def setUp(self):
+        self.server = LookupServer()
+
+    def run_with(self, build):
+        return run_loop(self.server.run(build))
+
+    def assert_same(self, build_mapping, source, context=None):
+        """
+        Check that abend() with the stub lookup gives the same result or
+        exception as bend() with the synchronous one.
+        """
+        try:
+            expected = bend(build_mapping(F(sync_lookup)), source, context)
+        except Exception as e:
+            with self.assertRaises(type(e)) as cm:
+                self.run_with(lambda lookup: abend(
+                    build_mapping(F(lookup)), source, context))
+            self.assertEqual(str(cm.exception), str(e))
+            return cm.exception
+        got = self.run_with(lambda lookup: abend(
+            build_mapping(F(lookup)), source, context))
+        self.assertEqual(got, expected)
+        return got
+
+    def test_mapping(self):
+        def mapping(lookup):
+            return {
+                'a': S('a') >> lookup,
+                'plain': S('b'),
+                'nested': {'c': S('c') >> lookup, 'l': [S('a') >> lookup]},
+                'concat': Concat(S('a') >> lookup, K('-'), S('c') >> lookup),
+                'add': (S('a') >> lookup) + (S('c') >> lookup),
+                'format': Format('{} {x}', S('a') >> lookup,
+                                 x=S('c') >> lookup),
+                'if': If(S('b') >> lookup, S('a') >> lookup),
+                'switch': Switch(S('a') >> lookup, {'X': S('c') >> lookup}),
+                'alt': Alternation(S('nope') >> lookup, S('c') >> lookup),
+                'items': S('items') >> Forall.bend({
+                    'v': S('v') >> lookup,
+                    'ctx': K(1)}),
+            }
+        self.assert_same(mapping, {'a': 'x', 'b': 1, 'c': 'y',
+                                   'items': [{'v': 'p'}, {'v': 'q'}]})
+        # independent lookups ran concurrently
+        self.assertGreater(self.server.max_active, 1)
+
+    def test_errors(self):
+        def mapping(lookup):
+            return {'ok': S('a') >> lookup,
+                    'n': {'bad': S('b') >> lookup},
+                    'later': S('missing_key')}
+        e = self.assert_same(mapping, {'a': 'x', 'b': 'missing'})
+        self.assertEqual(e.path, ['n', 'bad'])
+        self.assertIsInstance(e.__cause__, KeyError)
+        self.assert_same(mapping, {'a': 'x', 'b': 'y'})
+
+    def test_error_order(self):
+        # the first key that fails wins, like with bend()
+        def mapping(lookup):
+            return {'a': S('missing_key'), 'b': S('b') >> lookup}
+        self.assert_same(mapping, {'b': 'missing'})
+
+        def mapping(lookup):
+            return {'a': Concat(S('a') >> lookup, K(1), S('missing_key'))}
+        self.assert_same(mapping, {'a': 'x'})
+
+    def test_list_ops(self):
+        async def run(lookup):
+            mapping = {'upper': S('l') >> Forall(lookup),
+                       'even': S('n') >> Filter(is_even),
+                       'sum': S('n') >> Reduce(add)}
+            return await abend(mapping, {'l': ['a', 'b'], 'n': [1, 2, 4]})
+        self.assertEqual(self.run_with(run),
+                         {'upper': ['A', 'B'], 'even': [2, 4], 'sum': 7})
+
+    def test_af(self):
+        class Lookup(object):
+            def __init__(self, lookup):
+                self.lookup = lookup
+
+            async def __call__(self, value):
+                return await self.lookup(value)
+
+        async def run(lookup):
+            return await abend({'a': S('a') >> AF(Lookup(lookup))},
+                               {'a': 'x'})
+        self.assertEqual(self.run_with(run), {'a': 'X'})
+        with self.assertRaises(BendingException):
+            bend({'a': AF(sync_lookup)}, {})
+
+    def test_limit(self):
+        async def run(lookup):
+            mapping = {str(i): K(i) >> F(lookup) for i in range(8)}
+            return await abend(mapping, {}, limit=3)
+        self.assertEqual(self.run_with(run),
+                         {str(i): str(i) for i in range(8)})
+        self.assertEqual(self.server.max_active, 3)
+
+    def test_abend_many(self):
+        sources = [{'a': c} for c in 'abcdef']
+
+        async def run(lookup):
+            return await abend_many({'a': S('a') >> F(lookup)}, sources,
+                                    limit=4)
+        self.assertEqual(self.run_with(run),
+                         [{'a': c.upper()} for c in 'abcdef'])
+        self.assertEqual(self.server.max_active, 4)
+
+        sources.insert(2, {'a': 'missing'})
+        with self.assertRaises(BendingException):
+            self.run_with(run)
+
+    def test_sync_mapping(self):
+        mapping = {'a': S('a') >> F(sync_lookup)}
+        self.assertEqual(run_loop(abend(mapping, {'a': 'x'})),
+                         {'a': 'X'})
+        self.assertEqual(run_loop(abend_many(mapping, [{'a': 'x'}])),
+                         [{'a': 'X'}])
+
+    def test_user_defined_benders(self):
+        with self.assertRaises(TypeError):
+            run_loop(abend({'a': Upper(AF(sync_lookup))}, {}))
+        self.assertEqual(run_loop(abend({'a': Upper(S('a'))}, {'a': 'x'})),
+                         {'a': 'X'})
+
+    def test_invalid_limit(self):
+        with self.assertRaises(ValueError):
+            run_loop(abend({'a': AF(sync_lookup)}, {}, limit=0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,8 @@
+"""
+The tests of jsonbender.aio are in aio_cases, which uses `async def` and so
+can't even be imported on Python 2.
+"""
+import sys
+
+if sys.version_info >= (3, 5):
+    from aio_cases import TestAbend  # noqa
@@ -0,0 +1,227 @@
+from itertools import count, islice
+import marshal
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from datetime import date
+
+from jsonbender import (Bender, Context, F, Forall, K, S, bend,
+                        BendingException)
+from jsonbender.batch import (ResultCache, bend_many, bend_parallel,
+                              load_mapping)
+
+
+class TestBendMany(unittest.TestCase):
+    mapping = {'b': S('a') + K(1), 'ctx': Context()}
+
+    def test_same_results_as_bend(self):
+        sources = [{'a': i} for i in range(10)]
+        expected = [bend(self.mapping, s, {'c': 1}) for s in sources]
+        got = list(bend_many(self.mapping, sources, {'c': 1}))
+        self.assertEqual(got, expected)
+
+    def test_default_context(self):
+        got = list(bend_many(self.mapping, [{'a': 1}]))
+        self.assertEqual(got, [{'b': 2, 'ctx': {}}])
+
+    def test_lazy(self):
+        sources = ({'a': i} for i in count())
+        got = list(islice(bend_many({'b': S('a')}, sources), 3))
+        self.assertEqual(got, [{'b': 0}, {'b': 1}, {'b': 2}])
+
+    def test_forall_bend(self):
+        mapping = {'items': S('items') >> Forall.bend({'v': S('v')})}
+        sources = [{'items': [{'v': i}, {'v': -i}]} for i in range(3)]
+        got = list(bend_many(mapping, sources))
+        self.assertEqual(got, [bend(mapping, s) for s in sources])
+
+    def test_error(self):
+        results = bend_many({'b': S('a')}, [{'a': 1}, {}])
+        self.assertEqual(next(results), {'b': 1})
+        self.assertRaises(BendingException, next, results)
+
+
+class Reader(Bender):
+    def evaluate(self, value, context):
+        return context.get('x')
+
+
+class TestResultCache(unittest.TestCase):
+    mapping = {'b': S('a') + K(1), 'l': [S('l')], 'n': {'c': S('a')}}
+
+    def test_same_results_as_bend(self):
+        cache = ResultCache(self.mapping)
+        sources = [{'a': i % 3, 'l': [i % 3]} for i in range(10)]
+        self.assertEqual([cache.bend(s) for s in sources],
+                         [bend(self.mapping, s) for s in sources])
+        self.assertEqual(list(cache.bend_many(sources)),
+                         [bend(self.mapping, s) for s in sources])
+        self.assertEqual(cache.info()[:2], (17, 3))
+
+    def test_types_are_part_of_the_key(self):
+        cache = ResultCache({'b': S('a') >> F(repr)})
+        for v in [1, True, 1.0, -0.0, 0.0, '1']:
+            self.assertEqual(cache.bend({'a': v}), {'b': repr(v)})
+
+    def test_results_are_copies(self):
+        cache = ResultCache(self.mapping)
+        source = {'a': 1, 'l': [1]}
+        first = cache.bend(source)
+        first['n']['c'] = 'changed'
+        first['l'][0].append(2)
+        second = cache.bend({'a': 1, 'l': [1]})
+        self.assertEqual(second, {'b': 2, 'l': [[1]], 'n': {'c': 1}})
+        second['l'].append(3)
+        self.assertEqual(cache.bend({'a': 1, 'l': [1]}),
+                         {'b': 2, 'l': [[1]], 'n': {'c': 1}})
+
+    def test_bend_json(self):
+        cache = ResultCache(self.mapping)
+        for document in [b'{"a": 1, "l": []}', u'{"a": 1, "l": []}',
+                         b'{"a": 1, "l": []}']:
+            self.assertEqual(cache.bend_json(document),
+                             {'b': 2, 'l': [[]], 'n': {'c': 1}})
+        self.assertEqual(cache.info()[:2], (1, 2))
+        with self.assertRaises(ValueError):
+            cache.bend_json(b'not json')
+
+    def test_sources_and_documents_have_separate_keys(self):
+        cache = ResultCache(self.mapping)
+        source = {'a': 1, 'l': []}
+        cache.bend(source)
+        # the same bytes as the cached source, but not a JSON document
+        with self.assertRaises(ValueError):
+            cache.bend_json(marshal.dumps(source, 2))
+
+    def test_memory_limit(self):
+        cache = ResultCache(self.mapping, max_bytes=200)
+        for i in range(20):
+            cache.bend({'a': i, 'l': []})
+        info = cache.info()
+        self.assertLessEqual(info.currsize, 200)
+        self.assertGreater(info.evictions, 0)
+
+    def test_uncacheable(self):
+        cache = ResultCache({'d': S('d')})
+        for _ in range(2):
+            self.assertEqual(cache.bend({'d': date(2016, 1, 1)}),
+                             {'d': date(2016, 1, 1)})
+        cache = ResultCache({'d': S('a') >> F(lambda a: date(a, 1, 1))})
+        for _ in range(2):
+            self.assertEqual(cache.bend({'a': 2016}),
+                             {'d': date(2016, 1, 1)})
+        self.assertEqual(cache.uncacheable, 2)
+        self.assertEqual(cache.info().hits, 0)
+
+    def test_errors(self):
+        cache = ResultCache(self.mapping)
+        for _ in range(2):
+            with self.assertRaises(BendingException):
+                cache.bend({})
+
+    def test_context(self):
+        for mapping in [{'c': Context()}, {'c': Reader()},
+                        {'l': S('l') >> Forall.bend({'c': Context()})}]:
+            self.assertRaises(ValueError, ResultCache, mapping)
+        cache = ResultCache({'c': Reader()}, key_context=True)
+        self.assertEqual(cache.bend({}, {'x': 1}), {'c': 1})
+        self.assertEqual(cache.bend({}, {'x': 2}), {'c': 2})
+        self.assertEqual(cache.bend({}, {'x': 1}), {'c': 1})
+        self.assertEqual(cache.info().hits, 1)
+
+    def test_clear(self):
+        cache = ResultCache(self.mapping)
+        cache.bend({'a': 1, 'l': []})
+        cache.clear()
+        self.assertEqual(cache.info()[:2], (0, 0))
+
+
+MAPPING = {'b': S('a') >> F(lambda a: a * 2), 'ctx': Context()}
+IMPORTABLE = {'b': S('a') * K(2)}
+
+
+class TestLoadMapping(unittest.TestCase):
+    def test_colon(self):
+        self.assertIs(load_mapping('test_batch:MAPPING'), MAPPING)
+
+    def test_dotted(self):
+        self.assertIs(load_mapping('test_batch.MAPPING'), MAPPING)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, load_mapping, 'MAPPING')
+
+
+@unittest.skipIf(sys.version_info < (3, 7),
+                 'bend_parallel() needs Python 3.7 or later')
+class TestBendParallel(unittest.TestCase):
+    def test_keeps_order(self):
+        sources = ({'a': i} for i in range(1000))
+        got = list(bend_parallel(MAPPING, sources, context={'c': 1},
+                                 workers=2, chunksize=7))
+        expected = [{'b': i * 2, 'ctx': {'c': 1}} for i in range(1000)]
+        self.assertEqual(got, expected)
+
+    def test_error(self):
+        results = bend_parallel({'b': S('a')}, [{'a': 1}, {}, {'a': 3}],
+                                workers=2, chunksize=1)
+        self.assertEqual(next(results), {'b': 1})
+        with self.assertRaises(BendingException) as ctx:
+            next(results)
+        self.assertEqual(str(ctx.exception), "Error for key b: 'a'")
+        results.close()
+
+    def test_abandoned(self):
+        from concurrent.futures import ProcessPoolExecutor
+        shutdown = ProcessPoolExecutor.shutdown
+        waits = []
+
+        def recording(executor, wait=True, **kwargs):
+            waits.append(wait)
+            shutdown(executor, wait, **kwargs)
+
+        ProcessPoolExecutor.shutdown = recording
+        try:
+            results = bend_parallel(MAPPING, ({'a': i} for i in range(100)),
+                                    workers=2, chunksize=1)
+            self.assertEqual(next(results), {'b': 0, 'ctx': {}})
+            results.close()
+            self.assertEqual(waits, [False])
+            # no pool is started before results are asked for
+            bend_parallel(MAPPING, [{'a': 1}], workers=2)
+            self.assertEqual(waits, [False])
+            list(bend_parallel(MAPPING, [{'a': 1}], workers=2))
+            self.assertEqual(waits, [False, True])
+        finally:
+            ProcessPoolExecutor.shutdown = shutdown
+
+    def test_unpicklable_mapping(self):
+        spawn = multiprocessing.get_context('spawn')
+        self.assertRaises(TypeError, bend_parallel, MAPPING, [],
+                          mp_context=spawn)
+
+    def test_mapping_reference(self):
+        spawn = multiprocessing.get_context('spawn')
+        got = list(bend_parallel('test_batch:MAPPING', [{'a': 1}, {'a': 2}],
+                                 workers=1, mp_context=spawn))
+        self.assertEqual(got, [{'b': 2, 'ctx': {}}, {'b': 4, 'ctx': {}}])
+
+    def test_mapping_cache(self):
+        spawn = multiprocessing.get_context('spawn')
+        cache = tempfile.mkdtemp()
+        try:
+            for _ in range(2):
+                got = list(bend_parallel('test_batch:IMPORTABLE', [{'a': 1}],
+                                         workers=1, mp_context=spawn,
+                                         mapping_cache=cache))
+                self.assertEqual(got, [{'b': 2}])
+            self.assertEqual(os.listdir(cache), ['test_batch.IMPORTABLE.jbm'])
+        finally:
+            shutil.rmtree(cache)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import pickle
+import unittest
+
+from jsonbender import cache
+from jsonbender.cache import LRUCache
+from jsonbender.core import MISSING
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_get_and_set(self):
+        lru = LRUCache()
+        self.assertIs(lru.get('a'), MISSING)
+        lru.set('a', 1)
+        self.assertEqual(lru.get('a'), 1)
+        self.assertEqual(lru.info(), (1, 1, 0, 128, 1))
+        self.assertEqual(lru.info().hit_rate, 0.5)
+
+    def test_eviction(self):
+        lru = LRUCache(maxsize=2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertIs(lru.get('b'), MISSING)
+        self.assertEqual(lru.get('a'), 1)
+        self.assertEqual(lru.get('c'), 3)
+        self.assertEqual(lru.info().evictions, 1)
+        self.assertEqual(len(lru), 2)
+
+    def test_unbounded_and_disabled(self):
+        lru = LRUCache(maxsize=None)
+        for i in range(1000):
+            lru.set(i, i)
+        self.assertEqual(len(lru), 1000)
+        lru = LRUCache(maxsize=0)
+        lru.set('a', 1)
+        self.assertIs(lru.get('a'), MISSING)
+        with self.assertRaises(ValueError):
+            LRUCache(maxsize=-1)
+
+    def test_ttl(self):
+        now = [100.0]
+        original = cache.monotonic
+        cache.monotonic = lambda: now[0]
+        try:
+            lru = LRUCache(ttl=10)
+            lru.set('a', 1)
+            now[0] = 109.0
+            self.assertEqual(lru.get('a'), 1)
+            now[0] = 110.0
+            self.assertIs(lru.get('a'), MISSING)
+            self.assertEqual(len(lru), 0)
+        finally:
+            cache.monotonic = original
+
+    def test_unhashable(self):
+        lru = LRUCache()
+        with self.assertRaises(TypeError):
+            lru.get([1])
+        with self.assertRaises(TypeError):
+            lru.set([1], 1)
+        self.assertEqual(lru.info().misses, 1)
+
+    def test_pickle(self):
+        lru = LRUCache(maxsize=3, ttl=5)
+        lru.set('a', 1)
+        copy = pickle.loads(pickle.dumps(lru))
+        self.assertEqual((copy.maxsize, copy.ttl, len(copy)), (3, 5, 0))
+        copy.set('a', 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
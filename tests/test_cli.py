@@ -0,0 +1,179 @@
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from jsonbender.cli import main
+
+
+MAPPING_MODULE = '''
+from jsonbender import Context, F, K, S
+
+MAPPING = {'b': S('a') + K(1)}
+WITH_CONTEXT = {'b': S('a'), 'ctx': Context()}
+# a set can't be written as JSON
+NOT_JSON = {'b': S('a') >> F(lambda a: {a} if a == 2 else a)}
+'''
+
+
+class TestCLI(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        with open(os.path.join(self.dir, 'cli_mappings.py'), 'w') as f:
+            f.write(MAPPING_MODULE)
+        sys.path.insert(0, self.dir)
+        self.stderr = io.StringIO()
+
+    def tearDown(self):
+        sys.path.remove(self.dir)
+        sys.modules.pop('cli_mappings', None)
+        shutil.rmtree(self.dir)
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def write_input(self, lines, name='in.ndjson'):
+        with open(self.path(name), 'w') as f:
+            f.write(''.join(line + '\n' for line in lines))
+        return self.path(name)
+
+    def read_output(self, name='out.ndjson'):
+        with open(self.path(name)) as f:
+            return [json.loads(line) for line in f]
+
+    def run_cli(self, *args):
+        return main(list(args), stderr=self.stderr)
+
+    def test_bend_file(self):
+        path = self.write_input(['{"a": 1}', '', '{"a": 2}'])
+        status = self.run_cli('cli_mappings:MAPPING', path,
+                              '-o', self.path('out.ndjson'))
+        self.assertEqual(status, 0)
+        self.assertEqual(self.read_output(), [{'b': 2}, {'b': 3}])
+        self.assertIn('bent 2 records, 0 failed', self.stderr.getvalue())
+
+    def test_mapping_in_working_directory(self):
+        # the console script doesn't put the working directory on sys.path
+        path = self.write_input(['{"a": 1}'])
+        sys.path.remove(self.dir)
+        saved_path, cwd = sys.path[:], os.getcwd()
+        os.chdir(self.dir)
+        try:
+            status = self.run_cli('cli_mappings:MAPPING', path,
+                                  '-o', self.path('out.ndjson'), '-q')
+        finally:
+            os.chdir(cwd)
+            sys.path[:] = saved_path
+            sys.path.insert(0, self.dir)
+        self.assertEqual(status, 0)
+        self.assertEqual(self.read_output(), [{'b': 2}])
+
+    def test_multiple_files_and_context(self):
+        first = self.write_input(['{"a": 1}'], 'first.ndjson')
+        second = self.write_input(['{"a": 2}'], 'second.ndjson')
+        self.run_cli('cli_mappings.WITH_CONTEXT', first, second,
+                     '-c', '{"x": 1}', '-o', self.path('out.ndjson'), '-q')
+        self.assertEqual(self.read_output(),
+                         [{'b': 1, 'ctx': {'x': 1}},
+                          {'b': 2, 'ctx': {'x': 1}}])
+        self.assertEqual(self.stderr.getvalue(), '')
+
+    def test_errors_fail(self):
+        path = self.write_input(['{"a": 1}', '{}', '{"a": 3}'])
+        status = self.run_cli('cli_mappings:MAPPING', path,
+                              '-o', self.path('out.ndjson'))
+        self.assertEqual(status, 1)
+        self.assertEqual(self.read_output(), [{'b': 2}])
+        self.assertIn('in.ndjson:2: Error for key b',
+                      self.stderr.getvalue())
+
+    def test_errors_skip(self):
+        path = self.write_input(['{"a": 1}', 'not json', '{}', '{"a": 3}'])
+        status = self.run_cli('cli_mappings:MAPPING', path, '-e', 'skip',
+                              '-o', self.path('out.ndjson'))
+        self.assertEqual(status, 0)
+        self.assertEqual(self.read_output(), [{'b': 2}, {'b': 4}])
+        self.assertIn('bent 2 records, 2 failed', self.stderr.getvalue())
+
+    def test_encoding_errors(self):
+        path = self.write_input(['{"a": 1}', '{"a": 2}', '{"a": 3}'])
+        status = self.run_cli('cli_mappings:NOT_JSON', path, '-e', 'skip',
+                              '-o', self.path('out.ndjson'))
+        self.assertEqual(status, 0)
+        self.assertEqual(self.read_output(), [{'b': 1}, {'b': 3}])
+        self.assertIn('bent 2 records, 1 failed', self.stderr.getvalue())
+
+        status = self.run_cli('cli_mappings:NOT_JSON', path,
+                              '-e', 'dead-letter',
+                              '--dead-letter', self.path('failed.ndjson'),
+                              '-o', self.path('out.ndjson'))
+        self.assertEqual(status, 0)
+        with open(self.path('failed.ndjson')) as f:
+            self.assertEqual(f.read(), '{"a": 2}\n')
+
+        status = self.run_cli('cli_mappings:NOT_JSON', path,
+                              '-o', self.path('out.ndjson'))
+        self.assertEqual(status, 1)
+        self.assertEqual(self.read_output(), [{'b': 1}])
+
+    def test_errors_dead_letter(self):
+        path = self.write_input(['{"a": 1}', 'not json', '{}'])
+        self.run_cli('cli_mappings:MAPPING', path,
+                     '-e', 'dead-letter',
+                     '--dead-letter', self.path('dead.ndjson'),
+                     '-o', self.path('out.ndjson'))
+        self.assertEqual(self.read_output(), [{'b': 2}])
+        with open(self.path('dead.ndjson')) as f:
+            self.assertEqual(f.read(), 'not json\n{}\n')
+
+    def test_cache(self):
+        path = self.write_input(['{"a": 1}', '{"a": 2}', '{"a": 1}', '{}',
+                                 '{"a": 1}'])
+        status = self.run_cli('cli_mappings.WITH_CONTEXT', path,
+                              '--cache-bytes', '10000', '-c', '{"x": 1}',
+                              '-e', 'skip', '-o', self.path('out.ndjson'))
+        self.assertEqual(status, 0)
+        self.assertEqual(self.read_output(),
+                         [{'b': 1, 'ctx': {'x': 1}}, {'b': 2, 'ctx': {'x': 1}},
+                          {'b': 1, 'ctx': {'x': 1}}, {'b': 1, 'ctx': {'x': 1}}])
+        self.assertIn('2 cache hits (40%)', self.stderr.getvalue())
+
+    def test_mapping_cache(self):
+        path = self.write_input(['{"a": 1}'])
+        for _ in range(2):
+            sys.modules.pop('cli_mappings', None)
+            status = self.run_cli('cli_mappings:MAPPING', path,
+                                  '--mapping-cache', self.path('cache'),
+                                  '-o', self.path('out.ndjson'))
+            self.assertEqual(status, 0)
+            self.assertEqual(self.read_output(), [{'b': 2}])
+        self.assertEqual(os.listdir(self.path('cache')),
+                         ['cli_mappings.MAPPING.jbm'])
+        self.assertNotIn('cli_mappings', sys.modules)
+
+    def test_explain(self):
+        stdout = io.StringIO()
+        status = main(['cli_mappings:MAPPING', '--explain', '--max-cost',
+                       '10'], stdout=stdout, stderr=self.stderr)
+        self.assertEqual(status, 0)
+        self.assertIn('estimated cost: 4 operations per record',
+                      stdout.getvalue())
+        status = main(['cli_mappings:MAPPING', '--explain', '--max-cost',
+                       '3'], stdout=io.StringIO(), stderr=self.stderr)
+        self.assertEqual(status, 1)
+        self.assertIn('estimated cost, 4, is over 3', self.stderr.getvalue())
+        with self.assertRaises(SystemExit):
+            main(['cli_mappings:MAPPING', '--max-cost', '2'],
+                 stderr=self.stderr)
+
+    def test_dead_letter_requires_file(self):
+        with self.assertRaises(SystemExit):
+            main(['cli_mappings:MAPPING', '-e', 'dead-letter'],
+                 stderr=self.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
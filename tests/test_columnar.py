@@ -0,0 +1,167 @@
+import math
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from jsonbender import Context, F, Forall, K, OptionalS, S, bend
+from jsonbender.core import BendingException
+
+if numpy is not None:
+    from jsonbender import columnar
+    from jsonbender.columnar import bend_columns
+
+
+SOURCES = [
+    {'a': 1, 'b': 2.5, 'c': True, 'd': 'x', 'n': {'v': 3}, 'l': [1, 2]},
+    {'a': -4, 'b': 0.5, 'c': False, 'd': 'y', 'n': {'v': 0}, 'l': [3]},
+    {'a': 0, 'b': -1.0, 'c': True, 'd': 'z', 'n': {'v': -7}, 'l': []},
+]
+
+
+@unittest.skipIf(numpy is None, 'NumPy is not installed')
+class TestBendColumns(unittest.TestCase):
+    def assert_same(self, mapping, sources=SOURCES, context=None):
+        expected = [bend(mapping, s, context) for s in sources]
+        # must not fall back to bending each record
+        columnar.bend = None
+        try:
+            got = bend_columns(mapping, sources, context)
+        finally:
+            columnar.bend = bend
+        self.assertEqual(got, expected)
+        # same types too, e.g. ints stay ints and bools stay bools
+        self.assertEqual(repr(got), repr(expected))
+        return got
+
+    def test_selectors(self):
+        self.assert_same({'a': S('a'), 'v': S('n', 'v'), 'k': K([1]),
+                          'first': S('l') >> S(0).optional(),
+                          'item': S('n')['v'], 'const': 3})
+
+    def test_arithmetic(self):
+        self.assert_same({
+            'add': S('a') + S('b'),
+            'sub': S('a') - K(2),
+            'mul': S('a') * S('n', 'v'),
+            'div': S('b') / K(2),
+            'neg': -S('b'),
+            'mixed': (S('a') + S('c')) * K(2) - S('n', 'v') / K(4),
+        })
+
+    def test_bools(self):
+        self.assert_same({
+            'add': S('c') + S('c'),
+            'neg': -S('c'),
+            'eq': S('a') == K(0),
+            'not': ~S('a'),
+            'and': S('c') & S('c'),
+            'or': S('a') | S('n', 'v'),
+            'and_mixed': S('a') & S('c'),
+            'or_mixed': S('c') | S('b'),
+        })
+
+    def test_objects(self):
+        self.assert_same({'concat': S('d') + K('!'),
+                          'repeat': S('d') * S('n', 'v'),
+                          'eq': S('d') == K('y'),
+                          'not': ~S('d'),
+                          'lists': S('l') + S('l')})
+
+    def test_int_float_equality_is_exact(self):
+        self.assert_same({'eq': S('i') == S('f')},
+                         [{'i': 2 ** 53 + 1, 'f': float(2 ** 53)}])
+
+    def test_no_integer_overflow(self):
+        sources = [{'a': 2 ** 62, 'b': -2 ** 63}, {'a': 3, 'b': 2 ** 70}]
+        self.assert_same({'add': S('a') + S('a'), 'mul': S('a') * K(4),
+                          'neg': -S('b'), 'b': S('b')}, sources)
+
+    def test_division_by_zero(self):
+        mapping = {'ratio': S('b') / S('a')}
+        with self.assertRaises(BendingException) as cm:
+            bend_columns(mapping, SOURCES)
+        self.assertEqual(str(cm.exception),
+                         'Error for key ratio: float division by zero')
+        # no floating-point error flag is set for these
+        for sources, mapping in [
+                ([{'a': float('inf'), 'b': 0}], {'x': S('a') / S('b')}),
+                ([{'a': float('nan'), 'b': 0.0}], {'x': S('a') / S('b')}),
+                ([{'a': 1e308, 'b': 0}],
+                 {'x': (S('a') * K(10.0)) / S('b')})]:
+            with self.assertRaises(BendingException) as cm:
+                bend_columns(mapping, sources)
+            self.assertIsInstance(cm.exception.__cause__, ZeroDivisionError)
+
+    def test_errors(self):
+        with self.assertRaises(BendingException):
+            bend_columns({'x': S('missing')}, SOURCES)
+        with self.assertRaises(BendingException):
+            bend_columns({'x': S('a') + S('d')}, SOURCES)
+
+    def test_float_overflow(self):
+        self.assert_same({'big': S('x') * K(10.0)}, [{'x': 1e308}])
+
+    def test_fallback(self):
+        self.assert_same({
+            'f': S('a') >> F(lambda v: v * 10) >> F(str),
+            'f_then_s': S('n') >> F(dict) >> S('v'),
+            'mul_f': (S('a') >> F(abs)) * K(2),
+            'optional': OptionalS('nope', default=0) + S('a'),
+            'forall': S('l') >> Forall(lambda i: i + 1),
+            'ctx': Context() >> S('k'),
+        }, context={'k': 'ctx'})
+
+    def test_nested_mapping(self):
+        self.assert_same({'a': {'b': S('a') * K(2), 'c': {'d': S('d')}},
+                          'l': [S('a'), {'x': S('b')}, []], 'e': {}})
+        self.assert_same([S('a'), S('b')])
+        self.assert_same(S('n', 'v') - K(1))
+        self.assert_same({})
+
+    def test_deeply_nested_mapping(self):
+        mapping = S('a')
+        for _ in range(300):
+            mapping = {'x': mapping}
+        self.assert_same(mapping)
+
+    def test_columns(self):
+        mapping = {'a': S('a') * K(2), 'n': {'v': S('n', 'v')},
+                   'l': [S('d')], 'k': 'const'}
+        self.assertEqual(bend_columns(mapping, SOURCES, output='columns'),
+                         {'a': [2, -8, 0], 'n': {'v': [3, 0, -7]},
+                          'l': [['x', 'y', 'z']], 'k': ['const'] * 3})
+
+    def test_columns_are_distinct(self):
+        columns = bend_columns({'a': S('a'), 'b': S('a')}, SOURCES,
+                               output='columns')
+        self.assertIsNot(columns['a'], columns['b'])
+
+    def test_python_arithmetic(self):
+        # inf - inf is an invalid operation for NumPy, but not for Python
+        sources = [{'x': float('inf')}, {'x': 1.0}]
+        records = bend_columns({'nan': S('x') - S('x')}, sources)
+        self.assertTrue(math.isnan(records[0]['nan']))
+        self.assertEqual(records[1], {'nan': 0.0})
+        columns = bend_columns({'nan': S('x') - S('x')}, sources,
+                               output='columns')
+        self.assertTrue(math.isnan(columns['nan'][0]))
+
+    def test_no_sources(self):
+        self.assertEqual(bend_columns({'a': S('a') + K(1)}, []), [])
+        self.assertEqual(bend_columns({'a': S('a')}, [], output='columns'),
+                         {'a': []})
+
+    def test_generator_sources(self):
+        self.assertEqual(bend_columns({'a': S('a')}, iter(SOURCES)),
+                         [{'a': 1}, {'a': -4}, {'a': 0}])
+
+    def test_invalid_output(self):
+        with self.assertRaises(ValueError):
+            bend_columns({}, SOURCES, output='rows')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,310 @@
+from operator import add, eq, mul, sub
+import unittest
+import warnings
+
+from jsonbender import (Alternation, Context, F, Filter, FlatForall, Forall,
+                        Format, If, K, OptionalS, Reduce, S, Switch, bend,
+                        BendingException)
+from jsonbender.compiler import compile
+from jsonbender.core import Bender, Concat
+from jsonbender.selectors import ProtectedF
+from jsonbender.string_ops import ProtectedFormat
+
+
+class Double(Bender):
+    def execute(self, source):
+        return source * 2
+
+
+class CountingDict(dict):
+    lookups = 0
+
+    def __getitem__(self, key):
+        CountingDict.lookups += 1
+        return dict.__getitem__(self, key)
+
+
+class TestCompile(unittest.TestCase):
+    options = {}
+    source = {
+        'name': {'first': 'Ada', 'last': 'Lovelace'},
+        'age': 36,
+        'flag': False,
+        'kind': 'b',
+        'items': [{'v': 1}, {'v': 2}, {'v': 3}],
+        'ints': [1, 2, 3, 4],
+    }
+
+    def assert_same(self, mapping, source=None, context=None):
+        source = self.source if source is None else source
+        expected = bend(mapping, source, context)
+        self.assertEqual(compile(mapping, **self.options)(source, context),
+                         expected)
+
+    def assert_same_error(self, mapping, source):
+        with self.assertRaises(BendingException) as expected:
+            bend(mapping, source)
+        with self.assertRaises(BendingException) as got:
+            compile(mapping, **self.options)(source)
+        self.assertEqual(str(got.exception), str(expected.exception))
+        self.assertEqual(got.exception.path, expected.exception.path)
+        self.assertIs(type(got.exception.__cause__),
+                      type(expected.exception.__cause__))
+
+    def test_empty_mapping(self):
+        self.assert_same({})
+
+    def test_constants(self):
+        self.assert_same({'a': 'const', 'b': 1.5, 'c': [1, (2, 3)],
+                          'd': K([1]), 'e': K(None)})
+
+    def test_selectors(self):
+        self.assert_same({'first': S('name', 'first'),
+                          'second': S('items', 1, 'v'),
+                          'missing': OptionalS('name', 'middle'),
+                          'default': S('nope').optional(23),
+                          'slice': S('ints')[1:3]})
+
+    def test_nested_mapping_with_lists(self):
+        self.assert_same({'a': [{'b': {'c': S('age')}}, S('kind'), 'x']})
+
+    def test_operators(self):
+        self.assert_same({'add': S('age') + K(1),
+                          'sub': S('age') - K(1),
+                          'mul': S('age') * K(2),
+                          'div': S('age') / K(8),
+                          'neg': -S('age'),
+                          'eq': S('kind') == K('b'),
+                          'and': S('flag') & K(True),
+                          'or': S('flag') | K('x'),
+                          'invert': ~S('flag'),
+                          'chain': (S('name', 'first') + K(' ') +
+                                    S('name', 'last') + K('!')),
+                          'concat': Concat(S('name', 'first'), K(' '),
+                                           S('name', 'last'))})
+
+    def test_operator_evaluation_order(self):
+        # the left operand is evaluated first even when only the right one
+        # is hoisted into a variable
+        self.assert_same_error({'x': S('nope') + K(1) / K(0)}, self.source)
+        self.assert_same_error({'x': S('nope') * -(K(1) / K(0))},
+                               self.source)
+        for op in [sub, mul, eq]:
+            self.assert_same_error({'x': op(S('nope'), K(1) / K(0))},
+                                   self.source)
+            self.assert_same_error({'x': op(K(1) / K(0), S('nope'))},
+                                   self.source)
+
+    def test_long_operator_chain(self):
+        bender = K(0)
+        for i in range(100):
+            bender = bender + S('age')
+        self.assert_same({'sum': bender})
+
+    def test_f(self):
+        self.assert_same({'len': S('items') >> F(len),
+                          'sorted': S('ints') >> F(sorted, reverse=True),
+                          'protected': S('nope').optional() >>
+                          ProtectedF(int),
+                          'unprotected': S('age') >> F(str).protect()})
+
+    def test_format(self):
+        self.assert_same({'fmt': Format('{} {last}', S('name', 'first'),
+                                        last=S('name', 'last'))})
+
+    def test_protected_format(self):
+        with warnings.catch_warnings():
+            # literals tested with `is` would warn
+            warnings.simplefilter('error', SyntaxWarning)
+            self.assert_same({
+                'name': ProtectedFormat('{}-{}', S('name', 'first'), K('y')),
+                'missing': ProtectedFormat('{} {x}', K(1),
+                                           x=OptionalS('nope')),
+                'none': ProtectedFormat('{}', K(None)),
+                'literals': ProtectedFormat('{}{}', K(1), K(2.5)),
+            })
+
+    def test_literal_sources(self):
+        with warnings.catch_warnings():
+            # subscripted literals would warn
+            warnings.simplefilter('error', SyntaxWarning)
+            self.assert_same({
+                'dict': K({'b': 1}) >> S('b'),
+                'str': K('xy')[1],
+                'alternation': Alternation(K({}) >> S('b'), K(2)),
+                'optional': K({}) >> OptionalS('b', default=3),
+            })
+            for source in [K(1), K(None), K(2.5), K(True)]:
+                self.assert_same_error({'a': source >> S('b')}, {})
+                self.assert_same_error({'a': source[0]}, {})
+
+    def test_control_flow(self):
+        self.assert_same({
+            'if': If(S('flag'), K(1), S('age')),
+            'if_statements': If(~S('flag'),
+                                OptionalS('a'), Alternation(S('b'))),
+            'alternation': Alternation(S('nope'), S(0), S('age')),
+            'alternation_single': Alternation(S('age')),
+            'switch': Switch(S('kind'), {'a': K(1), 'b': S('age')}),
+            'switch_default': Switch(S('age'), {'a': K(1)},
+                                     default=S('kind')),
+        })
+
+    def test_probes(self):
+        class Lookup(Bender):
+            def execute(self, source):
+                return source['age']
+
+        mapping = {
+            'compose': Alternation(S('name') >> S('middle'),
+                                   S('items') >> S(5), S('name')[0],
+                                   S('name') >> S('first')),
+            'nested': Alternation(Alternation(S('x'), S('y')),
+                                  OptionalS('z', default=2), S('w')),
+            'user_defined': Alternation(K({}) >> Lookup(), Lookup()),
+            'optional': OptionalS('items', 0, 'v'),
+            'optional_miss': OptionalS('items', 9, 'v', default=3),
+            'optional_str': OptionalS('name', 'first', 0),
+        }
+        self.assert_same(mapping)
+        self.assert_same(mapping, {'items': [], 'name': {'first': 'x'},
+                                   'age': 1})
+        self.assert_same_error({'a': Alternation(S('name', 'x'), S('b'))},
+                               {'name': 'string'})
+        self.assert_same_error({'a': Alternation(S('a'), S('b'))}, {})
+
+    def test_big_switch(self):
+        cases = {str(i): K(i) for i in range(20)}
+        self.assert_same({'switch': Switch(S('key'), cases)}, {'key': '13'})
+        self.assert_same({'switch': Switch(S('key'), cases, default=K(-1))},
+                         {'key': 'x'})
+
+    def test_list_ops(self):
+        self.assert_same({
+            'forall': S('ints') >> Forall(lambda i: i * 2),
+            'filter': S('ints') >> Filter(lambda i: i % 2),
+            'flat': S('ints') >> FlatForall(lambda i: [i, i]),
+            'reduce': S('ints') >> Reduce(add),
+            'bend': S('items') >> Forall.bend({'w': S('v')}),
+        })
+
+    def test_list_op_pipelines(self):
+        mapping = {
+            'fused': (S('ints') >> Filter(lambda i: i % 2) >>
+                      Forall(lambda i: i * 2) >> Reduce(add)),
+            'flat': (S('ints') >> FlatForall(lambda i: [i, i]) >>
+                     Filter(lambda i: i > 1)),
+            'bend': (S('items') >> Forall.bend({'w': S('v')}) >>
+                     Forall(lambda d: d['w']) >> Reduce(add)),
+            'twice': (S('ints') >> Forall(lambda i: i + 1) >>
+                      Forall(lambda i: i * 2)),
+        }
+        self.assert_same(mapping)
+        fused = compile(mapping, fuse=True, **self.options)
+        self.assertEqual(fused(self.source), bend(mapping, self.source))
+
+    def test_context(self):
+        mapping = {'ctx': Context() >> S('c'),
+                   'inner': S('items') >> Forall.bend({'c': Context()}),
+                   'own': S('items') >> Forall.bend({'c': Context()}, 42)}
+        self.assert_same(mapping, context={'c': 27})
+
+    def test_deeply_nested_mapping(self):
+        mapping = S('age')
+        for i in range(40):
+            mapping = {'k': mapping, 'o': OptionalS('nope')}
+        self.assert_same(mapping)
+
+    def test_user_defined_bender(self):
+        self.assert_same({'double': S('age') >> Double(),
+                          'inside': Double() << S('kind') + K('!')})
+
+    def test_bender_mapping(self):
+        self.assert_same(S('name') >> F(sorted))
+
+    def test_error(self):
+        self.assert_same_error({'a': S('missing')}, {})
+        self.assert_same_error({'a': {'b': [S('missing')]}}, {})
+        self.assert_same_error({'a': S('items') >> Forall.bend({'b': S('x')})},
+                               self.source)
+        self.assert_same_error({'a': Switch(S('k'), {})}, {'k': 1})
+
+    def test_alternation_reraises(self):
+        with self.assertRaises(BendingException) as ctx:
+            compile({'a': Alternation(S(1), S(0))})([])
+        self.assertEqual(str(ctx.exception),
+                         'Error for key a: list index out of range')
+
+    def test_mapping_is_read_at_compile_time(self):
+        mapping = {'a': S('age')}
+        compiled = compile(mapping)
+        mapping['b'] = K(1)
+        self.assertEqual(compiled(self.source), {'a': 36})
+
+
+class TestCompileCSE(TestCompile):
+    options = {'cse': True}
+
+    def test_shared_paths_are_read_once(self):
+        name = S('user', 'name')
+        mapping = {'greeting': Format('Hi {}', name),
+                   'is_bob': If(name == K('Bob'), K(1), K(0)),
+                   'name': name,
+                   'nested': {'upper': S('user', 'name') >> F(str.upper)}}
+        source = {'user': CountingDict(name='Bob')}
+        expected = bend(mapping, source)
+        CountingDict.lookups = 0
+        self.assertEqual(compile(mapping, cse=True)(source), expected)
+        self.assertEqual(CountingDict.lookups, 1)
+
+    def test_shared_failure_is_raised_again(self):
+        mapping = {'a': OptionalS('x', 'y'),
+                   'b': Alternation(S('x', 'y'), K('fallback')),
+                   'c': S('x', 'y')}
+        self.assert_same_error(mapping, {'x': {}})
+        self.assertEqual(
+            compile({'a': mapping['a'], 'b': mapping['b']}, cse=True)({}),
+            {'a': None, 'b': 'fallback'})
+
+    def test_functions_are_not_shared(self):
+        calls = []
+        f = F(calls.append)
+        compile({'a': S('a') >> f, 'b': S('a') >> f}, cse=True)({'a': 1})
+        self.assertEqual(calls, [1, 1])
+
+
+class TestCompileSharedPrefixes(TestCompile):
+    options = {'share_prefixes': True}
+
+    def test_shared_prefixes_are_read_once(self):
+        mapping = {'k{}'.format(i): S('payload', 'order', i)
+                   for i in range(10)}
+        mapping['opt'] = OptionalS('payload', 'order', 'x', default=-1)
+        mapping['user'] = S('payload', 'user')
+        source = CountingDict(payload=CountingDict(
+            order=CountingDict((i, i * 2) for i in range(10)),
+            user='Bob'))
+        expected = bend(mapping, source)
+        CountingDict.lookups = 0
+        self.assertEqual(compile(mapping, share_prefixes=True)(source),
+                         expected)
+        # payload, order, user, each of the 10 keys and the missing 'x'
+        self.assertEqual(CountingDict.lookups, 14)
+
+    def test_missing_prefix(self):
+        mapping = {'a': OptionalS('x', 'y', 'a', default=1),
+                   'b': OptionalS('x', 'y', 'b', default=2)}
+        self.assert_same(mapping, {})
+        self.assert_same(mapping, {'x': {}})
+        self.assert_same_error({'a': OptionalS('x', 'y', 'a'),
+                                'b': S('x', 'y', 'b')}, {'x': {}})
+        self.assert_same_error({'a': S('x', 'y', 'a'),
+                                'b': S('x', 'y', 'b')}, {'x': []})
+
+
+class TestCompileAllOptions(TestCompile):
+    options = {'cse': True, 'share_prefixes': True}
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,7 @@ from operator import add
 import unittest
 
 from jsonbender import Context, K, S, bend
+from jsonbender.core import MISSING, Bender
 from jsonbender.control_flow import If, Alternation, Switch
 from jsonbender.test import BenderTestMixin
 
@@ -45,6 +46,37 @@ class TestAlternation(BenderTestMixin, unittest.TestCase):
     def test_no_match(self):
         self.assertRaises(IndexError, Alternation(S(1)), [])
         self.assertRaises(KeyError, Alternation(S(1)), {})
+        with self.assertRaises(KeyError) as cm:
+            Alternation(S('a'), S('b') >> S('c'))({'b': {}})
+        self.assertEqual(cm.exception.args, ('c',))
+
+    def test_probes_without_raising(self):
+        class Probe(Bender):
+            def evaluate(self, value, context):
+                raise AssertionError('should not be evaluated')
+
+            def try_evaluate(self, value, context):
+                return MISSING
+
+        bender = Alternation(Probe(), S('a') >> Probe(), S('b'))
+        self.assert_bender(bender, {'a': 1, 'b': 2}, 2)
+
+    def test_user_defined_benders(self):
+        class Lookup(Bender):
+            def execute(self, source):
+                return source['x']
+
+        bender = Alternation(Lookup(), S('y'))
+        self.assert_bender(bender, {'x': 1}, 1)
+        self.assert_bender(bender, {'y': 2}, 2)
+        self.assertIs(bender.try_evaluate({}, {}), MISSING)
+
+    def test_nested(self):
+        bender = Alternation(Alternation(S('a'), S('b')), S('c'))
+        self.assert_bender(bender, {'b': 1, 'c': 2}, 1)
+        self.assert_bender(bender, {'c': 2}, 2)
+        self.assertIs(bender.try_evaluate({}, {}), MISSING)
+        self.assertRaises(ValueError, Alternation().try_evaluate, {}, {})
 
 
 class TestSwitch(BenderTestMixin, unittest.TestCase):
@@ -76,6 +108,19 @@ class TestSwitch(BenderTestMixin, unittest.TestCase):
     def test__no_match_without_default(self):
         self.assertRaises(KeyError, Switch(S('key'), {}), {'key': None})
 
+    def test_try_evaluate(self):
+        bender = Switch(S('key'), {'a': S('x'), 'b': K(2)},
+                        default=S('y'))
+        self.assertEqual(bender.try_evaluate({'key': 'a', 'x': 1}, {}), 1)
+        self.assertEqual(bender.try_evaluate({'key': 'c', 'y': 3}, {}), 3)
+        self.assertIs(bender.try_evaluate({'key': 'a'}, {}), MISSING)
+        self.assertIs(bender.try_evaluate({'key': 'c'}, {}), MISSING)
+        self.assertIs(bender.try_evaluate({}, {}), MISSING)
+        self.assertIs(Switch(S('key'), ['x']).try_evaluate({'key': 1}, {}),
+                      MISSING)
+        self.assertIs(Switch(S('key'), {}).try_evaluate({'key': 1}, {}),
+                      MISSING)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,9 +1,23 @@
+from operator import add
+import pickle
+import threading
 import unittest
+import warnings
 
 import sys
 
-from jsonbender import S, K
-from jsonbender.core import bend, BendingException, Context
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+from jsonbender import (Alternation, F, Filter, FlatForall, Forall, If,
+                        Reduce, S, K, Switch, compile)
+from jsonbender.core import (bend, Bender, BendingException, Concat,
+                             Context, MISSING, Transport)
+from jsonbender.string_ops import Format, ProtectedFormat
+from jsonbender.selectors import OptionalS
+from jsonbender.specialize import specialize
 from jsonbender.test import BenderTestMixin
 
 
@@ -72,6 +86,56 @@ class TestBend(unittest.TestCase):
         source = {}
         self.assertRaises(BendingException, bend, mapping, source)
 
+    def test_bending_exception_details(self):
+        mapping = {'a': {'b': [{'c': S('x', 'y')}]}}
+        with self.assertRaises(BendingException) as cm:
+            bend(mapping, {'x': {}})
+        e = cm.exception
+        self.assertEqual(e.path, ['a', 'b', 'c'])
+        self.assertIsInstance(e.__cause__, KeyError)
+        self.assertEqual(
+            str(e), "Error for key a: Error for key b: Error for key c: 'y'")
+
+    def test_bending_exception_from_nested_bend(self):
+        inner = BendingException('bad value')
+        with self.assertRaises(BendingException) as cm:
+            bend({'a': {'b': F(lambda v: _raise(inner))}}, {})
+        self.assertIs(cm.exception, inner)
+        self.assertEqual(cm.exception.path, ['a', 'b'])
+        self.assertEqual(str(cm.exception),
+                         'Error for key a: Error for key b: bad value')
+
+    def test_bending_exception_pickle(self):
+        with self.assertRaises(BendingException) as cm:
+            bend({'a': {'b': S('x')}}, {})
+        e = pickle.loads(pickle.dumps(cm.exception))
+        self.assertEqual(e.path, ['a', 'b'])
+        self.assertEqual(str(e), str(cm.exception))
+
+    def test_collect_errors(self):
+        mapping = {'a': S('a'), 'b': S('missing'),
+                   'n': {'c': S('a') + K('x'), 'd': K(1), 'e': S('z')},
+                   'l': [{'f': S('missing')}, S('a')]}
+        result, errors = bend(mapping, {'a': 1}, errors='collect')
+        self.assertEqual(result, {'a': 1, 'n': {'d': 1},
+                                  'l': [{}, 1]})
+        errors = sorted(errors, key=lambda e: e.path)
+        self.assertEqual([e.path for e in errors],
+                         [['b'], ['l', 'f'], ['n', 'c'], ['n', 'e']])
+        self.assertEqual([type(e.__cause__) for e in errors],
+                         [KeyError, KeyError, TypeError, KeyError])
+        self.assertEqual(str(errors[0]), "Error for key b: 'missing'")
+        self.assertEqual(str(errors[1]),
+                         "Error for key l: Error for key f: 'missing'")
+
+    def test_collect_no_errors(self):
+        self.assertEqual(bend({'a': S('a')}, {'a': 1}, errors='collect'),
+                         ({'a': 1}, []))
+
+    def test_invalid_errors(self):
+        with self.assertRaises(ValueError):
+            bend({}, {}, errors='ignore')
+
     def test_constants_without_K(self):
         mapping = {'a': 'a const value', 'b': 123}
         self.assertDictEqual(bend(mapping, {}),
@@ -88,6 +152,15 @@ class TestBend(unittest.TestCase):
         self.assertDictEqual(res, {'a': [{'a': 23}]})
 
 
+def _raise(e):
+    raise e
+
+
+class Suffix(object):
+    def __radd__(self, other):
+        return other + '!'
+
+
 class TestOperators(unittest.TestCase, BenderTestMixin):
     def test_add(self):
         self.assert_bender(K(5) + K(2), None, 7)
@@ -133,6 +206,18 @@ class TestOperators(unittest.TestCase, BenderTestMixin):
         self.assert_bender(~K(True), None, False)
         self.assert_bender(~K(False), None, True)
 
+    def test_concat(self):
+        self.assert_bender(Concat(S('a'), K(' '), S('b')),
+                           {'a': 'x', 'b': 'y'}, 'x y')
+        self.assert_bender(Concat(K(1), K(2), K(3)), None, 6)
+        self.assert_bender(Concat(K([1]), K([2])), None, [1, 2])
+        # strings are joined until a value that isn't one
+        self.assert_bender(Concat(K('a'), K('b'), K(Suffix())), None, 'ab!')
+        with self.assertRaises(TypeError):
+            Concat(K('a'), K(1), S('missing'))({})
+        with self.assertRaises(ValueError):
+            Concat()
+
 
 class TestGetItem(unittest.TestCase, BenderTestMixin):
     def test_getitem(self):
@@ -144,5 +229,270 @@ class TestGetItem(unittest.TestCase, BenderTestMixin):
         self.assert_bender(bender, {'val': val}, [2, 4, 6])
 
 
+class TestEvaluationProtocol(unittest.TestCase, BenderTestMixin):
+    def test_execute_only_bender(self):
+        class Double(Bender):
+            def execute(self, source):
+                return source * 2
+
+        self.assertEqual(bend({'a': S('a') >> Double()}, {'a': 2}),
+                         {'a': 4})
+
+    def test_legacy_raw_execute_bender(self):
+        class ContextKeys(Bender):
+            def raw_execute(self, source):
+                transport = Transport.from_source(source)
+                return Transport(sorted(transport.context), transport.context)
+
+        got = bend({'a': ContextKeys()}, {}, context={'x': 1, 'y': 2})
+        self.assertEqual(got, {'a': ['x', 'y']})
+
+    def test_legacy_raw_execute_calling_super(self):
+        class Shout(Format):
+            def raw_execute(self, source):
+                transport = super(Shout, self).raw_execute(source)
+                return Transport(transport.value.upper(), transport.context)
+
+        self.assert_bender(Shout('{}!', S('a')), {'a': 'hey'}, 'HEY!')
+
+    def test_execute_override_calling_super(self):
+        class Stripped(OptionalS):
+            def execute(self, source):
+                return super(Stripped, self).execute(source).strip()
+
+        self.assert_bender(Stripped('a', default=' x '), {}, 'x')
+
+    def test_raw_execute_shim(self):
+        transport = (S('a') + K(1)).raw_execute(Transport({'a': 1}, 'ctx'))
+        self.assertEqual(transport.value, 2)
+        self.assertEqual(transport.context, 'ctx')
+
+    def test_context_reaches_control_flow_children(self):
+        from jsonbender.control_flow import If
+        bender = If(Context() >> S('flag'), K('yes'), K('no'))
+        self.assertEqual(bend({'a': bender}, {}, context={'flag': True}),
+                         {'a': 'yes'})
+
+    def test_try_evaluate(self):
+        class Lookup(Bender):
+            def execute(self, source):
+                return source['x']
+
+        self.assertIs(Lookup().try_evaluate({}, {}), MISSING)
+        self.assertIs((S('a') >> Lookup()).try_evaluate({'a': {}}, {}),
+                      MISSING)
+        self.assertIs((S('a') >> S('b')).try_evaluate({'a': {}}, {}),
+                      MISSING)
+        self.assertIs(S('a')[0].try_evaluate({'a': []}, {}), MISSING)
+        self.assertEqual(S('a')[0].try_evaluate({'a': [1]}, {}), 1)
+        self.assertRaises(TypeError, (K(1) + S('a')).try_evaluate, {'a': ''},
+                          {})
+
+    def test_missing_pickles_to_itself(self):
+        self.assertIs(pickle.loads(pickle.dumps(MISSING)), MISSING)
+
+    def test_slots(self):
+        self.assertFalse(hasattr(Transport(1, {}), '__dict__'))
+        self.assertFalse(hasattr(K(1) + K(2), '__dict__'))
+        self.assertFalse(hasattr(Context(), '__dict__'))
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', DeprecationWarning)
+            old_forall = Forall(K([1]), str)
+        for bender in [K(1), S('a'), OptionalS('a'), F(len),
+                       F(len).protect(), F(len).cached(), Format('{}'),
+                       ProtectedFormat('{}'), If(K(1)), Alternation(),
+                       Switch(K(1), {}), Forall(str), old_forall,
+                       Filter(bool), Reduce(add), FlatForall(list),
+                       Forall.bend({})]:
+            self.assertFalse(hasattr(bender, '__dict__'), bender)
+
+    def test_pickle_slots(self):
+        mapping = {'a': S('a') >> F(len),
+                   'b': S('b') >> Forall.bend({'c': OptionalS('c', default=3)},
+                                              'ctx')}
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            copied = pickle.loads(pickle.dumps(mapping, protocol))
+            self.assertEqual(bend(copied, {'a': 'xy', 'b': [{}]}),
+                             {'a': 2, 'b': [{'c': 3}]})
+            self.assertEqual(copied['b'].structural_key(),
+                             mapping['b'].structural_key())
+
+
+class TestStructuralKey(unittest.TestCase):
+    def assert_same_key(self, b1, b2):
+        self.assertEqual(b1.structural_key(), b2.structural_key())
+
+    def assert_different_key(self, b1, b2):
+        self.assertNotEqual(b1.structural_key(), b2.structural_key())
+
+    def test_equal_benders(self):
+        self.assert_same_key(S('a', 0), S('a', 0))
+        self.assert_same_key(S('a') + K(1), S('a') + K(1))
+        self.assert_same_key(Format('{}', S('a')), Format('{}', S('a')))
+        self.assert_same_key(K([1, {'a': 2}]), K([1, {'a': 2}]))
+        hash(K([1]).structural_key())
+
+    def test_unset_slots(self):
+        # ForallBend never sets the `_func` of list ops
+        self.assert_same_key(Forall.bend({'a': S('a')}),
+                             Forall.bend({'a': S('a')}))
+        self.assert_different_key(Forall.bend({'a': S('a')}),
+                                  Forall.bend({'a': S('b')}))
+
+    def test_different_benders(self):
+        self.assert_different_key(S('a'), S('b'))
+        self.assert_different_key(S('a'), OptionalS('a'))
+        self.assert_different_key(OptionalS('a'), OptionalS('a', default=1))
+        self.assert_different_key(S('a') + K(1), S('a') - K(1))
+        self.assert_different_key(K(1), K(True))
+        self.assert_different_key(K(0.0), K(-0.0))
+
+    def test_children(self):
+        s, k = S('a'), K(1)
+        self.assertEqual([b.structural_key() for b in (s + k).children()],
+                         [s.structural_key(), k.structural_key()])
+        self.assertEqual(S('a').children(), [])
+
+
+@unittest.skipIf(tracemalloc is None, 'tracemalloc is not available')
+class TestAllocations(unittest.TestCase):
+    def test_no_transport_per_node(self):
+        depth = 200
+        bender = K(0)
+        for _ in range(depth):
+            bender = bender + S('a')
+        mapping = {'sum': bender}
+        bend(mapping, {'a': 1})
+
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            res = bend(mapping, {'a': 1})
+            peak = tracemalloc.get_traced_memory()[1] - before
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(res, {'sum': depth})
+        # the old evaluation path kept a Transport alive for each level of
+        # the operator tree
+        self.assertLess(peak, depth * sys.getsizeof(Transport(None, None)))
+
+
+def shared_mapping():
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        # the deprecated form of list ops, with an inner bender
+        old_upper = Forall(S('tags'), lambda t: t.upper())
+    return {
+        'id': S('id'),
+        'user': Context() >> S('user'),
+        'label': Format('{}-{user}', S('id'), user=Context() >> S('user')),
+        'scaled': S('n') * (Context() >> S('rate')),
+        'kind': Switch(S('kind'), {'a': K('A'), 'b': Context() >> S('user')},
+                       default=S('id')),
+        'big': If(S('n') >> F(lambda n: n > 2), Context() >> S('user'),
+                  K(None)),
+        'alt': Alternation(S('missing'), OptionalS('kind', default='-')),
+        'tags': old_upper,
+        'odd': (S('lines') >> Filter(lambda l: l['qty'] % 2) >>
+                Forall(lambda l: l['qty']) >> F(sum)),
+        'total': (S('lines') >> Forall(lambda l: l['qty']) >>
+                  F(lambda q: [0] + q) >> Reduce(add)),
+        'slug': S('kind') >> F(lambda k: k * 2).cached(),
+        'lines': S('lines') >> Forall.bend({
+            'qty': S('qty'),
+            'user': Context() >> S('user'),
+            'parts': S('parts') >> Forall.bend({'p': F(str),
+                                                'own': Context()},
+                                               context='inner'),
+        }),
+    }
+
+
+def tree_mapping():
+    # a mapping nested inside itself
+    tree = {'name': S('name'), 'user': Context() >> S('user')}
+    tree['children'] = S('children') >> Forall.bend(tree)
+    return tree
+
+
+def tree(depth, name='n'):
+    return {'name': name, 'children': [tree(depth - 1, name + str(i))
+                                       for i in range(depth)]}
+
+
+class TestSharedMappings(unittest.TestCase):
+    THREADS = 8
+    ROUNDS = 30
+
+    def sources(self):
+        return [{'id': i, 'n': i % 5, 'kind': 'abc'[i % 3],
+                 'tags': ['x', 'y'][:i % 3],
+                 'lines': [{'qty': q, 'parts': list(range(q))}
+                           for q in range(i % 4 + 1)]}
+                for i in range(6)]
+
+    def hammer(self, bend_func, sources):
+        """
+        Bend all `sources` with `bend_func` from many threads at once, each
+        with its own context, comparing the results with those bent by one
+        thread.
+        """
+        contexts = [{'user': 'u{}'.format(t), 'rate': t}
+                    for t in range(self.THREADS)]
+        expected = [[bend_func(src, ctx) for src in sources]
+                    for ctx in contexts]
+        start = threading.Event()
+        failures = []
+
+        def run(index):
+            context = contexts[index]
+            start.wait()
+            for _ in range(self.ROUNDS):
+                got = [bend_func(src, context) for src in sources]
+                if got != expected[index]:
+                    failures.append((index, got))
+                    return
+
+        if hasattr(sys, 'setswitchinterval'):
+            interval = sys.getswitchinterval()
+            sys.setswitchinterval(1e-6)
+            restore = sys.setswitchinterval
+        else:  # Python 2
+            interval = sys.getcheckinterval()
+            sys.setcheckinterval(1)
+            restore = sys.setcheckinterval
+        try:
+            threads = [threading.Thread(target=run, args=(i,))
+                       for i in range(self.THREADS)]
+            for thread in threads:
+                thread.start()
+            start.set()
+            for thread in threads:
+                thread.join()
+        finally:
+            restore(interval)
+        self.assertEqual(failures, [])
+
+    def test_bend(self):
+        mapping = shared_mapping()
+        self.hammer(lambda src, ctx: bend(mapping, src, ctx), self.sources())
+
+    def test_compiled_and_specialized(self):
+        compiled = compile(shared_mapping())
+        self.hammer(compiled, self.sources())
+        specialized = specialize(shared_mapping(), samples=self.sources())
+        self.hammer(lambda src, ctx: bend(specialized, src, ctx),
+                    self.sources())
+
+    def test_nested_inside_itself(self):
+        mapping = tree_mapping()
+        got = bend(mapping, tree(2), {'user': 'u'})
+        self.assertEqual(got['children'][1]['children'][0],
+                         {'name': 'n10', 'user': 'u', 'children': []})
+        self.hammer(lambda src, ctx: bend(mapping, src, ctx),
+                    [tree(3), tree(4)])
+
+
 if __name__ == '__main__':
     unittest.main()
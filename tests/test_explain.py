@@ -0,0 +1,100 @@
+import io
+import unittest
+
+from jsonbender import (Alternation, Context, F, Forall, Format, If, K,
+                        OptionalS, Reduce, S, Switch)
+from jsonbender.core import Bender, GetItem
+from jsonbender.explain import explain
+from jsonbender.specialize import specialize
+
+
+class Upper(Bender):
+    def execute(self, value):
+        return value.upper()
+
+
+def total(line):
+    return line['qty'] * line['price']
+
+
+MAPPING = {
+    'id': S('order', 'id'),
+    'name': Format('{} {}', S('first'), S('last') >> Upper()),
+    'nick': Alternation(S('nicks', 0), S('first')),
+    'email': OptionalS('emails', 0, default=None),
+    'lines': S('lines') >> Forall.bend({'sku': S('sku'),
+                                        'total': F(total)}),
+    'sum': S('amounts') >> Reduce(max),
+    'extra': [K(1), Context()],
+}
+
+
+class TestExplain(unittest.TestCase):
+    def test_plan(self):
+        plan = explain(MAPPING)
+        self.assertEqual(plan.counts, {'S': 8, 'Compose': 3, 'Format': 1,
+                                       'Upper': 1, 'Alternation': 1,
+                                       'OptionalS': 1, 'ForallBend': 1,
+                                       'F': 1, 'Reduce': 1, 'K': 1,
+                                       'Context': 1})
+        # {} -> Compose -> ForallBend -> {} -> S, for lines
+        self.assertEqual(plan.depth, 5)
+        self.assertEqual(plan.path_lengths, {1: 6, 2: 3})
+        self.assertEqual(plan.exception_paths, ['nick', 'email'])
+        self.assertEqual(plan.opaque, [('name', 'Upper'),
+                                       ('lines[].total', 'total'),
+                                       ('sum', 'max')])
+        self.assertEqual(plan.element_mappings,
+                         [('lines', 'ForallBend', 8), ('sum', 'Reduce', 5)])
+        self.assertEqual(plan.recursive, [])
+
+    def test_cost(self):
+        self.assertEqual(explain({'a': S('a', 'b')}).cost, 3)
+        self.assertEqual(explain(S('a') * K(2)).cost, 3)
+        self.assertEqual(explain(S('a') >> F(len), call_cost=7).cost, 8)
+        # the most costly branch
+        self.assertEqual(explain(If(S('a'), S('b', 'c', 'd'), K(1))).cost,
+                         5)
+        self.assertEqual(explain(Switch(S('a'), {1: S('b', 'c')},
+                                        default=K(1))).cost, 4)
+        lines = S('lines') >> Forall.bend({'a': S('a')})
+        self.assertEqual(explain(lines).cost, 1 + 1 + 10 * 2)
+        self.assertEqual(explain(lines, list_length=100).cost,
+                         1 + 1 + 100 * 2)
+        self.assertLess(explain({'a': S('a')}).cost, explain(MAPPING).cost)
+
+    def test_exceptions(self):
+        cheap = {'a': Alternation(S('a', 'b'), K(1)),
+                 'b': OptionalS('a', 'b'),
+                 'c': Alternation(S('a') >> GetItem('b'), S('c', 0))}
+        self.assertEqual(explain(cheap).exception_paths, [])
+        costly = {'a': Alternation(S('a') + K(1), K(1)),
+                  'b': Alternation(S('a') >> S(0), K(1)),
+                  'c': Alternation(Upper(), K(1)),
+                  'd': specialize({'d': OptionalS('a', 'b')},
+                                  samples=[{'a': {'b': 1}}])['d']}
+        self.assertEqual(sorted(explain(costly).exception_paths),
+                         ['a', 'b', 'c', 'd'])
+
+    def test_nested_inside_itself(self):
+        tree = {'name': S('name')}
+        tree['children'] = S('children') >> Forall.bend(tree)
+        plan = explain(tree)
+        self.assertEqual(plan.recursive, ['children[]'])
+        self.assertEqual(plan.counts['ForallBend'], 1)
+
+    def test_report(self):
+        plan = explain(MAPPING)
+        out = io.StringIO()
+        plan.report(file=out)
+        report = out.getvalue()
+        self.assertIn('estimated cost: {} operations per record'.format(
+            plan.cost), report)
+        self.assertIn('  lines: ForallBend, 8 operations per element',
+                      report)
+        self.assertIn('  lines[].total: total', report)
+        self.assertEqual(plan.as_dict()['opaque'][0], ['name', 'Upper'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import io
+import unittest
+
+from jsonbender import (Alternation, Context, F, Forall, Format, If, K,
+                        OptionalS, S, Switch, bend)
+from jsonbender.core import Bender
+from jsonbender.interning import InternTable, memory_report, memory_usage
+from jsonbender.specialize import specialize
+
+
+class Upper(Bender):
+    def execute(self, value):
+        return value.upper()
+
+
+def tenant_mapping(tenant):
+    # built anew for each tenant, like mappings loaded from files
+    return {
+        'id': S('id'),
+        'tenant': K(tenant),
+        'name': Format('{} {last}', S('first'), last=S('last')),
+        'kind': Switch(S('kind'), {'a': K('A'), 'b': Context()},
+                       default=K(None)),
+        'nick': Alternation(S('nick'), OptionalS('first', default='')),
+        'big': If(S('id') >> F(bool), K(True)),
+        'lines': S('lines') >> Forall.bend({'sku': S('sku'),
+                                            'qty': OptionalS('qty')}),
+        'upper': S('first') >> Upper(),
+        'slug': S('first') >> F(len).cached(),
+    }
+
+
+SOURCE = {'id': 1, 'first': 'Ada', 'last': 'Lovelace', 'kind': 'b',
+          'lines': [{'sku': 'x', 'qty': 2}, {'sku': 'y'}]}
+
+
+class TestInternTable(unittest.TestCase):
+    def test_shares_identical_benders(self):
+        table = InternTable()
+        first = table.intern(tenant_mapping('t1'))
+        second = table.intern(tenant_mapping('t2'))
+        for key in ['id', 'name', 'kind', 'nick', 'big', 'lines']:
+            self.assertIs(first[key], second[key], key)
+        self.assertIsNot(first['tenant'], second['tenant'])
+        # keys made at run time, like those of parsed mappings
+        keys = [table.intern({''.join(['na', 'me']): S('a')})
+                for _ in range(2)]
+        self.assertIs(list(keys[0])[0], list(keys[1])[0])
+        size = len(table)
+        table.intern(tenant_mapping('t1'))
+        self.assertEqual(len(table), size)
+
+    def test_shares_identical_containers(self):
+        table = InternTable()
+        first = table.intern({'a': {'b': [S('b'), 1]}, 'c': K(1)})
+        second = table.intern({'a': {'b': [S('b'), 1]}, 'c': K(2)})
+        self.assertIs(first['a'], second['a'])
+        self.assertIs(first['a']['b'], second['a']['b'])
+        # the mapping returned is its own
+        again = table.intern({'a': {'b': [S('b'), 1]}, 'c': K(1)})
+        self.assertIsNot(again, first)
+        self.assertEqual(list(map(id, again.values())),
+                         list(map(id, first.values())))
+        # containers with benders that can't be shared aren't shared either
+        first = table.intern({'a': [Upper()], 'b': {'c': S('c')}})
+        second = table.intern({'a': [Upper()], 'b': {'c': S('c')}})
+        self.assertIsNot(first['a'], second['a'])
+        self.assertIs(first['b'], second['b'])
+
+    def test_same_results(self):
+        table = InternTable()
+        for tenant in ['t1', 't2']:
+            mapping = tenant_mapping(tenant)
+            interned = table.intern(mapping)
+            self.assertEqual(bend(interned, SOURCE, 'ctx'),
+                             bend(mapping, SOURCE, 'ctx'))
+            self.assertEqual(bend(interned['lines'], SOURCE),
+                             [{'sku': 'x', 'qty': 2},
+                              {'sku': 'y', 'qty': None}])
+
+    def test_unshareable_benders(self):
+        table = InternTable()
+        mapping = tenant_mapping('t1')
+        first = table.intern(mapping)
+        second = table.intern(tenant_mapping('t1'))
+        # user-defined and cached benders are kept, along with what contains
+        # them, but what's inside those is interned
+        self.assertIsNot(first['upper'], second['upper'])
+        self.assertIs(first['upper']._first, second['upper']._first)
+        self.assertIs(first['upper']._second, mapping['upper']._second)
+        self.assertIsNot(first['slug'], second['slug'])
+        self.assertIs(first['slug']._second, mapping['slug']._second)
+
+    def test_different_benders(self):
+        table = InternTable()
+        got = table.intern([K(1), K(True), K(1.0), S('a'), OptionalS('a'),
+                            OptionalS('a', default=1), K(1), S('a')])
+        self.assertEqual(len(set(map(id, got))), 6)
+        self.assertIs(got[0], got[6])
+        self.assertIs(got[3], got[7])
+
+    def test_specialized(self):
+        table = InternTable()
+        first = table.intern(specialize({'a': S('a', 'b')}))
+        second = table.intern(specialize({'a': S('a', 'b')}))
+        self.assertIs(first['a'], second['a'])
+        self.assertEqual(bend(first, {'a': {'b': 1}}), {'a': 1})
+
+    def test_original_is_kept(self):
+        mapping = tenant_mapping('t1')
+        lines = mapping['lines']
+        inner = lines._second._mapping
+        InternTable().intern(mapping)
+        self.assertIs(mapping['lines'], lines)
+        self.assertIs(lines._second._mapping, inner)
+
+
+class TestMemoryUsage(unittest.TestCase):
+    def test_usage(self):
+        copies = {t: tenant_mapping(t) for t in ['t1', 't2', 't3']}
+        table = InternTable()
+        interned = {t: table.intern(m) for t, m in copies.items()}
+        before, after = memory_usage(copies), memory_usage(interned)
+        self.assertEqual(sorted(after), ['t1', 't2', 't3'])
+        for tenant in copies:
+            self.assertEqual(before[tenant].own + before[tenant].shared,
+                             before[tenant].total)
+            self.assertGreater(after[tenant].shared, before[tenant].shared)
+            self.assertLess(after[tenant].own, before[tenant].own / 3)
+
+    def test_report(self):
+        table = InternTable()
+        mappings = {'tenant-1': table.intern(tenant_mapping('t1')),
+                    'tenant-2': table.intern(tenant_mapping('t2'))}
+        out = io.StringIO()
+        memory_report(mappings, sort='own', file=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0].split(),
+                         ['mapping', 'total', 'own', 'shared'])
+        self.assertEqual(sorted(line.split()[0] for line in lines[1:3]),
+                         ['tenant-1', 'tenant-2'])
+        self.assertTrue(lines[3].startswith('2 mappings: '))
+
+
+if __name__ == '__main__':
+    unittest.main()
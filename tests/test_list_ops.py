@@ -1,8 +1,15 @@
+from collections import deque
+from concurrent.futures import (Future, ProcessPoolExecutor,
+                                ThreadPoolExecutor)
 from operator import add
 import unittest
+import warnings
 
-from jsonbender import Context, K, S, bend
-from jsonbender.list_ops import Forall, FlatForall, Filter, ListOp, Reduce
+from jsonbender import BendingException, Context, F, K, S, bend
+from jsonbender.compiler import compile
+from jsonbender.core import Bender
+from jsonbender.list_ops import (Forall, FlatForall, Filter, ListOp, Reduce,
+                                 _NotUnpickled, _requeue_missed, fuse)
 from jsonbender.test import BenderTestMixin
 
 
@@ -102,6 +109,211 @@ class TestFlatForall(ListOpTestCase):
         self.assert_bender(bender, {}, [1])
 
 
+class Enumerate(Forall):
+    def op(self, func, vals):
+        return [func(i, v) for i, v in enumerate(vals)]
+
+
+class Count(ListOp):
+    def __init__(self):
+        self._bender = None
+
+    def execute(self, source):
+        return len(source)
+
+
+class CountedPickles(Bender):
+    """
+    Doubles its value, counting how many times it's been pickled.
+    """
+    pickles = 0
+
+    def __getstate__(self):
+        CountedPickles.pickles += 1
+        return {'doubled': True}
+
+    def execute(self, value):
+        return value * 2
+
+
+class TestForallBendOnExecutor(unittest.TestCase):
+    MAPPING = {'b': S('a'), 'c': Context()}
+    SOURCE = [{'a': i} for i in range(50)]
+
+    def test_same_results(self):
+        expected = bend(Forall.bend(self.MAPPING), self.SOURCE, 'ctx')
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            for chunksize in [1, 7, 50, 1000]:
+                bender = Forall.bend(self.MAPPING, executor=executor,
+                                     chunksize=chunksize)
+                self.assertEqual(bend(bender, self.SOURCE, 'ctx'), expected)
+                self.assertEqual(compile(bender)(self.SOURCE, 'ctx'),
+                                 expected)
+                self.assertEqual(bend(bender, [], 'ctx'), [])
+            bender = Forall.bend(self.MAPPING, 'own', executor=executor)
+            self.assertEqual(bend(bender, [{'a': 1}], 'ctx'),
+                             [{'b': 1, 'c': 'own'}])
+
+    def test_lazy_input_and_output(self):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            bender = (K(range(10)) >> Filter(lambda i: i % 2) >>
+                      Forall.bend(F(lambda i: i + 1), executor=executor,
+                                  chunksize=2) >>
+                      Forall(lambda i: i * 10))
+            self.assertEqual(bend(fuse(bender), {}), [20, 40, 60, 80, 100])
+            self.assertEqual(compile(bender, fuse=True)({}),
+                             [20, 40, 60, 80, 100])
+
+    def test_errors(self):
+        source = self.SOURCE[:30] + [{}] + self.SOURCE[30:]
+        with self.assertRaises(BendingException) as expected:
+            bend(Forall.bend(self.MAPPING), source)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            bender = Forall.bend(self.MAPPING, executor=executor,
+                                 chunksize=4)
+            with self.assertRaises(BendingException) as got:
+                bend(bender, source)
+        self.assertEqual(str(got.exception), str(expected.exception))
+        self.assertRaises(ValueError, Forall.bend, self.MAPPING, chunksize=0)
+
+    def test_process_executor(self):
+        CountedPickles.pickles = 0
+        bender = K(list(range(100))) >> Forall.bend(
+            [CountedPickles(), Context()], executor=self.executor,
+            chunksize=10)
+        for context in ['ctx', 'other', 'ctx']:
+            self.assertEqual(bend(bender, {}, context),
+                             [[i * 2, context] for i in range(100)])
+        # once for the ten chunks of every evaluation
+        self.assertEqual(CountedPickles.pickles, 1)
+
+    def test_requeue_missed(self):
+        missed, bent, running = Future(), Future(), Future()
+        missed.set_exception(_NotUnpickled())
+        bent.set_result([1])
+        pending = deque([(bent, 'a'), (running, 'b'), (missed, 'c')])
+        resubmitted = Future()
+        self.assertEqual(
+            _requeue_missed(pending, lambda chunk: resubmitted), 1)
+        self.assertEqual(list(pending), [(bent, 'a'), (running, 'b'),
+                                         (resubmitted, 'c')])
+
+    @classmethod
+    def setUpClass(cls):
+        cls.executor = ProcessPoolExecutor(max_workers=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.executor.shutdown()
+
+
+class TestPipelines(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+
+    def tracing(self, name, func):
+        def traced(*args):
+            self.calls.append((name,) + args)
+            return func(*args)
+        return traced
+
+    def traced_chain(self):
+        return (S('ints') >>
+                Filter(self.tracing('filter', lambda i: i % 2)) >>
+                Forall(self.tracing('forall', lambda i: i * 10)) >>
+                Reduce(self.tracing('reduce', add)))
+
+    def test_not_fused(self):
+        self.assertEqual(bend({'v': self.traced_chain()},
+                              {'ints': [1, 2, 3]}),
+                         {'v': 40})
+        self.assertEqual(self.calls, [('filter', 1), ('filter', 2),
+                                      ('filter', 3), ('forall', 1),
+                                      ('forall', 3), ('reduce', 10, 30)])
+
+    def test_fused(self):
+        mapping = fuse({'v': self.traced_chain()})
+        self.assertEqual(bend(mapping, {'ints': [1, 2, 3]}), {'v': 40})
+        # each element goes through the whole chain before the next one
+        self.assertEqual(self.calls, [('filter', 1), ('forall', 1),
+                                      ('filter', 2), ('filter', 3),
+                                      ('forall', 3), ('reduce', 10, 30)])
+        del self.calls[:]
+        compile(self.traced_chain(), fuse=True)({'ints': [1, 2, 3]})
+        self.assertEqual(self.calls[:2], [('filter', 1), ('forall', 1)])
+
+    def test_error_order(self):
+        def first(i):
+            if i == 1:
+                raise ValueError('first')
+            return i
+
+        def second(i):
+            if i == 0:
+                raise ValueError('second')
+            return i
+
+        bender = S('l') >> Forall(first) >> Forall(second)
+        for bent in [lambda m: bend(m, {'l': [0, 1]}),
+                     lambda m: compile(m)({'l': [0, 1]})]:
+            # the first operation fails before the second one runs
+            with self.assertRaises(ValueError) as raised:
+                bent(bender)
+            self.assertEqual(str(raised.exception), 'first')
+            # while fused, the first element fails before the second one
+            # gets to the first operation
+            with self.assertRaises(ValueError) as raised:
+                bent(fuse(bender))
+            self.assertEqual(str(raised.exception), 'second')
+            # nor is the deprecated inner bender of a list op fused
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', DeprecationWarning)
+                deprecated = Forall(S('l') >> Forall(first), second)
+            with self.assertRaises(ValueError) as raised:
+                bent(deprecated)
+            self.assertEqual(str(raised.exception), 'first')
+
+    def test_fuse_copies(self):
+        tree = {'name': S('name')}
+        tree['children'] = S('children') >> Forall.bend(tree) >> Filter(bool)
+        fused = fuse(tree)
+        self.assertIs(fused['children']._first._second._mapping, fused)
+        self.assertTrue(fused['children']._fused)
+        self.assertFalse(tree['children']._fused)
+        source = {'name': 'a', 'children': [{'name': 'b', 'children': []}]}
+        self.assertEqual(bend(fused, source), bend(tree, source))
+
+    def test_last_op_makes_a_list(self):
+        bender = fuse(S('ints') >> Forall(lambda i: i + 1) >>
+                      FlatForall(lambda i: [i, i]) >> Filter(lambda i: i > 2))
+        self.assertEqual(bend({'v': bender}, {'ints': [1, 2]}),
+                         {'v': [3, 3]})
+
+    def test_forall_bend(self):
+        bender = fuse(S('items') >> Forall.bend({'w': S('v')}) >>
+                      Forall(self.tracing('forall', lambda d: d['w'])))
+        self.assertEqual(bend(bender, {'items': [{'v': 1}, {'v': 2}]}),
+                         [1, 2])
+        bender = fuse(Forall.bend({'w': S('v')}) >> S(0))
+        self.assertEqual(bend(bender, [{'v': 1}]), {'w': 1})
+
+    def test_subclass_op(self):
+        bender = fuse(K(['a', 'b']) >> Enumerate(lambda i, v: v * i) >>
+                      Forall(lambda v: v + '!'))
+        self.assertEqual(bender({}), ['!', 'b!'])
+
+    def test_subclass_execute(self):
+        bender = fuse(K([1, 2, 3]) >> Forall(lambda i: i) >> Count())
+        self.assertEqual(bender({}), 3)
+
+    def test_reduce_errors(self):
+        with self.assertRaises(ValueError):
+            Reduce(add)([])
+        bender = fuse(K([1, 'a']) >> Forall(lambda i: i + 1) >> Reduce(add))
+        with self.assertRaises(TypeError):
+            bender({})
+
+
 if __name__ == '__main__':
     unittest.main()
 
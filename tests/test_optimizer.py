@@ -0,0 +1,177 @@
+import unittest
+
+from jsonbender import (Alternation, Context, F, Forall, Format, If, K,
+                        OptionalS, S, Switch, bend)
+from jsonbender.compiler import compile
+from jsonbender.core import Add, Bender, Compose, Concat, Div
+from jsonbender.optimizer import optimize
+
+
+class Double(Bender):
+    def execute(self, value):
+        return value * 2
+
+
+SOURCES = [
+    {'a': {'b': [{'c': 1}, {'c': 2}]}, 'first': 'Ada', 'last': 'Lovelace',
+     'n': 3, 'kind': 'x', 'items': [1, 2, 3]},
+    {'a': {'b': []}, 'first': 'Alan', 'last': 7, 'n': 0, 'kind': 'y',
+     'items': []},
+    {'a': {}, 'first': 1, 'kind': 'z'},
+]
+
+
+class TestOptimize(unittest.TestCase):
+    def bend_or_raise(self, func, source):
+        try:
+            return 'ok', func(source)
+        except Exception as e:
+            return type(e), str(e)
+
+    def assert_equivalent(self, mapping, sources=SOURCES):
+        optimized = optimize(mapping)
+        for source in sources:
+            expected = self.bend_or_raise(lambda s: bend(mapping, s), source)
+            self.assertEqual(
+                self.bend_or_raise(lambda s: bend(optimized, s), source),
+                expected)
+            self.assertEqual(self.bend_or_raise(compile(optimized), source),
+                             expected)
+        return optimized
+
+    def assert_optimized(self, bender, expected):
+        optimized = self.assert_equivalent({'x': bender})['x']
+        self.assertEqual(optimized.structural_key(),
+                         expected.structural_key())
+
+    def test_constant_folding(self):
+        self.assert_optimized(K(2) * K(3) + K(1), K(7))
+        self.assert_optimized(S('n') * (K(1) + K(0.5)), S('n') * K(1.5))
+        self.assert_optimized(-K(2) == K(-2), K(True))
+        self.assert_optimized(Format('{}-{}', K('a'), K(1)), K('a-1'))
+        self.assert_optimized(K({'a': (1, 2)}) >> S('a') >> F(len),
+                              K((1, 2)) >> F(len))
+        self.assert_optimized(K({'a': (1, 2)}) >> S('a'), K((1, 2)))
+        self.assert_optimized(Alternation(K([1]) >> S(3), K('x')), K('x'))
+
+    def test_no_folding_of_mutable_values(self):
+        bender = K([1]) + K([2])
+        self.assert_optimized(bender, bender)
+        self.assert_optimized(K({'a': [1]}) >> S('a'),
+                              K({'a': [1]}) >> S('a'))
+
+    def test_no_folding_of_errors(self):
+        self.assert_optimized(S('n') + K(1) / K(0), S('n') + K(1) / K(0))
+        self.assert_optimized(K({}) >> S('a'), K({}) >> S('a'))
+
+    def test_no_folding_of_impure_benders(self):
+        for bender in [K(1) >> F(str), K(1) >> Context(),
+                       K(1) >> Double(), K([1]) >> Forall(str)]:
+            self.assert_optimized(bender, bender)
+
+    def test_selectors(self):
+        self.assert_optimized(S('a') >> S('b', 0) >> S('c'),
+                              S('a', 'b', 0, 'c'))
+        self.assert_optimized(S('a')['b'][0]['c'], S('a', 'b', 0, 'c'))
+        self.assert_optimized(S('a') >> (S('b') >> S(1)), S('a', 'b', 1))
+        self.assert_optimized(S('a') >> S('b') >> F(len) >> S('x') >> S(0),
+                              S('a', 'b') >> F(len) >> S('x', 0))
+        self.assert_optimized(S('a') >> (S('b') >> F(len)),
+                              S('a', 'b') >> F(len))
+        self.assert_optimized(S('a') >> OptionalS('b', 'c'),
+                              S('a') >> OptionalS('b', 'c'))
+
+    def test_concat(self):
+        self.assert_optimized(S('first') + K(' ') + S('last'),
+                              Concat(S('first'), K(' '), S('last')))
+        self.assert_optimized(
+            S('first') + K(' ') + S('last') + K('!') + S('kind'),
+            Concat(S('first'), K(' '), S('last'), K('!'), S('kind')))
+        self.assert_optimized(
+            (S('first') + K(' ') + S('last')) + (S('kind') + K('.')),
+            Concat(S('first'), K(' '), S('last'), S('kind') + K('.')))
+
+    def test_no_concat(self):
+        for bender in [S('n') + S('n') + S('n'), S('first') + K(' '),
+                       S('first') + (K(' ') + S('last'))]:
+            self.assert_optimized(bender, bender)
+
+    def test_concat_errors(self):
+        self.assert_equivalent({'x': S('first') + K(' ') + S('missing')})
+        self.assert_equivalent({'x': S('n') + K(' ') + S('missing')})
+
+    def test_if(self):
+        self.assert_optimized(If(K(1), S('a'), S('b')), S('a'))
+        self.assert_optimized(If(K([]), S('a'), S('b')), S('b'))
+        self.assert_optimized(If(K(2) == K(2), S('n') * K(2)),
+                              S('n') * K(2))
+        self.assert_optimized(If(K(0), S('a')), K(None))
+        bender = If(S('n'), S('a'), S('b'))
+        self.assert_optimized(bender, bender)
+
+    def test_switch(self):
+        cases = {'x': S('first'), 'y': S('last')}
+        self.assert_optimized(Switch(K('y'), cases), S('last'))
+        self.assert_optimized(Switch(K('z'), cases, default=S('n')), S('n'))
+        self.assert_optimized(Switch(K('x') + K(''), cases), S('first'))
+        for bender in [Switch(K('z'), cases), Switch(K([]), cases),
+                       Switch(S('kind'), cases)]:
+            self.assert_optimized(bender, bender)
+
+    def test_nested(self):
+        mapping = {
+            'name': S('first') + K(' ') + S('last'),
+            'list': [S('a')['b'], {'k': K(1) + K(1)}, 'const'],
+            'items': S('items') >> Forall.bend({'v': K(2) * K(2)}),
+            'alt': Alternation(S('a') >> S('b') >> S(0), K('no') + K('ne')),
+            'custom': Double() >> Double(),
+            'format': Format('{} {x}', S('a') >> S('b'), x=K(1) + K(1)),
+        }
+        optimized = self.assert_equivalent(mapping)
+        self.assertEqual(optimized['list'][1], {'k': 2})
+        self.assertEqual(optimized['alt'].structural_key(),
+                         Alternation(S('a', 'b', 0), K('none'))
+                         .structural_key())
+        forall_bend = optimized['items']._second
+        self.assertEqual(forall_bend._mapping['v'].structural_key(),
+                         K(4).structural_key())
+
+    def test_original_is_unchanged(self):
+        mapping = {'x': S('a') >> S('b'), 'y': [K(1) + K(1)]}
+        keys = {'x': mapping['x'].structural_key(),
+                'y': mapping['y'][0].structural_key()}
+        optimize(mapping)
+        self.assertEqual({'x': mapping['x'].structural_key(),
+                          'y': mapping['y'][0].structural_key()}, keys)
+
+    def test_unknown_benders_are_kept(self):
+        bender = Double()
+        self.assertIs(optimize(bender), bender)
+
+        class Sum(Add):
+            pass
+
+        bender = Sum(K(1), K(2))
+        self.assertIs(optimize(bender), bender)
+        self.assertIs(optimize({'x': bender})['x'], bender)
+
+    def test_containers(self):
+        cases = {'x': K(1) + K(1)}
+        optimized = optimize(Switch(S('kind'), cases))
+        self.assertIsNot(optimized.cases, cases)
+        self.assertEqual(optimized.cases['x'].structural_key(),
+                         K(2).structural_key())
+        # tuples in mappings are constants, not containers of benders
+        constant = (K(1) + K(1),)
+        self.assertIs(optimize([1, constant, 'x'])[1], constant)
+        alternation = optimize(Alternation(S('a'), S('b')))
+        self.assertIs(type(alternation.benders), tuple)
+
+    def test_types(self):
+        self.assertIs(type(optimize(K(1) + K(1))), type(K(1)))
+        self.assertIs(type(optimize(K(1) / K(0))), Div)
+        self.assertIs(type(optimize(K(1) >> F(str))), Compose)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import unittest
+
+from jsonbender import Alternation, F, Forall, K, S, bend
+from jsonbender.core import Bender, BendingException
+from jsonbender.profiling import Profile
+from jsonbender._compat import PY2
+
+if PY2:
+    from StringIO import StringIO
+else:
+    from io import StringIO
+
+
+class Legacy(Bender):
+    def __init__(self, bender):
+        self.bender = bender
+
+    _bender_fields = ('bender',)
+
+    def raw_execute(self, source):
+        return self.bender.raw_execute(source)
+
+
+MAPPING = {
+    'id': S('id'),
+    'name': Alternation(S('nick'), S('name')),
+    'orders': S('orders') >> Forall.bend({
+        'total': S('price') * S('qty'),
+        'tags': [K('order'), S('kind')],
+    }),
+    'legacy': Legacy(S('id')),
+}
+
+SOURCE = {
+    'id': 1,
+    'name': 'Ada',
+    'orders': [{'price': 2, 'qty': 3, 'kind': 'a'},
+               {'price': 5, 'qty': 1, 'kind': 'b'}],
+}
+
+
+class TestProfile(unittest.TestCase):
+    def test_same_result(self):
+        stats = Profile()
+        self.assertEqual(bend(MAPPING, SOURCE, profile=stats),
+                         bend(MAPPING, SOURCE))
+
+    def test_paths(self):
+        stats = Profile()
+        bend(MAPPING, SOURCE, profile=stats)
+        bend(MAPPING, SOURCE, profile=stats)
+        paths = stats.as_dict()['paths']
+        self.assertEqual(sorted(paths), ['id', 'legacy', 'name', 'orders',
+                                         'orders[].tags[0]',
+                                         'orders[].tags[1]',
+                                         'orders[].total'])
+        self.assertEqual(paths['id']['calls'], 2)
+        self.assertEqual(paths['orders[].total']['calls'], 4)
+        self.assertEqual(paths['orders[].tags[1]']['calls'], 4)
+
+    def test_benders(self):
+        stats = Profile()
+        bend(MAPPING, SOURCE, profile=stats)
+        benders = stats.as_dict()['benders']
+        # id, nick, name, orders, price, qty, kind, kind, legacy's id
+        self.assertEqual(benders['S']['calls'], 11)
+        self.assertEqual(benders['Mul']['calls'], 2)
+        self.assertEqual(benders['ForallBend']['calls'], 1)
+        self.assertEqual(benders['Legacy']['calls'], 1)
+
+    def test_exceptions(self):
+        stats = Profile()
+        bend(MAPPING, SOURCE, profile=stats)
+        data = stats.as_dict()
+        self.assertEqual(data['benders']['S']['exceptions'], 1)
+        self.assertEqual(data['benders']['Alternation']['exceptions'], 0)
+        self.assertEqual(data['paths']['name']['exceptions'], 0)
+
+    def test_errors_are_unchanged(self):
+        stats = Profile()
+        with self.assertRaises(BendingException) as cm:
+            bend({'a': S('missing')}, {}, profile=stats)
+        self.assertIn('Error for key a', str(cm.exception))
+        self.assertEqual(stats.as_dict()['paths']['a']['exceptions'], 1)
+
+    def test_times(self):
+        def busy(value):
+            return sum(range(20000))
+
+        stats = Profile()
+        bend({'a': S('x') >> F(busy)}, {'x': 1}, profile=stats)
+        data = stats.as_dict()
+        compose = data['benders']['Compose']
+        f = data['benders']['F']
+        self.assertGreater(f['self'], 0)
+        self.assertGreaterEqual(compose['cumulative'], f['cumulative'])
+        self.assertLess(compose['self'], compose['cumulative'])
+        self.assertEqual(data['paths']['a']['cumulative'],
+                         compose['cumulative'])
+
+    def test_recursion_not_counted_twice(self):
+        stats = Profile()
+        bend({'a': S('x') >> S('y') >> S('z')}, {'x': {'y': {'z': 1}}},
+             profile=stats)
+        compose = stats.as_dict()['benders']['Compose']
+        self.assertEqual(compose['calls'], 2)
+        self.assertEqual(compose['cumulative'],
+                         stats.as_dict()['paths']['a']['cumulative'])
+
+    def test_mapping_not_modified(self):
+        mapping = {'a': S('x') >> S('y')}
+        bend(mapping, {'x': {'y': 1}}, profile=Profile())
+        self.assertEqual(type(mapping['a']._first).__name__, 'S')
+
+    def test_clear(self):
+        stats = Profile()
+        bend(MAPPING, SOURCE, profile=stats)
+        stats.clear()
+        self.assertEqual(stats.as_dict()['paths']['id']['calls'], 0)
+
+    def test_report(self):
+        stats = Profile()
+        bend(MAPPING, SOURCE, profile=stats)
+        out = StringIO()
+        stats.report(sort='calls', limit=2, file=out)
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith('path'))
+        self.assertTrue(lines[1].startswith('orders[]'))
+        self.assertEqual(lines[4].split()[0], 'bender')
+        self.assertEqual(lines[5].split()[:2], ['S', '11'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+import io
+import json
+import unittest
+from unittest import mock
+
+from jsonbender import (Alternation, Context, F, Filter, Forall, Format, If,
+                        K, OptionalS, S, Switch, bend)
+from jsonbender.core import Bender
+from jsonbender import projection
+from jsonbender.projection import ANY, load_projected, source_paths
+from jsonbender.specialize import specialize
+
+
+class Keys(Bender):
+    def execute(self, value):
+        return sorted(value)
+
+
+DOCUMENTS = [
+    {'order': {'id': 7, 'kind': 'web',
+               'lines': [{'sku': 'a', 'qty': 1, 'extra': {'x': [1, 2]}},
+                         {'sku': 'b', 'qty': 2, 'note': 'a "quoted" ]}'}],
+               'totals': [1.5, 2.5], 'junk': {'deep': [[{}], '\\', None]}},
+     'customer': {'name': 'Ada', 'tags': ['x', 'y'], 'misc': True},
+     'empty': [], 'meta': {'v': 1, 'w': {}}},
+    {'order': {'id': 8, 'kind': 'shop', 'lines': [], 'totals': []},
+     'customer': {'name': 'Alan'}, 'meta': {'v': 'x'}},
+    {'order': {'id': None, 'lines': 'nope', 'totals': 3},
+     'customer': ['not', 'a', 'dict'], 'meta': 1},
+    {'order': {'lines': [1, [2], {'sku': 3}], 'totals': {'a': 1}},
+     'customer': 'plain'},
+    {},
+    [1, {'order': 2}],
+]
+
+MAPPINGS = [
+    {'id': S('order', 'id'), 'name': S('customer', 'name')},
+    {'first': S('order', 'lines', 0, 'sku'),
+     'last': S('order', 'lines', -1, 'qty'),
+     'both': [S('order', 'lines', 0, 'qty'), S('order', 'lines', -2, 'sku')]},
+    {'skus': S('order', 'lines') >> Forall.bend({
+        'sku': S('sku'), 'opt': OptionalS('note', default='-')})},
+    {'count': S('order', 'lines') >> Forall.bend({'k': K(1)}),
+     'first': OptionalS('order', 'lines', 0, 'extra')},
+    {'total': S('order', 'totals') >> F(sum),
+     'tags': S('customer') >> S('tags') >> Forall(str.upper),
+     'keys': S('meta') >> Keys(),
+     'even': S('order', 'totals') >> Filter(lambda v: v > 2)},
+    {'label': Format('{} for {name}', S('order', 'id'),
+                     name=OptionalS('customer', 'name', default='?')),
+     'kind': Switch(S('order', 'kind'), {'web': S('meta', 'v'),
+                                         'shop': K('shop')},
+                    default=S('customer', 'misc')),
+     'if': If(OptionalS('meta', 'w'), S('meta', 'w'), K(None)),
+     'alt': Alternation(S('customer', 'nick'), S('customer', 'name'),
+                        K(None))},
+    {'ctx': Context() >> S('x'), 'const': K({'a': 1}),
+     'sum': S('order', 'id') + S('meta', 'v')},
+    {'whole': F(len)},
+    {'item': S(1, 'order'), 'opt': OptionalS(0, default=0)},
+    {'lines': S('order')['lines'][0]['sku']},
+]
+
+
+class TestSourcePaths(unittest.TestCase):
+    def test_selectors(self):
+        self.assertEqual(source_paths({'a': S('a', 'b'),
+                                       'b': [OptionalS('c', 0)],
+                                       'c': {'d': S('a')['x']}}),
+                         {('a', 'b'), ('c', 0), ('a', 'x')})
+
+    def test_compositions(self):
+        self.assertEqual(
+            source_paths({'a': S('a') >> S('b', 0) >> S('c'),
+                          'f': S('f') >> F(len) >> S('x'),
+                          'l': S('l') >> Forall.bend({'v': S('v', 'w')}),
+                          'k': K({'x': 1}) >> S('x')}),
+            {('a', 'b', 0, 'c'), ('f',), ('l', ANY, 'v', 'w')})
+
+    def test_selected_then_ignored(self):
+        # the selected values must be there, even if they aren't read
+        self.assertEqual(
+            source_paths({'has_a': S('a') >> K(True), 'y': S('b'),
+                          'ctx': S('c', 'd') >> Context(),
+                          'if': S('e') >> If(S('f'), K(1))}),
+            {('a',), ('b',), ('c', 'd'), ('e',)})
+        mapping = {'has_a': S('a') >> K(True), 'y': S('b')}
+        projected = load_projected('{"a": 0, "b": 2}', source_paths(mapping))
+        self.assertEqual(bend(mapping, projected), {'has_a': True, 'y': 2})
+
+    def test_branches(self):
+        mapping = {'f': Format('{}{x}', S('a'), x=S('b')),
+                   'i': If(S('c'), S('d'), S('e')),
+                   's': Switch(S('k'), {1: S('g')}, default=S('h')),
+                   'o': S('m') + S('n')}
+        self.assertEqual(source_paths(mapping),
+                         set((k,) for k in 'abcdeghkmn'))
+
+    def test_opaque_benders(self):
+        self.assertEqual(source_paths({'a': S('a'), 'b': S('a', 'b'),
+                                       'c': S('x') >> Keys()}),
+                         {('a',), ('x',)})
+        self.assertEqual(source_paths({'a': S('a'), 'b': F(len)}), {()})
+        self.assertEqual(source_paths({'a': K(1), 'c': Context()}), set())
+
+    def test_specialized_selectors(self):
+        self.assertEqual(source_paths(specialize({'a': S('a', 'b')})),
+                         {('a', 'b')})
+
+
+class TestLoadProjected(unittest.TestCase):
+    def bend_or_raise(self, mapping, source):
+        try:
+            return 'ok', bend(mapping, source, {'x': 1})
+        except Exception as e:
+            return type(e), str(e)
+
+    def test_same_results(self):
+        for mapping in MAPPINGS:
+            paths = source_paths(mapping)
+            for document in DOCUMENTS:
+                text = json.dumps(document, indent=1)
+                projected = load_projected(text, paths)
+                self.assertEqual(self.bend_or_raise(mapping, projected),
+                                 self.bend_or_raise(mapping, document),
+                                 (mapping, document))
+
+    def test_large_containers(self):
+        # they are projected while they are parsed, instead of after
+        with mock.patch.object(projection, '_SMALL', 0):
+            self.test_same_results()
+            self.test_projection()
+            self.test_errors()
+
+    def test_projection(self):
+        paths = source_paths(MAPPINGS[1])
+        self.assertEqual(
+            load_projected(json.dumps(DOCUMENTS[0]), paths),
+            {'order': {'lines': [{'sku': 'a', 'qty': 1}, {'qty': 2}]}})
+        paths = source_paths({'x': S('customer', 'tags', 1)})
+        self.assertEqual(load_projected(json.dumps(DOCUMENTS[0]), paths),
+                         {'customer': {'tags': [None, 'y']}})
+        self.assertEqual(load_projected('[1, 2]', set()), [None, None])
+        self.assertEqual(load_projected(' {"a": 1} ', {()}), {'a': 1})
+
+    def test_inputs(self):
+        text = json.dumps(DOCUMENTS[0])
+        paths = {('customer', 'name')}
+        expected = {'customer': {'name': 'Ada'}}
+        for document in [text, text.encode('utf-8'), io.StringIO(text),
+                         io.BytesIO(text.encode('utf-8'))]:
+            self.assertEqual(load_projected(document, paths), expected)
+
+    def test_errors(self):
+        paths = {('a', 'b')}
+        for text in ['', '{"a": ', '{"a": {"b": }}', '{"a" 1}', '{"a": 1',
+                     '{"a": 1} x', '[1 2]', '{"c": [1, 2}', '{a: 1}']:
+            with self.assertRaises(ValueError):
+                load_projected(text, paths)
+
+
+if __name__ == '__main__':
+    unittest.main()
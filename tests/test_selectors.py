@@ -1,6 +1,9 @@
 import unittest
 
-from jsonbender.selectors import F, ProtectedF, K, S, OptionalS
+from collections import defaultdict
+
+from jsonbender.core import MISSING, bend
+from jsonbender.selectors import CachedF, F, ProtectedF, K, S, OptionalS
 from jsonbender.test import BenderTestMixin
 
 
@@ -34,6 +37,28 @@ class TestS(unittest.TestCase, STestsMixin):
     def test_deep_missing_field(self):
         self.assertRaises(KeyError, self.selector_cls('k', 'k2'), {'k': {}})
 
+    def test_try_evaluate(self):
+        bender = S('a', 1, 'b')
+        self.assertEqual(bender.try_evaluate({'a': [0, {'b': 2}]}, {}), 2)
+        self.assertIs(bender.try_evaluate({}, {}), MISSING)
+        self.assertIs(bender.try_evaluate({'a': [0]}, {}), MISSING)
+        self.assertIs(bender.try_evaluate({'a': [0, {}]}, {}), MISSING)
+        self.assertEqual(bender.try_evaluate({'a': [0, {'b': None}]}, {}),
+                         None)
+        self.assertRaises(TypeError, bender.try_evaluate, {'a': 1}, {})
+
+    def test_try_evaluate_mapping_subclass(self):
+        source = defaultdict(lambda: 'default')
+        self.assertEqual(S('a').try_evaluate(source, {}), 'default')
+
+    def test_try_evaluate_of_subclass(self):
+        class Upper(S):
+            def execute(self, source):
+                return super(Upper, self).execute(source).upper()
+
+        self.assertEqual(Upper('a').try_evaluate({'a': 'x'}, {}), 'X')
+        self.assertIs(Upper('a').try_evaluate({}, {}), MISSING)
+
 
 class TestOptionalS(unittest.TestCase, STestsMixin):
     selector_cls = OptionalS
@@ -51,6 +76,14 @@ class TestOptionalS(unittest.TestCase, STestsMixin):
 
     def test_activate_on_IndexError(self):
         self.assert_bender(OptionalS(0), [], None)
+        self.assert_bender(OptionalS('a', 2, default=1), {'a': [0]}, 1)
+
+    def test_falsy_values(self):
+        self.assert_bender(OptionalS('a', default=1), {'a': None}, None)
+        self.assert_bender(OptionalS('a', default=1), {'a': 0}, 0)
+
+    def test_try_evaluate(self):
+        self.assertEqual(OptionalS('a', default=1).try_evaluate({}, {}), 1)
 
 
 class FTestsMixin(BenderTestMixin):
@@ -68,6 +101,20 @@ class FTestsMixin(BenderTestMixin):
         self.assert_bender(protected, '123', 123)
         self.assert_bender(protected, 'bad', 'bad')
 
+    def test_cached(self):
+        calls = []
+
+        def double(v):
+            calls.append(v)
+            return v * 2
+
+        cached = self.selector_cls(double).cached(maxsize=2)
+        self.assertIsInstance(cached, CachedF)
+        for v in [1, 2, 1, 3, 2, 1]:
+            self.assert_bender(cached, v, v * 2)
+        self.assertEqual(calls, [1, 2, 3, 2, 1])
+        self.assertEqual(cached.cache_info(), (1, 5, 3, 2, 2))
+
     # TODO: move this to a more general Bender test
     def test_composition(self):
         s = S('val')
@@ -89,6 +136,61 @@ class TestProtectedF(unittest.TestCase, FTestsMixin):
         self.assert_bender(protected, '123', 123)
         self.assert_bender(protected, None, None)
 
+    def test_cached_protectedf(self):
+        cached = ProtectedF(int).cached()
+        self.assert_bender(cached, '123', 123)
+        self.assert_bender(cached, None, None)
+
+
+class TestCachedF(unittest.TestCase, BenderTestMixin):
+    def test_inputs_of_different_types(self):
+        cached = F(repr).cached()
+        for v in [1, True, 1.0, 0.0, -0.0, '1']:
+            self.assert_bender(cached, v, repr(v))
+        self.assertEqual(cached.cache_info().misses, 6)
+
+    def test_unhashable_inputs(self):
+        cached = F(len).cached()
+        self.assert_bender(cached, [1, 2], 2)
+        self.assert_bender(cached, {'a': 1}, 1)
+        self.assertEqual(cached.cache_info(), (0, 2, 0, 128, 0))
+
+    def test_key(self):
+        calls = []
+
+        def total(d):
+            calls.append(d)
+            return d['a'] + d['b']
+
+        cached = F(total).cached(key=lambda d: (d['a'], d['b']))
+        for _ in range(3):
+            self.assert_bender(cached, {'a': 1, 'b': 2}, 3)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cached.cache_info().hit_rate, 2.0 / 3)
+
+    def test_errors_are_not_cached(self):
+        cached = F(int).cached()
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                cached('x')
+        self.assertEqual(cached.cache_info().currsize, 0)
+
+    def test_clear(self):
+        cached = F(str).cached()
+        cached(1)
+        cached(1)
+        cached.clear()
+        self.assertEqual(cached.cache_info(), (0, 0, 0, 128, 0))
+
+    def test_shared_across_bends(self):
+        calls = []
+        cached = F(lambda v: calls.append(v) or v).cached()
+        mapping = {'a': S('a') >> cached, 'b': S('b') >> cached}
+        for _ in range(3):
+            self.assertEqual(bend(mapping, {'a': 1, 'b': 1}),
+                             {'a': 1, 'b': 1})
+        self.assertEqual(calls, [1])
+
 
 if __name__ == '__main__':
     unittest.main()
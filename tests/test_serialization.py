@@ -0,0 +1,202 @@
+import json
+import marshal
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import warnings
+
+from jsonbender import (Alternation, Context, F, Forall, Format, If, K,
+                        OptionalS, S, Switch, bend)
+from jsonbender.core import Bender
+from jsonbender.serialization import MappingCache, deserialize, serialize
+from jsonbender.specialize import specialize
+
+
+class Upper(Bender):
+    def execute(self, value):
+        return value.upper()
+
+
+def double(value):
+    return value * 2
+
+
+MAPPING = {
+    'id': S('id'),
+    'name': Format('{} {last}', S('first'), last=S('last') >> Upper()),
+    'kind': Switch(S('kind'), {'a': K('A'), 1: Context()}, default=K(None)),
+    'nick': Alternation(S('nick'), OptionalS('first', default='')),
+    'big': If(S('id') >> F(bool), K((1, 'x')), K({1: 'one'})),
+    'lines': S('lines') >> Forall.bend({'sku': S('sku'),
+                                        '$qty': OptionalS('qty') >> F(double)},
+                                       context={'c': 1}),
+    'size': S('first') >> F(len).cached(),
+    'tags': K(frozenset(['a'])),
+    'items': [S('id') + K(1), {'nested': S('first', 0) >> F(str.lower)}],
+}
+
+SOURCE = {'id': 1, 'first': 'Ada', 'last': 'Lovelace', 'kind': 1,
+          'lines': [{'sku': 'x', 'qty': 2}, {'sku': 'y', 'qty': 1}]}
+
+
+class TestSerialize(unittest.TestCase):
+    def round_trip(self, mapping):
+        return deserialize(json.loads(json.dumps(serialize(mapping))))
+
+    def test_round_trip(self):
+        got = self.round_trip(MAPPING)
+        self.assertEqual(bend(got, SOURCE, 'ctx'),
+                         bend(MAPPING, SOURCE, 'ctx'))
+        # without going through JSON, which makes str unicode on Python 2
+        got = deserialize(serialize(MAPPING))
+        for key in ['id', 'name', 'kind', 'nick', 'big', 'lines']:
+            self.assertEqual(got[key].structural_key(),
+                             MAPPING[key].structural_key(), key)
+        self.assertIsNot(got['id'], MAPPING['id'])
+
+    def test_marshal(self):
+        data = serialize(MAPPING)
+        got = deserialize(marshal.loads(marshal.dumps(data)))
+        self.assertEqual(bend(got, SOURCE), bend(MAPPING, SOURCE))
+
+    def test_specialized(self):
+        mapping = specialize({'a': S('a', 'b'), 'c': OptionalS('c', 0)})
+        got = self.round_trip(mapping)
+        self.assertEqual(type(got['a']), type(mapping['a']))
+        self.assertEqual(bend(got, {'a': {'b': 1}}), {'a': 1, 'c': None})
+
+    def test_plain_data(self):
+        data = {'a': [1, 2.5, None, True, u'x'], '$b': (1, 2), 3: {'c': {}}}
+        self.assertEqual(self.round_trip(data), data)
+
+    def test_shared(self):
+        line = {'sku': S('sku')}
+        total = S('qty') * S('price')
+        mapping = {'a': [line, total], 'b': {'line': line, 'total': total}}
+        got = self.round_trip(mapping)
+        self.assertIs(got['a'][0], got['b']['line'])
+        self.assertIs(got['a'][1], got['b']['total'])
+        self.assertIsNot(got['a'][1]._bender1, got['a'][1]._bender2)
+
+    def test_nested_inside_itself(self):
+        tree = {'name': S('name')}
+        tree['children'] = S('children') >> Forall.bend(tree)
+        got = self.round_trip(tree)
+        self.assertIs(got['children']._second._mapping, got)
+        source = {'name': 'a', 'children': [{'name': 'b', 'children': []}]}
+        self.assertEqual(bend(got, source), bend(tree, source))
+        nested = [S('a')]
+        nested.append(Forall.bend(nested))
+        self.assertRaises(TypeError, serialize, nested)
+
+    def test_unserializable(self):
+        mappings = [F(lambda v: v), S('a') >> F(' '.join), K(object())]
+        if bytes is not str:
+            # bytes are text on Python 2
+            mappings.append({'a': K(b'bytes')})
+        for mapping in mappings:
+            self.assertRaises(TypeError, serialize, mapping)
+
+
+CACHED_MODULE = '''
+from jsonbender import F, S
+from cached_helpers import suffix
+
+MAPPING = {{'b': S('a') >> F(suffix), 'version': {version}}}
+UNSERIALIZABLE = {{'b': S('a') >> F(lambda v: v)}}
+SHARED = {{'a': S('a') >> F(suffix), 'b': S('a') >> F(suffix)}}
+'''
+
+HELPERS_MODULE = '''
+def suffix(value):
+    return value + '{}'
+'''
+
+
+class TestMappingCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.dir, 'cache')
+        self.write_modules()
+        sys.path.insert(0, self.dir)
+
+    def tearDown(self):
+        sys.path.remove(self.dir)
+        for name in ['cached_mappings', 'cached_helpers']:
+            sys.modules.pop(name, None)
+        shutil.rmtree(self.dir)
+
+    def write_modules(self, version=1, suffix='!'):
+        for name, source in [
+                ('cached_mappings', CACHED_MODULE.format(version=version)),
+                ('cached_helpers', HELPERS_MODULE.format(suffix))]:
+            with open(os.path.join(self.dir, name + '.py'), 'w') as f:
+                f.write(source)
+        for name in ['cached_mappings', 'cached_helpers']:
+            sys.modules.pop(name, None)
+
+    def load(self, reference='cached_mappings:MAPPING', **kwargs):
+        loaded = MappingCache(self.cache_dir).load(reference, **kwargs)
+        return bend(loaded, {'a': 'x'})
+
+    def test_miss_then_hit(self):
+        self.assertEqual(self.load(), {'b': 'x!', 'version': 1})
+        self.assertEqual(os.listdir(self.cache_dir),
+                         ['cached_mappings.MAPPING.jbm'])
+        sys.modules.pop('cached_mappings')
+        self.assertEqual(self.load(), {'b': 'x!', 'version': 1})
+        # loaded from the cache, without importing the module
+        self.assertNotIn('cached_mappings', sys.modules)
+
+    def test_changed_source(self):
+        self.load()
+        self.write_modules(version=2)
+        self.assertEqual(self.load(), {'b': 'x!', 'version': 2})
+        sys.modules.pop('cached_mappings')
+        self.assertEqual(self.load(), {'b': 'x!', 'version': 2})
+        self.assertNotIn('cached_mappings', sys.modules)
+
+    def test_depends(self):
+        self.load(depends=['cached_helpers'])
+        self.write_modules(suffix='?')
+        self.assertEqual(self.load(depends=['cached_helpers']),
+                         {'b': 'x?', 'version': 1})
+
+    def test_corrupt_file(self):
+        self.load()
+        path = os.path.join(self.cache_dir, 'cached_mappings.MAPPING.jbm')
+        for content in [b'', b'garbage', b'\xff' * 100]:
+            with open(path, 'wb') as f:
+                f.write(content)
+            sys.modules.pop('cached_mappings')
+            self.assertEqual(self.load(), {'b': 'x!', 'version': 1})
+            self.assertIn('cached_mappings', sys.modules)
+        # and it was written again
+        sys.modules.pop('cached_mappings')
+        self.load()
+        self.assertNotIn('cached_mappings', sys.modules)
+
+    def test_intern(self):
+        for _ in range(2):
+            sys.modules.pop('cached_mappings', None)
+            loaded = MappingCache(self.cache_dir, intern=True).load(
+                'cached_mappings:SHARED')
+            self.assertIs(loaded['a'], loaded['b'])
+            self.assertEqual(bend(loaded, {'a': 'x'}),
+                             {'a': 'x!', 'b': 'x!'})
+        self.assertNotIn('cached_mappings', sys.modules)
+
+    def test_unserializable(self):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            self.assertEqual(self.load('cached_mappings:UNSERIALIZABLE'),
+                             {'b': 'x'})
+        self.assertEqual([w.category for w in caught], [RuntimeWarning])
+        self.assertFalse(os.path.exists(self.cache_dir) and
+                         os.listdir(self.cache_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+import pickle
+import unittest
+
+from jsonbender import (Alternation, F, Forall, Format, K, OptionalS, S,
+                        bend)
+from jsonbender.compiler import compile
+from jsonbender.core import MISSING, Compose
+from jsonbender.specialize import (SpecializedOptionalS, SpecializedS,
+                                   _infer_schema, specialize)
+
+
+SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'order': {
+            'type': 'object',
+            'properties': {
+                'id': {'type': 'integer'},
+                'lines': {'type': 'array', 'minItems': 1,
+                          'items': {'type': 'object',
+                                    'properties': {'sku': {}},
+                                    'required': ['sku']}},
+                'note': {'type': 'string'},
+            },
+            'required': ['id', 'lines'],
+        },
+        'tags': {'type': 'array', 'items': {'type': 'string'}},
+    },
+    'required': ['order'],
+}
+
+GOOD = {'order': {'id': 1, 'lines': [{'sku': 'a'}, {'sku': 'b'}],
+                  'note': 'hi'},
+        'tags': ['x']}
+
+# records that don't match the schema in all sorts of ways
+BAD = [
+    {},
+    {'order': None},
+    {'order': {'id': 1, 'lines': []}},
+    {'order': {'id': 1, 'lines': {'0': 1}}},
+    {'order': {'id': 1, 'lines': 'abc'}},
+    {'order': {'lines': [{}]}},
+    {'order': [1, 2]},
+    {'order': {'id': 1, 'lines': [{'sku': 'a'}], 'note': None}},
+]
+
+
+class TestSpecialize(unittest.TestCase):
+    def bend_or_raise(self, func, source):
+        try:
+            return 'ok', func(source)
+        except Exception as e:
+            return type(e), str(e)
+
+    def assert_equivalent(self, mapping, schema=SCHEMA):
+        specialized = specialize(mapping, schema=schema)
+        for source in [GOOD] + BAD:
+            expected = self.bend_or_raise(lambda s: bend(mapping, s), source)
+            self.assertEqual(
+                self.bend_or_raise(lambda s: bend(specialized, s), source),
+                expected)
+            self.assertEqual(self.bend_or_raise(compile(specialized), source),
+                             expected)
+        return specialized
+
+    def test_s(self):
+        mapping = {'id': S('order', 'id'),
+                   'sku': S('order', 'lines', 0, 'sku'),
+                   'last': S('order', 'lines', -1, 'sku'),
+                   'first_char': S('order', 'lines', 0, 'sku', 0)}
+        specialized = self.assert_equivalent(mapping)
+        for key in mapping:
+            self.assertIs(type(specialized[key]), SpecializedS)
+
+    def test_short_or_impossible_paths_are_kept(self):
+        mapping = {'a': S('order'), 'b': S('order', 'id', 'x'),
+                   'c': S('tags', 'x')}
+        specialized = self.assert_equivalent(mapping)
+        for key in mapping:
+            self.assertIs(specialized[key], mapping[key])
+
+    def test_optional_s(self):
+        mapping = {'id': OptionalS('order', 'id', default=0),
+                   'sku': OptionalS('order', 'lines', 0, 'sku'),
+                   'second': OptionalS('order', 'lines', 1, 'sku'),
+                   'note': OptionalS('order', 'note', default=''),
+                   'tag': OptionalS('tags', 0)}
+        specialized = self.assert_equivalent(mapping)
+        self.assertIs(type(specialized['id']), SpecializedOptionalS)
+        self.assertIs(type(specialized['sku']), SpecializedOptionalS)
+        self.assertEqual(specialized['id'].default, 0)
+        for key in ['second', 'note', 'tag']:
+            self.assertIs(specialized[key], mapping[key])
+
+    def test_try_evaluate(self):
+        bender = specialize(S('order', 'id'))
+        self.assertEqual(bender.try_evaluate(GOOD, {}), 1)
+        for source in [{}, {'order': {}}, {'order': {'lines': []}}]:
+            self.assertIs(bender.try_evaluate(source, {}), MISSING)
+        for source in [{'order': None}, {'order': [1]}]:
+            with self.assertRaises(TypeError):
+                bender.try_evaluate(source, {})
+        self.assert_equivalent(
+            {'x': Alternation(S('order', 'note'), S('order', 'id'), K(0))})
+
+    def test_nested(self):
+        mapping = {
+            'lines': S('order', 'lines') >> Forall.bend({
+                'sku': OptionalS('sku'),
+                'len': S('sku') >> F(len)}),
+            'label': Format('{}: {}', S('order', 'id'),
+                            S('order', 'lines') >> OptionalS(0, 'sku')),
+            'skus': [S('order') >> S('lines', 0, 'sku')],
+        }
+        specialized = self.assert_equivalent(mapping)
+        inner = specialized['lines']._second._mapping
+        self.assertIs(type(inner['sku']), SpecializedOptionalS)
+        self.assertIs(type(specialized['label']._positional_benders[0]),
+                      SpecializedS)
+        self.assertIs(type(specialized['label']._positional_benders[1]
+                           ._second), SpecializedOptionalS)
+        self.assertIs(type(specialized['skus'][0]._second), SpecializedS)
+        self.assertIs(type(mapping['skus'][0]), Compose)
+        self.assertIs(type(mapping['skus'][0]._second), S)
+
+    def test_without_schema(self):
+        mapping = {'a': S('a', 'b', 0), 'b': OptionalS('a', 'b')}
+        specialized = specialize(mapping)
+        self.assertIs(type(specialized['a']), SpecializedS)
+        self.assertIs(specialized['b'], mapping['b'])
+
+    def test_samples(self):
+        samples = [{'a': {'b': [1, 2], 'c': 1}, 'd': 'x'},
+                   {'a': {'b': [3], 'e': None}, 'd': 1}]
+        self.assertEqual(_infer_schema(samples), {
+            'type': 'object',
+            'properties': {
+                'a': {'type': 'object',
+                      'properties': {
+                          'b': {'type': 'array', 'minItems': 1,
+                                'items': {'type': 'integer'}},
+                          'c': {'type': 'integer'},
+                          'e': {'type': 'null'}},
+                      'required': ['b']},
+                'd': {'type': ['string', 'integer']}},
+            'required': ['a', 'd']})
+        specialized = specialize({'b': OptionalS('a', 'b', 0),
+                                  'c': OptionalS('a', 'c')},
+                                 samples=iter(samples))
+        self.assertIs(type(specialized['b']), SpecializedOptionalS)
+        self.assertIs(type(specialized['c']), OptionalS)
+
+        with self.assertRaises(ValueError):
+            specialize({}, schema={}, samples=[])
+
+    def test_schema_keywords(self):
+        schema = {'type': 'array', 'minItems': 2,
+                  'prefixItems': [{'type': 'object', 'required': ['a']},
+                                  {'type': 'string'}],
+                  'items': {'type': 'object', 'properties': {'b': {}},
+                            'additionalProperties': False}}
+        mapping = {'a': OptionalS(0, 'a'), 'b': OptionalS(1, 'a'),
+                   'c': S(5, 'x'), 'd': S(5, 'b')}
+        specialized = specialize(mapping, schema=schema)
+        self.assertIs(type(specialized['a']), SpecializedOptionalS)
+        self.assertIs(specialized['b'], mapping['b'])
+        self.assertIs(specialized['c'], mapping['c'])
+        self.assertIs(type(specialized['d']), SpecializedS)
+        self.assertIs(type(specialize(OptionalS(0, 0), schema={
+            'type': 'array', 'minItems': 1, 'items': [{'type': 'array',
+                                                        'minItems': 1}]})),
+                      SpecializedOptionalS)
+
+    def test_keys(self):
+        source = {(1, 2): {None: [0, 1]}, True: {'a': 1}}
+        for path in [((1, 2), None, -1), (True, 'a')]:
+            self.assertEqual(specialize(S(*path)).evaluate(source, {}),
+                             S(*path).evaluate(source, {}))
+
+    def test_pickle(self):
+        for bender in [SpecializedS('a', 0),
+                       SpecializedOptionalS('a', 0, default=-1)]:
+            copied = pickle.loads(pickle.dumps(bender))
+            self.assertEqual(copied.structural_key(), bender.structural_key())
+            self.assertEqual(copied.evaluate({'a': [1]}, {}), 1)
+        self.assertEqual(copied.evaluate({}, {}), -1)
+        self.assertNotEqual(SpecializedOptionalS('a', 0).structural_key(),
+                            copied.structural_key())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+from concurrent.futures import ThreadPoolExecutor
+import io
+import json
+import unittest
+
+from jsonbender import (BendingException, Context, F, Forall, K, OptionalS,
+                        S, bend, bend_to_stream)
+
+
+SOURCE = {
+    'id': 7,
+    'name': u'Ren\xe9e "R"',
+    'lines': [{'sku': 'a', 'qty': 1, 'price': 1.5},
+              {'sku': 'b', 'qty': 2, 'price': float('nan')}],
+    'tags': ['x', 'y'],
+}
+
+
+class Recorder(io.StringIO):
+    """
+    A file remembering how much had been written at each element bent.
+    """
+
+    def __init__(self):
+        super(Recorder, self).__init__()
+        self.seen = []
+
+    def record(self, value):
+        self.seen.append(len(self.getvalue()))
+        return value
+
+
+class TestBendToStream(unittest.TestCase):
+    def stream(self, mapping, source=SOURCE, context=None):
+        fp = io.StringIO()
+        bend_to_stream(mapping, source, fp, context)
+        return fp.getvalue()
+
+    def assert_same(self, mapping, source=SOURCE, context=None):
+        self.assertEqual(self.stream(mapping, source, context),
+                         json.dumps(bend(mapping, source, context)))
+
+    def test_same_text(self):
+        self.assert_same({
+            'id': S('id'),
+            'name': S('name'),
+            'const': {'a': [1, 'b', None, True]},
+            'nested': {'tags': S('tags'), 'empty': {}, 'list': []},
+            'list': [S('id'), {'x': K(1.0)}, K({'k': [1, 2]})],
+            'lines': S('lines') >> Forall.bend({
+                'sku': S('sku'),
+                'total': S('qty') * S('price'),
+                'ctx': Context() >> OptionalS('currency')}),
+            'empty': K([]) >> Forall.bend({'a': S('a')}),
+            u'\xfc': K(u'☃'),
+            1: 'int key', 2.5: 'float key', None: 'null', True: 'bool',
+        }, context={'currency': 'EUR'})
+        self.assert_same(S('lines') >> Forall.bend([S('sku'), S('qty')]))
+        self.assert_same(Forall.bend({'v': S('sku')}), SOURCE['lines'])
+        self.assert_same(S('tags'))
+        self.assert_same([{'a': S('id')}, 'b'])
+
+    def test_forall_context(self):
+        mapping = {'l': S('tags') >> Forall.bend({'c': Context()},
+                                                 context={'own': 1})}
+        self.assert_same(mapping, context={'outer': 1})
+
+    def test_forall_on_executor(self):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            self.assert_same({'l': S('lines') >> Forall.bend(
+                {'sku': S('sku'), 'c': Context()}, executor=executor,
+                chunksize=1)}, context={'c': 1})
+            self.assert_same(Forall.bend([S('qty')], executor=executor),
+                             SOURCE['lines'])
+
+    def test_bending_errors(self):
+        for mapping in [{'a': S('id'), 'b': {'c': S('missing')}},
+                        {'l': S('lines') >> Forall.bend({'x': S('nope')})},
+                        {'l': S('lines') >> Forall.bend(S('nope'))},
+                        {'l': S('id') >> Forall.bend({'x': S('x')})},
+                        S('missing')]:
+            with self.assertRaises(Exception) as expected:
+                bend(mapping, SOURCE)
+            with self.assertRaises(type(expected.exception)) as got:
+                self.stream(mapping)
+            self.assertEqual(str(got.exception), str(expected.exception))
+            if isinstance(expected.exception, BendingException):
+                self.assertEqual(got.exception.path,
+                                 expected.exception.path)
+
+    def test_encoding_errors(self):
+        # bending errors come first, as with json.dumps(bend(...))
+        mapping = {'a': K(object()), 'b': S('missing')}
+        with self.assertRaises(BendingException):
+            self.stream(mapping)
+        for mapping in [{'a': K(object()), 'b': S('id')},
+                        {(1, 2): S('id')},
+                        {'a': S('lines') >> Forall.bend({'x': K({1j: 1})})}]:
+            with self.assertRaises(TypeError) as expected:
+                json.dumps(bend(mapping, SOURCE))
+            with self.assertRaises(TypeError) as got:
+                self.stream(mapping)
+            self.assertEqual(str(got.exception), str(expected.exception))
+
+    def test_streams_elements(self):
+        fp = Recorder()
+        mapping = {'items': K(list(range(20000))) >> Forall.bend(
+            F(fp.record))}
+        bend_to_stream(mapping, {}, fp)
+        seen = fp.seen[:]
+        self.assertEqual(fp.getvalue(), json.dumps(bend(mapping, {})))
+        # elements had been written while later ones were being bent, in a
+        # few large chunks
+        self.assertEqual(seen[0], 0)
+        self.assertGreater(seen[-1], 0)
+        self.assertLess(seen[-1], len(fp.getvalue()))
+        self.assertLess(len(set(seen)), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,7 @@
 import unittest
 
-from jsonbender import Context, K, S
-from jsonbender.string_ops import Format
+from jsonbender import Context, F, K, S
+from jsonbender.string_ops import Format, ProtectedFormat
 from jsonbender.test import BenderTestMixin
 
 
@@ -18,6 +18,23 @@ class TestFormat(unittest.TestCase, BenderTestMixin):
                            context={'b': 23})
 
 
+class TestProtectedFormat(unittest.TestCase, BenderTestMixin):
+    def test_format(self):
+        bender = ProtectedFormat('{} {last}', K('Edsger'), last=K('Dijkstra'))
+        self.assert_bender(bender, None, 'Edsger Dijkstra')
+
+    def test_none(self):
+        self.assert_bender(ProtectedFormat('{} {}', K('Edsger'), K(None)),
+                           None, None)
+        self.assert_bender(ProtectedFormat('{x}', x=K(None)), None, None)
+
+    def test_evaluates_arguments_once(self):
+        calls = []
+        bender = ProtectedFormat('{}', F(calls.append) >> K('x'))
+        self.assert_bender(bender, 1, 'x')
+        self.assertEqual(calls, [1])
+
+
 if __name__ == '__main__':
     unittest.main()
 